@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import timedelta
+import time
+import uuid
 
 from app.schemas.token import Token
+from app.core.auth_cache import AuthenticatedUser, token_cache
+from app.core.metrics import AUTH_DURATION
+from app.core.password_hasher import PasswordHasherBusy
 from app.db import crud
 from app.core.security import decode_access_token, create_access_token
 from app.db.database import get_db
@@ -15,38 +20,42 @@ router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-@router.post("/token", response_model=Token)
-def sign_in_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
-):
+
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
+
+
+def get_token_claims(user: UserDB, token_type: str) -> dict:
     """
-    Authenticate user and issue access and refresh tokens.
+    Builds the claims identifying the user in its tokens, so that requests can be authenticated without a database query.
 
     Args:
-        form_data (OAuth2PasswordRequestForm): OAuth2 form data with username and password.
-        db (Session): SQLAlchemy database session.
+        user (UserDB): The user the tokens are issued to.
+        token_type (str): `ACCESS_TOKEN_TYPE` or `REFRESH_TOKEN_TYPE`, so that a token is only accepted for its own use.
+
+    Returns:
+        dict: The email (as subject), ID and role of the user, and the type of the token.
+    """
+    return {"sub": user.email, "uid": str(user.id), "role": user.role, "typ": token_type}
+
+
+def issue_tokens(user: UserDB) -> dict:
+    """
+    Issues a new access token and a new refresh token to a user.
+
+    Args:
+        user (UserDB): The user, as currently stored in the database.
 
     Returns:
         dict: A dictionary containing the access token, refresh token, and token type.
 
     Raises:
-        HTTPException:
-            If authentication fails (incorrect email or password), returns a 401 Unauthorized.
-            If the creation of access token fails, returns a 500 Internal Server Error.
-            If the creation of refresh token fails, returns a 500 Internal Server Error.
+        HTTPException: If the creation of a token fails, returns a 500 Internal Server Error.
     """
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     try:
         access_token = create_access_token(
-            data={"sub": user.email}, expires_delta=access_token_expires
+            data=get_token_claims(user, ACCESS_TOKEN_TYPE), expires_delta=access_token_expires
         )
     except JWTError:
         raise HTTPException(
@@ -58,7 +67,7 @@ def sign_in_access_token(
     refresh_token_expires = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     try:
         refresh_token = create_access_token(
-            data={"sub": user.email}, expires_delta=refresh_token_expires
+            data=get_token_claims(user, REFRESH_TOKEN_TYPE), expires_delta=refresh_token_expires
         )
     except JWTError:
         raise HTTPException(
@@ -73,26 +82,68 @@ def sign_in_access_token(
         "token_type": "bearer"
     }
 
+
+@router.post("/token", response_model=Token)
+async def sign_in_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
+):
+    """
+    Authenticate user and issue access and refresh tokens.
+
+    Args:
+        form_data (OAuth2PasswordRequestForm): OAuth2 form data with username and password.
+        db (AsyncSession): SQLAlchemy database session.
+
+    Returns:
+        dict: A dictionary containing the access token, refresh token, and token type.
+
+    Raises:
+        HTTPException:
+            If authentication fails (incorrect email or password), returns a 401 Unauthorized.
+            If too many passwords are already being verified, returns a 503 Service Unavailable.
+            If the creation of a token fails, returns a 500 Internal Server Error.
+    """
+    try:
+        user = await crud.authenticate_user(db, form_data.username, form_data.password)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry later",
+            headers={"Retry-After": "1"},
+        )
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return issue_tokens(user)
+
+
 @router.post("/token/refresh", response_model=Token)
-def refresh_access_token(
-    request: Request, db: Session = Depends(get_db)
+async def refresh_access_token(
+    request: Request, db: AsyncSession = Depends(get_db)
 ):
     """
     Refresh an access token using the refresh token.
 
+    The user is read from the database, so that the new tokens carry its current role, and a new
+    refresh token is issued along with the access token.
+
     Args:
         request (Request): FastAPI request object containing headers with the refresh token.
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
 
     Returns:
         dict: A dictionary containing the new access token, refresh token, and token type.
 
     Raises:
         HTTPException:
-            If the refresh token is missing or invalid, returns a 401 Unauthorized.
+            If the refresh token is missing or invalid, e.g. an access token, returns a 401 Unauthorized.
             If the refresh token has expired, returns a 403 Forbidden.
             If the user doesn't exist, returns a 404 Not Found.
-            If the creation of access token fails, returns a 500 Internal Server Error.
+            If the creation of a token fails, returns a 500 Internal Server Error.
     """
     token = request.headers.get("Authorization")
     if not token or not token.startswith("Bearer "):
@@ -105,52 +156,48 @@ def refresh_access_token(
 
     try:
         payload = decode_access_token(refresh_token)
+    except ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Refresh token has expired.",
+        )
     except (JWTError, JWTClaimsError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
         )
-    except ExpiredSignatureError:
+    if payload.get("typ") != REFRESH_TOKEN_TYPE:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Refresh token has expired.",
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
         )
 
     email = payload.get("sub")
-    user = crud.get_user_by_email(db, email=email)
+    user = await crud.get_user_by_email(db, email=email)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    try:
-        new_access_token = create_access_token(
-            data={"sub": user.email}, expires_delta=access_token_expires
-        )
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to create the access token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    return issue_tokens(user)
 
-    return {
-        "access_token": new_access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer"
-    }
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> UserDB:
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> AuthenticatedUser:
     """
     Validate the access token and retrieve the current user.
 
+    The user is looked up in the per-worker token cache first, then read from the claims of the
+    token. The database is only queried for tokens issued without these claims or before a role
+    change of their user in this worker. Refresh tokens are rejected: only access tokens, whose
+    claims are re-read from the database when refreshed, are trusted, so that a role change made
+    in another worker applies within `ACCESS_TOKEN_EXPIRE_MINUTES`.
+
     Args:
         token (str): The OAuth2 access token provided by the client.
-        db (Session): SQLAlchemy database session.
+        db (AsyncSession): SQLAlchemy database session.
 
     Returns:
-        UserDB: The authenticated user instance.
+        AuthenticatedUser: The authenticated user.
 
     Raises:
         HTTPException:
@@ -158,6 +205,12 @@ def get_current_user(
             If the access token has expired, returns a 403 Forbidden.
             If the user doesn't exist, returns a 404 Not Found.
     """
+    start = time.perf_counter()
+    user = token_cache.get(token)
+    if user is not None:
+        AUTH_DURATION.labels("cache").observe(time.perf_counter() - start)
+        return user
+
     try:
         payload = decode_access_token(token)
     except ExpiredSignatureError:
@@ -170,9 +223,24 @@ def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
         )
+    if payload.get("typ") != ACCESS_TOKEN_TYPE:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+        )
 
-    email = payload.get("sub")
-    user = crud.get_user_by_email(db, email=email)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    try:
+        user = AuthenticatedUser(id=uuid.UUID(payload["uid"]), email=payload["sub"], role=payload["role"])
+    except (KeyError, TypeError, ValueError):
+        user = None
+    path = "claims"
+    if user is None or token_cache.is_stale(user.id, payload.get("iat", 0)):
+        path = "database"
+        db_user = await crud.get_user_by_email(db, email=payload.get("sub"))
+        if not db_user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        user = AuthenticatedUser(id=db_user.id, email=db_user.email, role=db_user.role)
+
+    token_cache.store(token, user, expires_at=payload["exp"])
+    AUTH_DURATION.labels(path).observe(time.perf_counter() - start)
     return user
@@ -1,29 +1,41 @@
 from typing import List
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.schemas.answer_job import AnswerJob
 from app.schemas.chat import ChatContent, ChatCreate, ChatInfo, ChatSummary, ChatUpdate, Chat
 from app.schemas.question_answer import AnswerMetadata, QuestionAnswerBase
 from app.api.routes.auth import get_current_user
-from app.db.database import get_db
+from app.db.database import SessionLocal, get_db
 from app.db import crud
-from app.db.models.user import UserDB
-from app.api.routes.utils import ask_question_ai, create_chat_title
+from app.core.auth_cache import AuthenticatedUser
+from app.rag.pipeline import AIPipeline, get_pipeline
+from app.api.routes.utils import (
+    ask_first_question_ai, ask_question_ai, create_chat_title, decode_cursor, encode_cursor, format_sse_event, stream_question_ai, update_chat_memory
+)
 
 router = APIRouter()
 
+# Response header holding the cursor of the next page of a paginated list, absent on the last page.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 @router.post("/chats", response_model=Chat, status_code=status.HTTP_201_CREATED)
-def create_chat(
-    chat: ChatCreate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)
+async def create_chat(
+    chat: ChatCreate, db: AsyncSession = Depends(get_db),
+    current_user: AuthenticatedUser = Depends(get_current_user), pipeline: AIPipeline = Depends(get_pipeline)
 ) -> Chat:
     """
     Create a new chat.
 
     Args:
         chat (ChatCreate): The chat creation data.
-        db (Session): The SQLAlchemy database session.
-        current_user (UserDB): The currently authenticated user.
+        db (AsyncSession): The SQLAlchemy database session.
+        current_user (AuthenticatedUser): The currently authenticated user.
+        pipeline (AIPipeline): The pipeline answering the questions.
 
     Returns:
         Chat: The created chat object.
@@ -33,45 +45,101 @@ def create_chat(
             If the access token is invalid, returns a 401 Unauthorized.
             If the access token has expired, returns a 403 Forbidden.
             If the user doesn't exist, returns a 404 Not Found.
+            If the document index is not loaded, returns 503 Service Unavailable.
     """
     title = create_chat_title(question=chat)
-    response = ask_question_ai(db_chat=None, question=chat, role=current_user.role)
+    response = await ask_first_question_ai(pipeline=pipeline, db=db, question=chat, role=current_user.role)
     chat_info = ChatInfo(title=title, question_answer=response)
-    db_chat = crud.create_chat(db, current_user, chat_info)
-    
+    # The memory of the chat is only built from its first follow-up, see `update_chat_memory`.
+    db_chat = await crud.create_chat(db, current_user.id, chat_info)
+
+    # The conversation of a new chat is the persisted question-answer pair: no need to read it back.
     return Chat(
         id=db_chat.id,
         title=db_chat.title,
-        conversation=[
-            QuestionAnswerBase(
-                question=qa.question,
-                answer=qa.answer,
-                answer_metadata=[
-                    AnswerMetadata(
-                        page_number=am.page_number,
-                        file_name=am.file_name
-                    ) for am in qa.answer_metadatas
-                ]
-            ) for qa in db_chat.conversation
-        ]
+        conversation=[response]
     )
 
 
-@router.post("/chats/{chat_id}", response_model=ChatContent, status_code=status.HTTP_200_OK)
-def add_question_answer_to_chat(
-    chat_id: uuid.UUID, chat: ChatUpdate, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)
-) -> ChatContent:
+@router.post("/chats/stream", status_code=status.HTTP_200_OK)
+async def create_chat_stream(
+    chat: ChatCreate, db: AsyncSession = Depends(get_db),
+    current_user: AuthenticatedUser = Depends(get_current_user), pipeline: AIPipeline = Depends(get_pipeline)
+) -> StreamingResponse:
+    """
+    Create a new chat, streaming the AI answer with Server-Sent Events.
+
+    The stream sends a `metadata` event with the chat title and the documents used to answer,
+    one `token` event per generated token and, once the chat is persisted, a `done` event with its ID.
+
+    Args:
+        chat (ChatCreate): The chat creation data.
+        db (AsyncSession): The SQLAlchemy database session.
+        current_user (AuthenticatedUser): The currently authenticated user.
+        pipeline (AIPipeline): The pipeline answering the questions.
+
+    Returns:
+        StreamingResponse: The `text/event-stream` response.
+
+    Raises:
+        HTTPException:
+            If the access token is invalid, returns a 401 Unauthorized.
+            If the access token has expired, returns a 403 Forbidden.
+            If the user doesn't exist, returns a 404 Not Found.
+            If the document index is not loaded, returns 503 Service Unavailable.
+    """
+    title = create_chat_title(question=chat)
+    answer_metadatas, tokens = await stream_question_ai(pipeline=pipeline, db=db, db_chat=None, question=chat, role=current_user.role)
+
+    async def event_stream():
+        yield format_sse_event("metadata", {
+            "title": title,
+            "answer_metadata": [am.model_dump() for am in answer_metadatas]
+        })
+        answer = []
+        try:
+            async for token in tokens:
+                answer.append(token)
+                yield format_sse_event("token", {"token": token})
+        except Exception:
+            yield format_sse_event("error", {"detail": "Failed to generate the answer"})
+            return
+
+        response = QuestionAnswerBase(question=chat.question, answer="".join(answer), answer_metadata=answer_metadatas)
+        chat_info = ChatInfo(title=title, question_answer=response)
+        # The request session is already closed once the response starts streaming.
+        async with SessionLocal() as db:
+            db_chat = await crud.create_chat(db, current_user.id, chat_info)
+        yield format_sse_event("done", {"id": str(db_chat.id), "title": db_chat.title})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@router.post("/chats/{chat_id}", response_model=ChatContent | AnswerJob, status_code=status.HTTP_200_OK)
+async def add_question_answer_to_chat(
+    chat_id: uuid.UUID, chat: ChatUpdate, background_tasks: BackgroundTasks, response: Response, asynchronous: bool = False,
+    db: AsyncSession = Depends(get_db), current_user: AuthenticatedUser = Depends(get_current_user),
+    pipeline: AIPipeline = Depends(get_pipeline)
+) -> ChatContent | AnswerJob:
     """
     Add the user message and the AI answer to the chat.
 
+    With `asynchronous`, the question is queued instead, and answered by the job workers
+    (`python -m app.worker`). The route then returns 202 Accepted with the pending job, whose
+    status and answer are read from `GET /jobs/{job_id}`, also sent in the `Location` header.
+
     Args:
         chat_id (UUID): The unique identifier of the chat to update.
         chat (ChatUpdate): The chat update data containing the user's message.
-        db (Session): The SQLAlchemy database session.
-        current_user (UserDB): The currently authenticated user.
+        background_tasks (BackgroundTasks): The tasks run once the response is sent.
+        response (Response): The response, to set the status and location of a queued question on.
+        asynchronous (bool): Whether the question is queued instead of answered before returning.
+        db (AsyncSession): The SQLAlchemy database session.
+        current_user (AuthenticatedUser): The currently authenticated user.
+        pipeline (AIPipeline): The pipeline answering the questions.
 
     Returns:
-        ChatContent: The updated chat content including the question-answer pair.
+        ChatContent | AnswerJob: The updated chat content including the question-answer pair, or the queued job.
     
     Raises:
         HTTPException:
@@ -80,30 +148,102 @@ def add_question_answer_to_chat(
             If the user is not found, returns a 404 Not Found.
             If the chat is not found, return 404 Not Found.
             If the user is not authorized to update the chat, returns 403 Forbidden.
+            If the document index is not loaded, returns 503 Service Unavailable.
     """
-    db_chat = crud.get_chat_by_id(db, chat_id)
+    db_chat = await crud.get_chat_by_id(db, chat_id)
     if db_chat is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
     if db_chat.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this chat")
-    
-    response = ask_question_ai(db_chat=db_chat, question=chat, role=current_user.role)
-    chat_content = ChatContent(question_answer=response)
-    db_qa = crud.add_question_answer_to_chat(db, db_chat, chat_content)
+
+    if asynchronous:
+        db_job = await crud.create_answer_job(db, db_chat, chat.question, current_user.role)
+        response.status_code = status.HTTP_202_ACCEPTED
+        response.headers["Location"] = f"/jobs/{db_job.id}"
+        return AnswerJob(id=db_job.id, chat_id=db_chat.id, status=db_job.status)
+
+    question_answer = await ask_question_ai(pipeline=pipeline, db=db, db_chat=db_chat, question=chat, role=current_user.role)
+    chat_content = ChatContent(question_answer=question_answer)
+    await crud.add_question_answer_to_chat(db, db_chat, chat_content)
+    background_tasks.add_task(update_chat_memory, pipeline, db_chat.id)
     return chat_content
 
 
+@router.post("/chats/{chat_id}/stream", status_code=status.HTTP_200_OK)
+async def add_question_answer_to_chat_stream(
+    chat_id: uuid.UUID, chat: ChatUpdate, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_db),
+    current_user: AuthenticatedUser = Depends(get_current_user), pipeline: AIPipeline = Depends(get_pipeline)
+) -> StreamingResponse:
+    """
+    Add the user message to the chat, streaming the AI answer with Server-Sent Events.
+
+    The stream sends a `metadata` event with the documents used to answer, one `token` event
+    per generated token and, once the question-answer pair is persisted, a `done` event.
+
+    Args:
+        chat_id (UUID): The unique identifier of the chat to update.
+        chat (ChatUpdate): The chat update data containing the user's message.
+        background_tasks (BackgroundTasks): The tasks run once the response is sent.
+        db (AsyncSession): The SQLAlchemy database session.
+        current_user (AuthenticatedUser): The currently authenticated user.
+        pipeline (AIPipeline): The pipeline answering the questions.
+
+    Returns:
+        StreamingResponse: The `text/event-stream` response.
+
+    Raises:
+        HTTPException:
+            If the access token is invalid, returns a 401 Unauthorized.
+            If the access token has expired, returns a 403 Forbidden.
+            If the user is not found, returns a 404 Not Found.
+            If the chat is not found, return 404 Not Found.
+            If the user is not authorized to update the chat, returns 403 Forbidden.
+            If the document index is not loaded, returns 503 Service Unavailable.
+    """
+    db_chat = await crud.get_chat_by_id(db, chat_id)
+    if db_chat is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+    if db_chat.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to update this chat")
+
+    answer_metadatas, tokens = await stream_question_ai(pipeline=pipeline, db=db, db_chat=db_chat, question=chat, role=current_user.role)
+
+    async def event_stream():
+        yield format_sse_event("metadata", {
+            "answer_metadata": [am.model_dump() for am in answer_metadatas]
+        })
+        answer = []
+        try:
+            async for token in tokens:
+                answer.append(token)
+                yield format_sse_event("token", {"token": token})
+        except Exception:
+            yield format_sse_event("error", {"detail": "Failed to generate the answer"})
+            return
+
+        response = QuestionAnswerBase(question=chat.question, answer="".join(answer), answer_metadata=answer_metadatas)
+        chat_content = ChatContent(question_answer=response)
+        # The request session is already closed once the response starts streaming.
+        async with SessionLocal() as stream_db:
+            await crud.add_question_answer_to_chat(stream_db, db_chat, chat_content)
+        # Background tasks added before the stream ends run once it is sent.
+        background_tasks.add_task(update_chat_memory, pipeline, db_chat.id)
+        yield format_sse_event("done", {"id": str(db_chat.id)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @router.delete("/chats/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_chat(
-    chat_id: uuid.UUID, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)
+async def delete_chat(
+    chat_id: uuid.UUID, db: AsyncSession = Depends(get_db), current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """
     Delete a chat.
 
     Args:
         chat_id (UUID): The unique identifier of the chat to delete.
-        db (Session): The SQLAlchemy database session.
-        current_user (UserDB): The currently authenticated user.
+        db (AsyncSession): The SQLAlchemy database session.
+        current_user (AuthenticatedUser): The currently authenticated user.
 
     Returns:
         dict: A dictionary containing a message if the chat deletion was successful.
@@ -111,56 +251,100 @@ def delete_chat(
     Raises:
         HTTPException: If the chat is not found or the user is not authorized to delete it.
     """
-    db_chat = crud.get_chat_by_id(db, chat_id)
+    db_chat = await crud.get_chat_by_id(db, chat_id)
     if db_chat is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
     if db_chat.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this chat")
     
-    crud.delete_chat(db, db_chat)
+    await crud.delete_chat(db, db_chat)
 
 
 @router.get("/chats", response_model=List[ChatSummary], status_code=status.HTTP_200_OK)
-def get_all_chat_summaries(
-    db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)
+async def get_all_chat_summaries(
+    response: Response, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None,
+    db: AsyncSession = Depends(get_db), current_user: AuthenticatedUser = Depends(get_current_user)
 ) -> List[ChatSummary]:
     """
-    Get all the user's chat summaries.
+    Get a page of the user's chat summaries, most recent first.
+
+    If there are more chats, the cursor of the next page is sent in the `X-Next-Cursor` header.
 
     Args:
-        db (Session): The SQLAlchemy database session.
-        current_user (UserDB): The currently authenticated user.
+        response (Response): The response, to set the next page cursor on.
+        limit (int): Maximum number of chat summaries returned.
+        cursor (str | None): The cursor of the page, None for the first one.
+        db (AsyncSession): The SQLAlchemy database session.
+        current_user (AuthenticatedUser): The currently authenticated user.
 
     Returns:
         List[ChatSummary]: A list of chat summaries for the authenticated user.
+
+    Raises:
+        HTTPException: If the cursor is invalid, returns a 400 Bad Request.
     """
-    chat_summaries = crud.get_all_chat_summaries(db, current_user)
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    # One extra row tells whether there is a next page.
+    chat_summaries = await crud.get_chat_summaries(db, current_user.id, limit + 1, before)
+    if len(chat_summaries) > limit:
+        chat_summaries = chat_summaries[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(chat_summaries[-1].created_at, chat_summaries[-1].id)
     return [ChatSummary(id=chat.id, title=chat.title) for chat in chat_summaries]
 
 
 @router.get("/chats/{chat_id}", response_model=Chat, status_code=status.HTTP_200_OK)
-def get_chat_by_id(
-    chat_id: uuid.UUID, db: Session = Depends(get_db), current_user: UserDB = Depends(get_current_user)
+async def get_chat_by_id(
+    chat_id: uuid.UUID, response: Response, limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None,
+    db: AsyncSession = Depends(get_db), current_user: AuthenticatedUser = Depends(get_current_user)
 ) -> Chat:
     """
     Get a user's chat by ID.
 
+    The whole conversation is returned unless a `limit` or a `cursor` is given. The conversation
+    is then paginated from the most recent question-answer pair backwards, each page being in
+    chronological order, and the cursor of the page of older pairs, if any, is sent in the
+    `X-Next-Cursor` header.
+
     Args:
         chat_id (UUID): The unique identifier of the chat to retrieve.
-        db (Session): The SQLAlchemy database session.
-        current_user (UserDB): The currently authenticated user.
+        response (Response): The response, to set the next page cursor on.
+        limit (int | None): Maximum number of question-answer pairs returned.
+        cursor (str | None): The cursor of the page of the conversation.
+        db (AsyncSession): The SQLAlchemy database session.
+        current_user (AuthenticatedUser): The currently authenticated user.
 
     Returns:
         Chat: The requested chat object.
     
     Raises:
-        HTTPException: If the chat is not found or the user is not authorized to view it.
+        HTTPException:
+            If the cursor is invalid, returns a 400 Bad Request.
+            If the chat is not found or the user is not authorized to view it.
     """
-    db_chat = crud.get_chat_by_id(db, chat_id)
+    paginated = limit is not None or cursor is not None
+    try:
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    db_chat = await crud.get_chat_by_id(db, chat_id, with_conversation=not paginated)
     if db_chat is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
     if db_chat.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this chat")
+
+    if paginated:
+        page_size = limit or DEFAULT_PAGE_SIZE
+        conversation = await crud.get_conversation_page(db, chat_id, page_size + 1, before)
+        if len(conversation) > page_size:
+            conversation = conversation[1:]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(conversation[0].created_at, conversation[0].id)
+    else:
+        conversation = db_chat.conversation
     
     return Chat(
         id=db_chat.id,
@@ -175,6 +359,6 @@ def get_chat_by_id(
                         file_name=am.file_name
                     ) for am in qa.answer_metadatas
                 ]
-            ) for qa in db_chat.conversation
+            ) for qa in conversation
         ]
     )
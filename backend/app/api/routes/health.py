@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import get_db, pool_stats
+
+router = APIRouter()
+
+@router.get("/health", status_code=status.HTTP_200_OK)
+async def liveness():
+    """
+    Report that the worker is running.
+
+    Returns:
+        dict: A dictionary containing the status of the worker.
+    """
+    return {"status": "alive"}
+
+
+@router.get("/ready", status_code=status.HTTP_200_OK)
+async def readiness(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Report whether the worker can serve traffic.
+
+    The worker is ready once the document index is loaded (and warmed up, if enabled)
+    and the database is reachable.
+
+    Args:
+        request (Request): FastAPI request object.
+        db (AsyncSession): SQLAlchemy database session.
+
+    Returns:
+        dict: A dictionary containing the status of the worker and the usage of its database connection pool.
+
+    Raises:
+        HTTPException:
+            If the document index is not loaded or warmed up, returns a 503 Service Unavailable.
+            If the database can't be reached, returns a 503 Service Unavailable.
+    """
+    pipeline = getattr(request.app.state, "pipeline", None)
+    if pipeline is None or not pipeline.is_ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="The AI pipeline is not ready")
+    try:
+        await db.execute(text("SELECT 1"))
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="The database is not reachable")
+    return {"status": "ready", "database_pool": pool_stats()}
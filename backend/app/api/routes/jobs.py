@@ -0,0 +1,86 @@
+import asyncio
+import time
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.schemas.answer_job import AnswerJob
+from app.schemas.question_answer import AnswerMetadata, QuestionAnswerBase
+from app.api.routes.auth import get_current_user
+from app.db.database import get_db, release_connection
+from app.db import crud
+from app.db.models.answer_job import AnswerJobDB
+from app.core.auth_cache import AuthenticatedUser
+from app.core.config import settings
+
+router = APIRouter()
+
+FINISHED_JOB_STATUSES = ("done", "failed")
+
+
+def to_answer_job(db_job: AnswerJobDB) -> AnswerJob:
+    """
+    Converts a job to its response model, with the question-answer pair once the job is done.
+
+    Args:
+        db_job (AnswerJobDB): The job, with its question-answer pair and the metadata of the pair loaded.
+
+    Returns:
+        AnswerJob: The status of the job.
+    """
+    question_answer = None
+    if db_job.question_answer is not None:
+        question_answer = QuestionAnswerBase(
+            question=db_job.question_answer.question,
+            answer=db_job.question_answer.answer,
+            answer_metadata=[
+                AnswerMetadata(page_number=am.page_number, file_name=am.file_name) for am in db_job.question_answer.answer_metadatas
+            ]
+        )
+    return AnswerJob(id=db_job.id, chat_id=db_job.chat_id, status=db_job.status, question_answer=question_answer, error=db_job.error)
+
+
+@router.get("/jobs/{job_id}", response_model=AnswerJob, status_code=status.HTTP_200_OK)
+async def get_answer_job(
+    job_id: uuid.UUID, wait: float = Query(0, ge=0, le=settings.JOB_MAX_WAIT_SECONDS),
+    db: AsyncSession = Depends(get_db), current_user: AuthenticatedUser = Depends(get_current_user)
+) -> AnswerJob:
+    """
+    Get the status of a question answered asynchronously, and its answer once it is done.
+
+    With `wait`, the request long-polls: it returns as soon as the job is done or failed, or after
+    `wait` seconds with the job still pending or running. No database connection is held between
+    two checks of the job.
+
+    Args:
+        job_id (UUID): The unique identifier of the job.
+        wait (float): Maximum time (in seconds) to wait for the job to finish.
+        db (AsyncSession): The SQLAlchemy database session.
+        current_user (AuthenticatedUser): The currently authenticated user.
+
+    Returns:
+        AnswerJob: The status of the job, with the question-answer pair once it is done.
+
+    Raises:
+        HTTPException:
+            If the job is not found, returns a 404 Not Found.
+            If the user is not authorized to view the chat of the job, returns a 403 Forbidden.
+    """
+    deadline = time.monotonic() + wait
+    db_job = await crud.get_answer_job(db, job_id)
+    if db_job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    db_chat = await crud.get_chat_by_id(db, db_job.chat_id)
+    if db_chat is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if db_chat.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this job")
+
+    while db_job.status not in FINISHED_JOB_STATUSES and (remaining := deadline - time.monotonic()) > 0:
+        await release_connection(db)
+        await asyncio.sleep(min(settings.JOB_POLL_INTERVAL_SECONDS, remaining))
+        db_job = await crud.get_answer_job(db, job_id)
+        if db_job is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    return to_answer_job(db_job)
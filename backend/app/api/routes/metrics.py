@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Export the metrics of the worker in the Prometheus text format.
+
+    Returns:
+        Response: The metrics of the stages of the answers, the database operations, the authentication,
+        the LLM tokens, the caches and the connection pool.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,16 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas.user import UserCreate, UserInfo, UserUpdate
 from app.api.routes.auth import get_current_user
 from app.db import crud
 from app.db.database import get_db
-from app.db.models.user import UserDB
+from app.core.auth_cache import AuthenticatedUser
+from app.core.password_hasher import PasswordHasherBusy
 
 router = APIRouter()
 
 @router.post("/users", response_model=UserInfo, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     """
     Create a new user.
 
@@ -19,30 +20,39 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
 
     Args:
         user (UserCreate): The user details required to create a new user.
-        db (Session): The database session used for accessing the database.
+        db (AsyncSession): The database session used for accessing the database.
 
     Returns:
         UserInfo: The created user's information including email and role.
 
     Raises:
-        HTTPException: If the email is already registered, returns a 400 Bad Request.
+        HTTPException:
+            If the email is already registered, returns a 400 Bad Request.
+            If too many passwords are already being hashed, returns a 503 Service Unavailable.
     """
-    db_user = crud.get_user_by_email(db, email=user.email)
+    db_user = await crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-    created_user = crud.create_user(db=db, user=user)
+    try:
+        created_user = await crud.create_user(db=db, user=user)
+    except PasswordHasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry later",
+            headers={"Retry-After": "1"},
+        )
     return UserInfo(email=created_user.email, role=created_user.role)
 
 
 @router.get("/users/me", response_model=UserInfo, status_code=status.HTTP_200_OK)
-def read_current_user(current_user: UserDB = Depends(get_current_user)):
+async def read_current_user(current_user: AuthenticatedUser = Depends(get_current_user)):
     """
     Get information about the current authenticated user.
 
     This endpoint retrieves information about the current user, such as email and role.
 
     Args:
-        current_user (UserDB): The current authenticated user.
+        current_user (AuthenticatedUser): The current authenticated user.
 
     Returns:
         UserInfo: The current user's information including email and role.
@@ -57,10 +67,10 @@ def read_current_user(current_user: UserDB = Depends(get_current_user)):
 
 
 @router.post("/users/me/role", response_model=UserInfo, status_code=status.HTTP_200_OK)
-def update_user_role(
+async def update_user_role(
     user: UserUpdate, 
-    db: Session = Depends(get_db), 
-    current_user: UserDB = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db), 
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
     """
     Update the role of the current user.
@@ -70,8 +80,8 @@ def update_user_role(
 
     Args:
         user (UserUpdate): The new role details to be updated.
-        db (Session): The database session used for accessing the database.
-        current_user (UserDB): The current authenticated user.
+        db (AsyncSession): The database session used for accessing the database.
+        current_user (AuthenticatedUser): The current authenticated user.
 
     Returns:
         UserInfo: The updated user's information, including the updated role.
@@ -85,8 +95,8 @@ def update_user_role(
     """
     if not user.role:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Role cannot be empty")
-    db_user = crud.get_user_by_email(db, current_user.email)
+    db_user = await crud.get_user_by_email(db, current_user.email)
     if not db_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    updated_user = crud.update_user_role(db=db, db_user=current_user, new_role=user.role)
+    updated_user = await crud.update_user_role(db=db, db_user=db_user, new_role=user.role)
     return UserInfo(email=updated_user.email, role=updated_user.role)
@@ -1,131 +1,99 @@
-from langchain.chains.llm import LLMChain
-from langchain.chains.conversational_retrieval.base import ConversationalRetrievalChain
-from langchain.memory import CombinedMemory, ConversationSummaryMemory, ConversationEntityMemory
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.schema import SystemMessage, AIMessage, HumanMessage
-from langchain_community.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI, OpenAI
+import asyncio
+import base64
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator
 
+from langchain.schema import SystemMessage, AIMessage, HumanMessage
+from langchain_core.documents import Document
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import tracing
+from app.core.config import settings
+from app.core.single_flight import normalize_question
+from app.core.timing import StageTimings
+from app.rag.cache import CachedAnswer
+from app.rag.classifier import QuestionClassification, classify_question_locally
+from app.rag.context import count_tokens, format_context, pack_context
+from app.rag.memory import format_conversation, format_entities, merge_entities
+from app.rag.pipeline import AIPipeline
 from app.schemas.chat import ChatBase
+from app.db import crud
+from app.db.database import SessionLocal, release_connection
 from app.db.models.chat import ChatDB
+from app.db.models.question_answer import QuestionAnswerDB
 from app.schemas.question_answer import QuestionAnswerBase
 from app.schemas.question_answer import AnswerMetadata
 
-faiss_index_path = "app/api/routes/faiss_index"
+logger = logging.getLogger(__name__)
 
-instructions = """
-    You are a knowledgeable assistant. Answer the questions based on the ongoing conversation.
-"""
 
-qa_system_prompt = """
-    You are a climate crisis specialist. 
-    Use the following context from retrieved documents and, if you think is useful, the chat history to answer the user's question.
-    Also, {instruction}
-    Context: {context},
+async def detect_question_type(pipeline: AIPipeline, question: str) -> QuestionClassification:
+    """
+    Classify the question as either 'general' or 'specific'.
 
-    Chat History: {chat_history}, 
+    Depending on `QUESTION_CLASSIFIER_MODE`, the question is scored in-process against the climate
+    vocabulary, sent to the LLM, or scored locally and only sent to the LLM when the local
+    classifier is not confident enough.
 
-    Question: {question}
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        question (str): The question to classify.
 
-    Rethink about your answer and make sure it is accurate and informative.
-    If you don't feel confident about the answer, you can admit that you are not completley sure and ask for more information.
+    Returns:
+        QuestionClassification: The classification and the path ('keyword' or 'llm') that decided it.
     """
-
-general_question_prompt_template = """
-    You are an assistant trained to identify the type of question. Classify the question as follows:
-    - Answer "General" if the question is about trivial or everyday topics, or unrelated to the climate crisis, and can be answered without consulting specific documents or data.
-    - Answer "Specific" only if the question involves climate-related topics or requires consulting detailed information from a climate crisis database.
-
-    Question: {question}
-    Classification:
+    mode = settings.QUESTION_CLASSIFIER_MODE
+    if mode != "llm":
+        classification = classify_question_locally(question)
+        if mode == "local" or classification.confidence >= settings.QUESTION_CLASSIFIER_CONFIDENCE_THRESHOLD:
+            logger.info("Question classified as %s by %s (confidence %.2f)", classification.question_type, classification.source, classification.confidence)
+            tracing.set_span_attributes(question_type=classification.question_type, classifier=classification.source)
+            return classification
+
+    result = await pipeline.classification_chain.ainvoke({"question": question})
+    question_type = "specific" if "specific" in result["text"].strip().lower() else "general"
+    classification = QuestionClassification(question_type=question_type, confidence=1.0, source="llm")
+    logger.info("Question classified as %s by %s", classification.question_type, classification.source)
+    tracing.set_span_attributes(question_type=classification.question_type, classifier=classification.source)
+    return classification
+
+
+def select_verbatim_turns(turns: list[QuestionAnswerDB]) -> list[QuestionAnswerDB]:
     """
+    Selects the turns of a chat sent verbatim to the LLM: the last `HISTORY_MAX_TURNS` turns,
+    going back from the most recent until `HISTORY_TOKEN_BUDGET` is spent.
 
-score_threshold = 0.8
-
-# Initialize models and embeddings
-llm = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0.7,
-    frequency_penalty=0.5,
-    presence_penalty=0.3,
-)
-embeddings = OpenAIEmbeddings()
-faiss = FAISS.load_local(faiss_index_path, embeddings, allow_dangerous_deserialization=True)
-retriever = faiss.as_retriever(
-    search_type="similarity_score_threshold", 
-    search_kwargs={"score_threshold": 0.78, 'k': 3}
-)
-
-# Memory modules to track conversation
-summary_memory = ConversationSummaryMemory(llm=OpenAI(), memory_key="summary_history")
-entity_memory = ConversationEntityMemory(llm=OpenAI(), memory_key="entity_info")
-memory = CombinedMemory(memories=[summary_memory, entity_memory])
-
-# Prompt template for generating questions
-question_maker_prompt = ChatPromptTemplate(
-    [
-        ("system", instructions),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("human", "{question}"),
-    ]
-)
-
-# Chain to generate the question
-question_chain = LLMChain(
-    llm=llm,
-    prompt=question_maker_prompt,
-    memory=memory
-)
-
-# Prompt template for question answering
-qa_prompt = ChatPromptTemplate.from_template(qa_system_prompt)
-
-# Retrieval-based question answering chain
-retriever_chain = ConversationalRetrievalChain.from_llm(
-    llm=llm,
-    retriever=retriever,
-    return_source_documents=True
-)
-
-# RAG chain combining retriever and LLM
-rag_chain = (
-    retriever_chain
-    | qa_prompt
-    | llm
-    | StrOutputParser()
-)
-
-# Question classification prompt
-question_classifier_prompt = ChatPromptTemplate.from_template(general_question_prompt_template)
-
-# Chain to classify questions
-classification_chain = LLMChain(
-    llm=llm,
-    prompt=question_classifier_prompt
-)
-
-
-def detect_question_type(question: str) -> str:
-    """
-    Use the LLM to classify the question as either 'general' or 'specific'.
+    The older turns are left to the rolling summary, by `update_chat_memory`.
 
     Args:
-        question (str): The question to classify.
+        turns (list[QuestionAnswerDB]): The most recent turns of the chat, oldest first.
 
     Returns:
-        str: The classification of the question as either 'general' or 'specific'.
+        list[QuestionAnswerDB]: The turns sent verbatim, oldest first.
     """
-    result = classification_chain.invoke({"question": question})
-    return result["text"].strip().lower()
+    verbatim_turns = []
+    remaining = settings.HISTORY_TOKEN_BUDGET
+    for qa in reversed(turns[-settings.HISTORY_MAX_TURNS:]):
+        remaining -= count_tokens(qa.question) + count_tokens(qa.answer)
+        if remaining < 0:
+            break
+        verbatim_turns.append(qa)
+    return verbatim_turns[::-1]
 
 
-def fetch_chat_history(db_chat: ChatDB | None):
+async def fetch_chat_history(db: AsyncSession, db_chat: ChatDB | None):
     """
     Fetches the previous conversation history from the database and prepares it for the LLM prompt.
 
+    Only the turns selected by `select_verbatim_turns` are sent verbatim, older turns being
+    represented by the rolling summary of the chat, along with its entity memory.
+
     Args:
+        db (AsyncSession): The SQLAlchemy database session.
         db_chat (ChatDB | None): The chat history stored in the database.
 
     Returns:
@@ -133,13 +101,83 @@ def fetch_chat_history(db_chat: ChatDB | None):
     """
     chat_history = [SystemMessage(content="You're a helpful assistant")]
     if db_chat:
-        for qa in db_chat.conversation:
+        if db_chat.history_summary:
+            chat_history.append(SystemMessage(content=f"Summary of the earlier conversation: {db_chat.history_summary}"))
+        if db_chat.entities:
+            chat_history.append(SystemMessage(content=f"Entities discussed in the conversation:\n{format_entities(db_chat.entities)}"))
+
+        turns = await crud.get_recent_question_answers(db, db_chat.id, settings.HISTORY_MAX_TURNS)
+        for qa in select_verbatim_turns(turns):
             chat_history.append(HumanMessage(content=qa.question))
             chat_history.append(AIMessage(content=qa.answer))
     
     return chat_history
 
 
+async def update_chat_memory(pipeline: AIPipeline, chat_id: uuid.UUID) -> None:
+    """
+    Updates the memory of a chat with its new turns: the entities they discuss are merged into
+    the entity memory, and the turns no longer sent verbatim to the LLM, either because they left
+    the last `HISTORY_MAX_TURNS` or because they don't fit `HISTORY_TOKEN_BUDGET`, are added to
+    the rolling summary.
+
+    Nothing is done until the chat gets its first follow-up: most chats stop at their first question,
+    which doesn't need a memory, and the first turn is then processed along with the follow-up.
+
+    Meant to run as a background task once the answer is sent: it opens its own database sessions
+    and doesn't hold a connection while the LLM runs. The memory is only saved if no concurrent
+    update included the same turns first. Failures are logged, the turns being processed again
+    by the next update.
+
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        chat_id (UUID): The ID of the chat.
+    """
+    async with SessionLocal() as db:
+        db_chat = await crud.get_chat_by_id(db, chat_id)
+        if db_chat is None:
+            return
+        offset = min(db_chat.summarized_turns, db_chat.entity_turns)
+        turns = await crud.get_question_answers_from(db, chat_id, offset)
+
+    total_turns = offset + len(turns)
+    if total_turns < 2:
+        return
+    new_turns = turns[db_chat.entity_turns - offset:]
+    # The same turns as those left out of the chat history by `fetch_chat_history`
+    verbatim_turns = select_verbatim_turns(turns)
+    turns_to_summarize = turns[db_chat.summarized_turns - offset:len(turns) - len(verbatim_turns)]
+
+    history_summary, summarized_turns = db_chat.history_summary, db_chat.summarized_turns
+    entities, entity_turns = db_chat.entities, db_chat.entity_turns
+    timings = StageTimings()
+    try:
+        if new_turns:
+            with timings.measure("entity_extraction"):
+                new_entities = await pipeline.entity_chain.ainvoke({
+                    "entities": format_entities(entities) or "none",
+                    "conversation": format_conversation(new_turns)
+                })
+            entities = merge_entities(entities, new_entities, settings.MEMORY_MAX_ENTITIES)
+            entity_turns = total_turns
+        if turns_to_summarize:
+            with timings.measure("history_summary"):
+                history_summary = await pipeline.summary_chain.ainvoke({
+                    "summary": history_summary or "",
+                    "conversation": format_conversation(turns_to_summarize)
+                })
+            summarized_turns += len(turns_to_summarize)
+    except Exception:
+        logger.exception("Failed to update the memory of chat %s", chat_id)
+    if (summarized_turns, entity_turns) == (db_chat.summarized_turns, db_chat.entity_turns):
+        return
+
+    async with SessionLocal() as db:
+        updated = await crud.update_chat_memory(db, db_chat, history_summary, summarized_turns, entities, entity_turns)
+    if not updated:
+        logger.info("Memory of chat %s was updated concurrently", chat_id)
+
+
 def get_system_message(role: str) -> SystemMessage:
     """
     Generates a system message based on the role of the user.
@@ -158,72 +196,196 @@ def get_system_message(role: str) -> SystemMessage:
     return SystemMessage(content=role_based_instructions.get(role, "Explain in a simple way."))
 
 
-def handle_general_question(question: str) -> str:
+def get_cache_scope(db_chat: ChatDB | None, role: str) -> tuple | None:
+    """
+    Determines the semantic cache scope of a question.
+
+    Answers are only shared between users that receive the same role instructions, and between
+    questions that are both either the first question of a chat or a follow-up.
+
+    Args:
+        db_chat (ChatDB | None): The chat history stored in the database.
+        role (str): The role of the user asking the question.
+
+    Returns:
+        tuple | None: The scope of the question, or None if its answer must not be cached.
+    """
+    is_follow_up = db_chat is not None
+    if not settings.SEMANTIC_CACHE_ENABLED or (is_follow_up and not settings.SEMANTIC_CACHE_FOLLOW_UPS):
+        return None
+    return (get_system_message(role).content, is_follow_up)
+
+
+async def handle_general_question(pipeline: AIPipeline, question: str) -> str:
     """
     Processes general questions (do not require document context).
 
     Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
         question (str): The general question to process.
 
     Returns:
         str: The AI's response to the general question.
     """
-    ai_message = llm.predict(f"Question: {question}")
+    ai_message = await pipeline.general_chain.ainvoke(f"Question: {question}")
     
     return ai_message
 
 
-def handle_specific_question(db_chat: ChatDB | None, question: str, role: str):
+async def retrieve_documents(pipeline: AIPipeline, question: str) -> list[Document]:
+    """
+    Retrieves the documents relevant to the question.
+
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        question (str): The question to search for.
+
+    Returns:
+        list[Document]: The relevant documents.
+    """
+    documents = await pipeline.retriever.ainvoke(question)
+    tracing.set_span_attributes(documents=len(documents))
+    return documents
+
+
+async def classify_and_retrieve(pipeline: AIPipeline, question: str, timings: StageTimings) -> tuple[QuestionClassification, list[Document] | None]:
+    """
+    Classifies the question and, for specific questions, retrieves the relevant documents.
+
+    When `SPECULATIVE_RETRIEVAL` is enabled, the retrieval starts at the same time as the
+    classification instead of after it, taking it off the critical path of specific questions.
+    Its result is dropped (and the search cancelled if still running) for general questions.
+
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        question (str): The question asked by the user.
+        timings (StageTimings): Where the duration of each stage is recorded.
+
+    Returns:
+        tuple: A tuple containing the classification and, for specific questions, the retrieved documents.
+    """
+    async def timed_retrieval() -> list[Document]:
+        with timings.measure("retrieval"):
+            return await retrieve_documents(pipeline, question)
+
+    if not settings.SPECULATIVE_RETRIEVAL:
+        with timings.measure("classification"):
+            classification = await detect_question_type(pipeline, question)
+        if classification.question_type != "specific":
+            return classification, None
+        return classification, await timed_retrieval()
+
+    with timings.measure("classification_and_retrieval"):
+        retrieval = asyncio.create_task(timed_retrieval())
+        try:
+            with timings.measure("classification"):
+                classification = await detect_question_type(pipeline, question)
+        except BaseException:
+            retrieval.cancel()
+            raise
+        if classification.question_type != "specific":
+            retrieval.cancel()
+            return classification, None
+        context = await retrieval
+
+    durations = timings.durations
+    durations["speculation_saved"] = durations["classification"] + durations["retrieval"] - durations["classification_and_retrieval"]
+    return classification, context
+
+
+def select_context(pipeline: AIPipeline, context: list[Document]) -> list[Document]:
     """
-    Processes specific questions by retrieving relevant documents and answering based on them.
+    Selects the retrieved documents that go into the prompt.
+
+    Near-duplicates are dropped, comparing the vectors already stored in the index, and the
+    remaining documents are packed, most relevant first, within `CONTEXT_TOKEN_BUDGET` tokens.
 
     Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        context (list[Document]): The documents retrieved for the question, most relevant first.
+
+    Returns:
+        list[Document]: The documents to put in the prompt.
+    """
+    return pack_context(
+        context,
+        token_budget=settings.CONTEXT_TOKEN_BUDGET,
+        duplicate_threshold=settings.CONTEXT_DUPLICATE_THRESHOLD,
+        vectors=pipeline.document_vectors(context)
+    )
+
+
+async def build_specific_question_inputs(
+    pipeline: AIPipeline, db: AsyncSession, db_chat: ChatDB | None, question: str, role: str, context: list[Document]
+) -> tuple[dict, list[AnswerMetadata]]:
+    """
+    Builds the inputs of the RAG chain from the documents retrieved for a specific question.
+
+    The documents are retrieved once per turn, by `classify_and_retrieve`, and only those
+    packed into the prompt are listed in the answer metadata.
+
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        db (AsyncSession): The SQLAlchemy database session.
         db_chat (ChatDB | None): The chat history stored in the database.
         question (str): The specific question to process.
         role (str): The role of the user asking the question.
+        context (list[Document]): The documents retrieved for the question.
 
     Returns:
-        tuple: A tuple containing the AI's message and metadata about the documents used to answer.
+        tuple: A tuple containing the RAG chain inputs and metadata about the documents used to answer.
     """
-    chat_history = fetch_chat_history(db_chat=db_chat)
-    context = retriever.get_relevant_documents(question)
+    chat_history = await fetch_chat_history(db, db_chat=db_chat)
+    await release_connection(db)
     instruction = get_system_message(role)
+    documents = select_context(pipeline, context)
+
+    answer_metadatas = [
+        AnswerMetadata(
+            # Text documents have no page number
+            page_number=str(doc.metadata['page_number']) if doc.metadata.get('page_number') is not None else None,
+            file_name=str(doc.metadata.get('file_name'))
+        ) for doc in documents
+    ]
 
-    answer_metadatas = []
+    inputs = {
+        "instruction": instruction,
+        "question": question,
+        "context": format_context(documents),
+        "chat_history": chat_history
+    }
 
-    if not context:
-        ai_message = rag_chain.invoke({
-            "instruction": instruction,
-            "question": question,
-            "context": [""],
-            "chat_history": chat_history
-        })
+    return inputs, answer_metadatas
 
-        return ai_message, answer_metadatas
-    else:
-        ai_message = rag_chain.invoke({
-            "instruction": instruction,
-            "question": question,
-            "context": context[0],
-            "chat_history": chat_history
-        })
-
-        for doc in context:
-            answer_metadatas.append(
-                AnswerMetadata(
-                    page_number=str(doc.metadata.get('page_number')),
-                    file_name=str(doc.metadata.get('file_name'))
-                )
-            )
-
-        return ai_message, answer_metadatas
+
+async def handle_specific_question(pipeline: AIPipeline, db: AsyncSession, db_chat: ChatDB | None, question: str, role: str, context: list[Document]):
+    """
+    Processes specific questions by answering based on the documents retrieved for them.
+
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        db (AsyncSession): The SQLAlchemy database session.
+        db_chat (ChatDB | None): The chat history stored in the database.
+        question (str): The specific question to process.
+        role (str): The role of the user asking the question.
+        context (list[Document]): The documents retrieved for the question.
+
+    Returns:
+        tuple: A tuple containing the AI's message and metadata about the documents used to answer.
+    """
+    inputs, answer_metadatas = await build_specific_question_inputs(pipeline, db, db_chat, question, role, context)
+    ai_message = await pipeline.rag_chain.ainvoke(inputs)
+
+    return ai_message, answer_metadatas
     
 
-def ask_question_ai(db_chat: ChatDB | None, question: ChatBase, role: str) -> QuestionAnswerBase:
+async def ask_question_ai(pipeline: AIPipeline, db: AsyncSession, db_chat: ChatDB | None, question: ChatBase, role: str) -> QuestionAnswerBase:
     """
     Handles AI question answering, classifying the question and processing accordingly.
 
     Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        db (AsyncSession): The SQLAlchemy database session.
         db_chat (ChatDB | None): The chat history stored in the database.
         question (ChatBase): The question asked by the user.
         role (str): The role of the user asking the question.
@@ -231,17 +393,213 @@ def ask_question_ai(db_chat: ChatDB | None, question: ChatBase, role: str) -> Qu
     Returns:
         QuestionAnswerBase: The AI's answer and any relevant metadata.
     """
-    question_type = detect_question_type(question.question)
+    # No connection is held while the LLM runs: the session checks one out again for the chat history.
+    await release_connection(db)
+    timings = StageTimings()
+    cache_scope = get_cache_scope(db_chat, role)
+    if cache_scope is not None:
+        with timings.measure("semantic_cache"):
+            question_embedding = await pipeline.embeddings.aembed_query(question.question)
+            cached_answer = pipeline.semantic_cache.lookup(question_embedding, cache_scope)
+        if cached_answer:
+            logger.info("Answered from the semantic cache: %s", timings)
+            return QuestionAnswerBase(question=question.question, answer=cached_answer.answer, answer_metadata=cached_answer.answer_metadata)
+
+    classification, context = await classify_and_retrieve(pipeline, question.question, timings)
     answer_metadatas = []
     
-    if question_type == "specific":
-        ai_message, answer_metadatas = handle_specific_question(db_chat, question.question, role)
-    else:
-        ai_message = handle_general_question(question.question)
+    with timings.measure("generation"):
+        if classification.question_type == "specific":
+            ai_message, answer_metadatas = await handle_specific_question(pipeline, db, db_chat, question.question, role, context)
+        else:
+            ai_message = await handle_general_question(pipeline, question.question)
+    logger.info("Answered %s question: %s", classification.question_type, timings)
+
+    if cache_scope is not None and ai_message:
+        pipeline.semantic_cache.store(question_embedding, cache_scope, CachedAnswer(answer=ai_message, answer_metadata=answer_metadatas))
     
     return QuestionAnswerBase(question=question.question, answer=ai_message, answer_metadata=answer_metadatas)
     
 
+async def ask_first_question_ai(pipeline: AIPipeline, db: AsyncSession, question: ChatBase, role: str) -> QuestionAnswerBase:
+    """
+    Answers the first question of a new chat, like `ask_question_ai`.
+
+    If `SINGLE_FLIGHT_ENABLED`, identical questions (ignoring case and whitespace) asked at the
+    same time by users with the same role are answered once: the requests arriving while the
+    answer is being generated wait for it, instead of running the whole pipeline again.
+
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        db (AsyncSession): The SQLAlchemy database session.
+        question (ChatBase): The question asked by the user.
+        role (str): The role of the user asking the question.
+
+    Returns:
+        QuestionAnswerBase: The AI's answer and any relevant metadata.
+    """
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return await ask_question_ai(pipeline=pipeline, db=db, db_chat=None, question=question, role=role)
+
+    async def answer() -> QuestionAnswerBase:
+        # The answer outlives the request that started it if it is cancelled, and with it its session.
+        async with SessionLocal() as answer_db:
+            return await ask_question_ai(pipeline=pipeline, db=answer_db, db_chat=None, question=question, role=role)
+
+    # The waiting requests don't hold a connection either.
+    await release_connection(db)
+    response = await pipeline.first_questions.do((normalize_question(question.question), role), answer)
+    return response.model_copy(update={"question": question.question})
+    
+
+async def stream_question_ai(pipeline: AIPipeline, db: AsyncSession, db_chat: ChatDB | None, question: ChatBase, role: str) -> tuple[list[AnswerMetadata], AsyncIterator[str]]:
+    """
+    Streaming counterpart of `ask_question_ai`.
+
+    The question is classified and, if needed, the documents are retrieved before returning,
+    so the chat history is read while the caller's database session is still open. The answer
+    itself is only generated while the returned iterator is consumed.
+
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        db (AsyncSession): The SQLAlchemy database session.
+        db_chat (ChatDB | None): The chat history stored in the database.
+        question (ChatBase): The question asked by the user.
+        role (str): The role of the user asking the question.
+
+    Returns:
+        tuple: A tuple containing the metadata about the documents used to answer and an async iterator over the answer tokens.
+    """
+    # No connection is held while the LLM runs: the session checks one out again for the chat history.
+    await release_connection(db)
+    timings = StageTimings()
+    cache_scope = get_cache_scope(db_chat, role)
+    if cache_scope is not None:
+        with timings.measure("semantic_cache"):
+            question_embedding = await pipeline.embeddings.aembed_query(question.question)
+            cached_answer = pipeline.semantic_cache.lookup(question_embedding, cache_scope)
+        if cached_answer:
+            logger.info("Answered from the semantic cache: %s", timings)
+            return cached_answer.answer_metadata, replay_answer(cached_answer.answer)
+
+    classification, context = await classify_and_retrieve(pipeline, question.question, timings)
+    answer_metadatas = []
+
+    if classification.question_type == "specific":
+        inputs, answer_metadatas = await build_specific_question_inputs(pipeline, db, db_chat, question.question, role, context)
+        tokens = pipeline.rag_chain.astream(inputs)
+    else:
+        tokens = pipeline.general_chain.astream(f"Question: {question.question}")
+    logger.info("Streaming answer to %s question: %s", classification.question_type, timings)
+    tokens = time_streamed_answer(tokens, timings)
+
+    if cache_scope is not None:
+        tokens = cache_streamed_answer(pipeline, tokens, question_embedding, cache_scope, answer_metadatas)
+    return answer_metadatas, tokens
+
+
+async def replay_answer(answer: str) -> AsyncIterator[str]:
+    """
+    Streams an already generated answer as a single token.
+
+    Args:
+        answer (str): The answer to stream.
+
+    Yields:
+        str: The answer.
+    """
+    yield answer
+
+
+async def time_streamed_answer(tokens: AsyncIterator[str], timings: StageTimings) -> AsyncIterator[str]:
+    """
+    Forwards the streamed answer tokens, measuring the time to the first token and to the end of the stream.
+
+    Args:
+        tokens (AsyncIterator[str]): The answer tokens.
+        timings (StageTimings): Where the duration of each stage is recorded.
+
+    Yields:
+        str: The answer tokens.
+    """
+    with timings.measure("generation"):
+        start = time.perf_counter()
+        async for token in tokens:
+            if "first_token" not in timings.durations:
+                timings.record("first_token", time.perf_counter() - start)
+            yield token
+    logger.info("Streamed answer: %s", timings)
+
+
+async def cache_streamed_answer(
+    pipeline: AIPipeline, tokens: AsyncIterator[str], question_embedding: list[float], cache_scope: tuple, answer_metadatas: list[AnswerMetadata]
+) -> AsyncIterator[str]:
+    """
+    Forwards the streamed answer tokens and stores the full answer in the semantic cache once the stream ends.
+
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        tokens (AsyncIterator[str]): The answer tokens.
+        question_embedding (list[float]): The embedding of the question.
+        cache_scope (tuple): The semantic cache scope of the question.
+        answer_metadatas (list[AnswerMetadata]): Metadata about the documents used to answer.
+
+    Yields:
+        str: The answer tokens.
+    """
+    answer = []
+    async for token in tokens:
+        answer.append(token)
+        yield token
+    if answer:
+        pipeline.semantic_cache.store(question_embedding, cache_scope, CachedAnswer(answer="".join(answer), answer_metadata=answer_metadatas))
+
+
+def format_sse_event(event: str, data: Any) -> str:
+    """
+    Formats a Server-Sent Event.
+
+    Args:
+        event (str): The name of the event.
+        data (Any): The JSON serializable payload of the event.
+
+    Returns:
+        str: The event encoded following the Server-Sent Events format.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    """
+    Encodes the position of the last row of a page into an opaque pagination cursor.
+
+    Args:
+        created_at (datetime): The creation time of the row.
+        row_id (UUID): The ID of the row.
+
+    Returns:
+        str: The cursor.
+    """
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    """
+    Decodes a pagination cursor created by `encode_cursor`.
+
+    Args:
+        cursor (str): The cursor.
+
+    Returns:
+        tuple[datetime, UUID]: The creation time and the ID of the last row of the page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+
+
 def create_chat_title(question: ChatBase) -> str:
     """
     Creates a title for the chat based on the question.
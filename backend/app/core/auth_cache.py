@@ -0,0 +1,116 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """
+    Identity of the user authenticated by an access token.
+
+    Attributes:
+        id (UUID): The unique identifier of the user.
+        email (str): The email address of the user.
+        role (str): The role of the user.
+    """
+    id: uuid.UUID
+    email: str
+    role: str
+
+
+class TokenCache:
+    """
+    Per-worker cache of the users authenticated by access tokens, keyed by the hash of the token.
+
+    Entries expire with their token. Changing the role of a user drops the entries of the user
+    and marks every token issued before the change as stale, so that their claims are no longer
+    trusted by this worker. The other workers trust them until they expire, which only access
+    tokens are accepted for: refreshing them reads the role from the database again.
+
+    Attributes:
+        max_entries (int): Maximum number of cached tokens.
+        hits (int): Number of tokens found in the cache.
+        misses (int): Number of tokens that had to be decoded.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[AuthenticatedUser, float]] = OrderedDict()
+        self._role_changes: dict[uuid.UUID, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> AuthenticatedUser | None:
+        """
+        Looks up the user authenticated by a token.
+
+        Args:
+            token (str): The access token.
+
+        Returns:
+            AuthenticatedUser | None: The user, or None if the token is not cached or has expired.
+        """
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def store(self, token: str, user: AuthenticatedUser, expires_at: float) -> None:
+        """
+        Caches the user authenticated by a token until the token expires.
+
+        Args:
+            token (str): The access token.
+            user (AuthenticatedUser): The user.
+            expires_at (float): The expiration time of the token, as a Unix timestamp.
+        """
+        with self._lock:
+            self._entries[self._key(token)] = (user, expires_at)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_stale(self, user_id: uuid.UUID, issued_at: float) -> bool:
+        """
+        Checks whether a token was issued before the last role change of its user in this worker.
+
+        Args:
+            user_id (UUID): The unique identifier of the user.
+            issued_at (float): The issue time of the token, as a Unix timestamp.
+
+        Returns:
+            bool: True if the claims of the token may be outdated.
+        """
+        with self._lock:
+            changed_at = self._role_changes.get(user_id)
+        return changed_at is not None and issued_at <= changed_at
+
+    def invalidate_user(self, user_id: uuid.UUID) -> None:
+        """
+        Drops the cached tokens of a user and marks the tokens issued until now as stale.
+
+        Args:
+            user_id (UUID): The unique identifier of the user.
+        """
+        with self._lock:
+            self._role_changes[user_id] = time.time()
+            for key in [key for key, (user, _) in self._entries.items() if user.id == user_id]:
+                del self._entries[key]
+
+
+token_cache = TokenCache(max_entries=settings.TOKEN_CACHE_MAX_ENTRIES)
@@ -16,11 +16,65 @@ class Settings(BaseSettings):
         POSTGRES_DB (str): Name of the PostgreSQL database.
         POSTGRES_HOST (str): Host address for the PostgreSQL database.
         POSTGRES_PORT (int): Port number for the PostgreSQL database.
+        DB_POOL_SIZE (int): Number of database connections kept open per worker.
+        DB_MAX_OVERFLOW (int): Number of connections opened beyond the pool size under load, closed once returned.
+        DB_POOL_TIMEOUT (float): Time (in seconds) to wait for a connection before failing the request.
+        DB_POOL_PRE_PING (bool): Whether connections are checked before use, replacing those closed by the server.
+        DB_POOL_RECYCLE (int): Age (in seconds) after which a connection is replaced, -1 to keep connections forever.
+        DB_PGBOUNCER_MODE (bool): Whether the database is reached through PgBouncer in transaction pooling mode,
+            which requires server-side prepared statements to be disabled.
         OPENAI_API_KEY (str): API key for accessing OpenAI services.
+        OPENAI_BASE_URL (str | None): Base URL of the OpenAI API, e.g. a local stub for load tests; None for the official API.
         ALGORITHM (str): Encryption algorithm for token signing.
         SECRET_KEY (str): Secret key for signing tokens (generated securely).
         ACCESS_TOKEN_EXPIRE_MINUTES (int): Expiration time (in minutes) for access tokens.
         REFRESH_TOKEN_EXPIRE_DAYS (int): Expiration time (in days) for refresh tokens.
+        FAISS_INDEX_PATH (str): Directory where the FAISS index of the documents is saved.
+        FAISS_INDEX_TYPE (str): Index searched in memory: 'flat' (exact), 'flat_fp16', 'ivf_flat', 'ivf_pq' or 'hnsw'.
+        FAISS_IVF_NLIST (int): Number of inverted lists of the IVF indexes.
+        FAISS_IVF_NPROBE (int): Number of inverted lists visited per search by the IVF indexes.
+        FAISS_PQ_M (int): Number of sub-quantizers of the IVF-PQ index, must divide the embedding dimension.
+        FAISS_HNSW_M (int): Number of neighbors per node of the HNSW graph.
+        FAISS_HNSW_EF_SEARCH (int): Size of the candidate list per search of the HNSW index.
+        FAISS_INDEX_RELOAD_INTERVAL_SECONDS (float): Time (in seconds) between two checks of the FAISS index files,
+            a changed index being reloaded and the cached answers dropped; 0 to only load it at startup.
+        WARMUP_ON_STARTUP (bool): Whether a dummy question is embedded and searched before the worker reports itself ready.
+        QUESTION_CLASSIFIER_MODE (str): How questions are classified: 'local' (keywords only),
+            'hybrid' (keywords, falling back to the LLM when not confident) or 'llm'.
+        QUESTION_CLASSIFIER_CONFIDENCE_THRESHOLD (float): Minimum confidence of the local classifier
+            for its decision to be kept in 'hybrid' mode.
+        SEMANTIC_CACHE_ENABLED (bool): Whether answers are reused for similar questions.
+        SEMANTIC_CACHE_SIMILARITY_THRESHOLD (float): Minimum cosine similarity between two questions to share an answer.
+        SEMANTIC_CACHE_TTL_SECONDS (int): Time to live (in seconds) of the cached answers.
+        SEMANTIC_CACHE_MAX_ENTRIES (int): Maximum number of cached answers per worker.
+        SEMANTIC_CACHE_FOLLOW_UPS (bool): Whether follow-up questions are cached too.
+        EMBEDDING_CACHE_ENABLED (bool): Whether the embeddings of already seen texts are reused.
+        EMBEDDING_CACHE_PATH (str | None): SQLite file shared by the workers to persist the embeddings, None to keep them in memory only.
+        EMBEDDING_CACHE_MAX_MEMORY_ENTRIES (int): Maximum number of embeddings kept in memory per worker.
+        SPECULATIVE_RETRIEVAL (bool): Whether the documents are retrieved while the question is being classified.
+        HYBRID_RETRIEVAL_ENABLED (bool): Whether a BM25 lexical search is merged with the vector search.
+        HYBRID_RRF_K (int): Damping constant of the reciprocal rank fusion of the lexical and vector results.
+        RETRIEVAL_K (int): Number of chunks retrieved per question, before they are packed into the prompt.
+        CONTEXT_TOKEN_BUDGET (int): Maximum number of tokens of the retrieved chunks put in the prompt.
+        CONTEXT_DUPLICATE_THRESHOLD (float): Cosine similarity above which a retrieved chunk is dropped as a near-duplicate.
+        HISTORY_MAX_TURNS (int): Number of most recent turns of a chat sent verbatim to the LLM, older ones being summarized.
+        HISTORY_TOKEN_BUDGET (int): Maximum number of tokens of the verbatim turns sent to the LLM.
+        MEMORY_MAX_ENTITIES (int): Maximum number of entities kept in the memory of a chat, least recently mentioned dropped first.
+        TOKEN_CACHE_MAX_ENTRIES (int): Maximum number of access tokens whose user is cached per worker.
+        PASSWORD_HASH_WORKERS (int): Number of threads hashing and verifying passwords per worker.
+        PASSWORD_HASH_MAX_PENDING (int): Maximum number of password operations running or queued per worker, beyond which they are rejected.
+        SINGLE_FLIGHT_ENABLED (bool): Whether concurrent identical first questions of new chats, from users
+            with the same role, share a single answer.
+        JOB_WORKER_CONCURRENCY (int): Number of answer jobs processed at the same time by each job worker process.
+        JOB_POLL_INTERVAL_SECONDS (float): Time (in seconds) between two checks for new jobs by an idle worker,
+            and between two checks of the status of a job by a long-polling request.
+        JOB_TIMEOUT_SECONDS (int): Time (in seconds) after which a running job is considered abandoned and claimed again.
+        JOB_MAX_ATTEMPTS (int): Number of attempts after which a job is marked as failed.
+        JOB_MAX_WAIT_SECONDS (int): Maximum time (in seconds) a request waits for the result of a job.
+        TRACING_ENABLED (bool): Whether the requests are traced, their trace ID being returned in the `X-Trace-ID` header.
+        TRACE_SAMPLE_RATE (float): Share of the traces exported regardless of their duration.
+        TRACE_SLOW_THRESHOLD_SECONDS (float): Duration (in seconds) from which the trace of a request is always exported.
+        TRACE_EXPORT_PATH (str): JSONL file the exported traces are appended to, one span per line.
     """
 
     model_config = SettingsConfigDict(
@@ -31,11 +85,59 @@ class Settings(BaseSettings):
     POSTGRES_DB: str
     POSTGRES_HOST: str
     POSTGRES_PORT: int
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800
+    DB_PGBOUNCER_MODE: bool = False
     OPENAI_API_KEY: str
+    OPENAI_BASE_URL: str | None = None
     ALGORITHM: str = "HS256"
     SECRET_KEY: str = token_urlsafe(32)
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    FAISS_INDEX_PATH: str = "app/api/routes/faiss_index"
+    FAISS_INDEX_TYPE: str = "flat"
+    FAISS_IVF_NLIST: int = 1024
+    FAISS_IVF_NPROBE: int = 16
+    FAISS_PQ_M: int = 64
+    FAISS_HNSW_M: int = 32
+    FAISS_HNSW_EF_SEARCH: int = 64
+    FAISS_INDEX_RELOAD_INTERVAL_SECONDS: float = 30
+    WARMUP_ON_STARTUP: bool = True
+    QUESTION_CLASSIFIER_MODE: str = "hybrid"
+    QUESTION_CLASSIFIER_CONFIDENCE_THRESHOLD: float = 0.7
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 2000
+    SEMANTIC_CACHE_FOLLOW_UPS: bool = False
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str | None = "embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MAX_MEMORY_ENTRIES: int = 10000
+    SPECULATIVE_RETRIEVAL: bool = True
+    HYBRID_RETRIEVAL_ENABLED: bool = True
+    HYBRID_RRF_K: int = 60
+    RETRIEVAL_K: int = 8
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_DUPLICATE_THRESHOLD: float = 0.95
+    HISTORY_MAX_TURNS: int = 6
+    HISTORY_TOKEN_BUDGET: int = 2000
+    MEMORY_MAX_ENTITIES: int = 50
+    TOKEN_CACHE_MAX_ENTRIES: int = 10000
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+    SINGLE_FLIGHT_ENABLED: bool = True
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_POLL_INTERVAL_SECONDS: float = 0.5
+    JOB_TIMEOUT_SECONDS: int = 300
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_MAX_WAIT_SECONDS: int = 30
+    TRACING_ENABLED: bool = True
+    TRACE_SAMPLE_RATE: float = 0.05
+    TRACE_SLOW_THRESHOLD_SECONDS: float = 10
+    TRACE_EXPORT_PATH: str = "traces.jsonl"
 
 
 settings = Settings()
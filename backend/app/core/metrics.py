@@ -0,0 +1,161 @@
+"""
+Prometheus metrics of the worker, served in text format by `GET /metrics`.
+
+Each worker process keeps its own metrics: scrape every worker, or aggregate them by instance.
+"""
+import functools
+import hashlib
+import time
+from typing import Any
+
+from fastapi import FastAPI
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from app.core import tracing
+from app.core.auth_cache import token_cache
+from app.core.password_hasher import password_hasher
+from app.db.database import pool_stats
+
+# From 5ms to 1 minute, covering both the database queries and the LLM calls.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+STAGE_DURATION = Histogram(
+    "gaia_stage_duration_seconds", "Duration of the stages of answering a question.", ["stage"], buckets=LATENCY_BUCKETS
+)
+DB_OPERATION_DURATION = Histogram(
+    "gaia_db_operation_duration_seconds", "Duration of the database operations.", ["operation"], buckets=LATENCY_BUCKETS
+)
+AUTH_DURATION = Histogram(
+    "gaia_auth_duration_seconds", "Duration of the authentication of a request, by the path that resolved the user.",
+    ["path"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "gaia_llm_tokens_total", "Tokens sent to and generated by the LLM.", ["stage", "model", "kind"]
+)
+
+
+def timed_db_operation(func):
+    """
+    Records the duration of an async database operation, labelled with the name of the function,
+    and traces it as a span of the current request.
+
+    Args:
+        func (Callable): The async function to time.
+
+    Returns:
+        Callable: The timed function.
+    """
+    histogram = DB_OPERATION_DURATION.labels(func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"crud.{func.__name__}"):
+                return await func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """
+    LangChain callback counting the prompt and completion tokens of the LLM calls of a stage.
+
+    Streamed calls only report their usage if the chat model is created with `stream_usage=True`.
+
+    Attributes:
+        stage (str): The stage the LLM calls belong to.
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        llm_output = response.llm_output or {}
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                model = llm_output.get("model_name") or message.response_metadata.get("model_name") or "unknown"
+                LLM_TOKENS.labels(self.stage, model, "prompt").inc(usage.get("input_tokens", 0))
+                LLM_TOKENS.labels(self.stage, model, "completion").inc(usage.get("output_tokens", 0))
+
+
+class AppStateCollector(Collector):
+    """
+    Exports, at scrape time, the counters kept by the caches, the coalescing of the first
+    questions, the password hasher and the connection pool of the worker.
+
+    Attributes:
+        app (FastAPI): The application, whose state holds the pipeline.
+    """
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+
+    def collect(self):
+        requests = CounterMetricFamily("gaia_cache_requests", "Lookups of the caches, by result.", labels=["cache", "result"])
+        hit_ratio = GaugeMetricFamily("gaia_cache_hit_ratio", "Share of the lookups of the caches that were hits.", labels=["cache"])
+        caches = {"token": {"hit": token_cache.hits, "miss": token_cache.misses}}
+        pipeline = getattr(self.app.state, "pipeline", None)
+        if pipeline is not None:
+            caches["semantic"] = {"hit": pipeline.semantic_cache.hits, "miss": pipeline.semantic_cache.misses}
+            embeddings = pipeline.embeddings
+            if hasattr(embeddings, "memory_hits"):
+                caches["embedding"] = {
+                    "memory_hit": embeddings.memory_hits, "disk_hit": embeddings.disk_hits, "miss": embeddings.misses
+                }
+        for cache, results in caches.items():
+            for result, count in results.items():
+                requests.add_metric([cache, result], count)
+            total = sum(results.values())
+            hit_ratio.add_metric([cache], (total - results["miss"]) / total if total else 0.0)
+        yield requests
+        yield hit_ratio
+
+        if pipeline is not None:
+            first_questions = pipeline.first_questions
+            # The questions are hashed, to keep their text out of the monitoring.
+            waiters = GaugeMetricFamily(
+                "gaia_single_flight_waiters", "Requests waiting for the answer of an identical first question in flight.",
+                labels=["question", "role"]
+            )
+            for (question, role), count in first_questions.waiters().items():
+                waiters.add_metric([hashlib.sha256(question.encode()).hexdigest()[:12], role], count)
+            yield waiters
+            yield CounterMetricFamily("gaia_single_flight_started", "First questions answered by the pipeline.", value=first_questions.started)
+            yield CounterMetricFamily("gaia_single_flight_coalesced", "First questions that shared the answer of an identical question in flight.", value=first_questions.coalesced)
+
+        yield GaugeMetricFamily("gaia_password_hash_pending", "Password operations running or queued.", value=password_hasher.pending)
+        yield CounterMetricFamily("gaia_password_hash_operations", "Completed password operations.", value=password_hasher.operations)
+        yield CounterMetricFamily("gaia_password_hash_rejected", "Password operations rejected because the queue was full.", value=password_hasher.rejected)
+        yield CounterMetricFamily("gaia_password_hash_seconds", "Time spent hashing and verifying passwords.", value=password_hasher.total_seconds)
+
+        pool = pool_stats()
+        yield GaugeMetricFamily("gaia_db_pool_size", "Connections kept open by the pool.", value=pool["size"])
+        yield GaugeMetricFamily("gaia_db_pool_checked_out", "Connections in use.", value=pool["checked_out"])
+        yield GaugeMetricFamily("gaia_db_pool_idle", "Connections idle in the pool.", value=pool["idle"])
+        yield GaugeMetricFamily("gaia_db_pool_overflow", "Connections open beyond the pool size.", value=pool["overflow"])
+        yield CounterMetricFamily("gaia_db_pool_checkouts", "Connections handed out by the pool.", value=pool["checkouts"])
+        yield CounterMetricFamily("gaia_db_pool_timeouts", "Requests that gave up waiting for a connection.", value=pool["timeouts"])
+        yield CounterMetricFamily("gaia_db_pool_wait_seconds", "Time spent waiting for a connection.", value=pool["total_wait_seconds"])
+
+
+def register_app_collector(app: FastAPI) -> None:
+    """
+    Registers the collector of the application state, once per process.
+
+    Args:
+        app (FastAPI): The application.
+    """
+    if getattr(app.state, "metrics_collector", None) is None:
+        app.state.metrics_collector = AppStateCollector(app)
+        REGISTRY.register(app.state.metrics_collector)
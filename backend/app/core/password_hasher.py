@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from app.core.config import settings
+from app.core.security import get_password_hash, verify_password
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when too many password operations are already waiting for the hashing threads.
+    """
+
+
+class PasswordHasher:
+    """
+    Runs the bcrypt hashing and verification of passwords on dedicated threads.
+
+    bcrypt is CPU bound: running it on its own small pool keeps login bursts from starving the
+    threads and the CPU used by the rest of the requests. Operations beyond `max_pending` are
+    rejected instead of queued.
+
+    Attributes:
+        max_pending (int): Maximum number of operations running or waiting for a thread.
+        pending (int): Number of operations running or waiting for a thread.
+        operations (int): Number of completed operations.
+        rejected (int): Number of operations rejected because the queue was full.
+        total_seconds (float): Time spent hashing and verifying, excluding the wait for a thread.
+        max_seconds (float): Longest operation, excluding the wait for a thread.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self.pending = 0
+        self.operations = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hasher")
+        self._dummy_hash: str | None = None
+
+    async def hash(self, password: str) -> str:
+        """
+        Hashes a password.
+
+        Args:
+            password (str): The plain text password.
+
+        Returns:
+            str: The hashed password.
+
+        Raises:
+            PasswordHasherBusy: If the queue of operations is full.
+        """
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str | None) -> bool:
+        """
+        Verifies a password against its hash.
+
+        Without a hash, e.g. for an unknown email, the password is verified against a dummy
+        hash, so that the response takes as long as for an existing user.
+
+        Args:
+            password (str): The plain text password.
+            hashed_password (str | None): The hashed password, None if there is no user.
+
+        Returns:
+            bool: True if the password matches, always False without a hash.
+
+        Raises:
+            PasswordHasherBusy: If the queue of operations is full.
+        """
+        if hashed_password is not None:
+            return await self._run(verify_password, password, hashed_password)
+        if self._dummy_hash is None:
+            self._dummy_hash = await self._run(get_password_hash, "dummy password")
+        await self._run(verify_password, password, self._dummy_hash)
+        return False
+
+    def shutdown(self) -> None:
+        """
+        Stops the hashing threads once the running operations are done.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func: Callable[..., T], *args) -> T:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning("Password hashing queue is full (%d pending), rejecting", self.pending)
+            raise PasswordHasherBusy()
+
+        def timed() -> tuple[T, float]:
+            start = time.perf_counter()
+            result = func(*args)
+            return result, time.perf_counter() - start
+
+        # Counted until the thread is done, even if the caller is cancelled, e.g. by a client disconnecting.
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(timed)
+        self.pending += 1
+
+        def done(future: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(self._finish, future)
+            except RuntimeError:
+                # The event loop is closed, e.g. at shutdown.
+                pass
+
+        future.add_done_callback(done)
+        result, _ = await asyncio.wrap_future(future)
+        return result
+
+    def _finish(self, future: Future) -> None:
+        self.pending -= 1
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, seconds = future.result()
+        self.operations += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+password_hasher = PasswordHasher(max_workers=settings.PASSWORD_HASH_WORKERS, max_pending=settings.PASSWORD_HASH_MAX_PENDING)
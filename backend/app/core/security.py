@@ -38,7 +38,7 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     """
     Create a JWT access token.
 
-    This function encodes the given data into a JWT token, with an optional expiration time.
+    This function encodes the given data into a JWT token, with its issue time and an optional expiration time.
 
     Args:
         data (Dict[str, Any]): The data to encode into the JWT token.
@@ -56,7 +56,7 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.now(timezone.utc)})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -0,0 +1,83 @@
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question for coalescing: case and whitespace differences are ignored.
+
+    Args:
+        question (str): The question asked by the user.
+
+    Returns:
+        str: The normalized question.
+    """
+    return " ".join(question.casefold().split())
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical computations: while a computation is in flight for a key,
+    the calls with the same key wait for it and share its result, or its exception.
+
+    The computation runs in its own task, so that the call that started it can be cancelled,
+    e.g. by a client disconnecting, without cancelling it for the waiting calls. As it can outlive
+    that call, it runs in an empty context rather than a copy of the caller's, e.g. outside of the
+    trace of its request, and must not use the resources of the call, such as its database session.
+
+    Attributes:
+        started (int): Number of computations started.
+        coalesced (int): Number of calls that shared the result of a computation in flight.
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.coalesced = 0
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[Hashable, int] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs the computation, unless one is already in flight for the key, and returns its result.
+
+        Args:
+            key (Hashable): The key of the computation.
+            func (Callable[[], Awaitable[T]]): The computation, only called if none is in flight for the key.
+
+        Returns:
+            T: The result of the computation.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = contextvars.Context().run(asyncio.ensure_future, func())
+            self._tasks[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _: self._forget(key, task))
+            self.started += 1
+            return await asyncio.shield(task)
+
+        self._waiters[key] += 1
+        self.coalesced += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if self._tasks.get(key) is task:
+                self._waiters[key] -= 1
+
+    def waiters(self) -> dict[Hashable, int]:
+        """
+        Returns:
+            dict: The number of calls waiting for each computation in flight, besides the call that started it.
+        """
+        return dict(self._waiters)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if not task.cancelled():
+            # Retrieved even if no caller is left to await it, so that the failure isn't logged as never retrieved.
+            task.exception()
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+            del self._waiters[key]
@@ -0,0 +1,49 @@
+import time
+from contextlib import contextmanager
+
+from app.core import tracing
+from app.core.metrics import STAGE_DURATION
+
+
+class StageTimings:
+    """
+    Wall-clock durations of the stages of a request.
+
+    Each measured duration is also recorded in the stage histogram of the metrics endpoint, and
+    each measured stage is traced as a span of the current request.
+
+    Attributes:
+        durations (dict[str, float]): The duration of each measured stage, in seconds.
+    """
+
+    def __init__(self):
+        self.durations: dict[str, float] = {}
+
+    @contextmanager
+    def measure(self, stage: str):
+        """
+        Measures the duration of the code run inside the context.
+
+        Args:
+            stage (str): The name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            with tracing.span(stage):
+                yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, duration: float) -> None:
+        """
+        Records the duration of a stage measured by the caller.
+
+        Args:
+            stage (str): The name of the stage.
+            duration (float): The duration of the stage, in seconds.
+        """
+        self.durations[stage] = duration
+        STAGE_DURATION.labels(stage).observe(duration)
+
+    def __str__(self) -> str:
+        return " ".join(f"{stage}={duration * 1000:.1f}ms" for stage, duration in self.durations.items())
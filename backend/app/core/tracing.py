@@ -0,0 +1,345 @@
+"""
+Request-scoped tracing: the spans of a request, from the route handler down to the LLM and
+database calls, are linked by a trace ID returned in the `X-Trace-ID` response header.
+
+Traces are kept in memory until the request ends, then appended to a JSONL file, one span per
+line, if they are sampled, slow or failed. To inspect a trace:
+    python -m app.core.tracing <trace id> [--path TRACE_EXPORT_PATH]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACE_ID_HEADER = "X-Trace-ID"
+
+
+@dataclass
+class Span:
+    """
+    A timed operation of a request.
+
+    Attributes:
+        trace_id (str): The ID of the trace of the request.
+        span_id (str): The ID of the span.
+        parent_id (str | None): The ID of the enclosing span, None for the route handler.
+        name (str): The name of the operation.
+        start (float): The start time, as a Unix timestamp.
+        attributes (dict): Details of the operation.
+        duration (float | None): The duration in seconds, None while the operation runs.
+        error (str | None): The exception that ended the operation, if any.
+    """
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    name: str
+    start: float
+    attributes: dict[str, Any] = field(default_factory=dict)
+    duration: float | None = None
+    error: str | None = None
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def end(self, error: BaseException | None = None) -> None:
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+@dataclass
+class Trace:
+    """
+    The spans of a request.
+
+    Attributes:
+        trace_id (str): The ID of the trace.
+        sampled (bool): Whether the trace is exported regardless of its duration.
+        spans (list[Span]): The spans of the request, in start order.
+    """
+    trace_id: str
+    sampled: bool
+    spans: list[Span] = field(default_factory=list)
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def current_trace_id() -> str | None:
+    """
+    Returns:
+        str | None: The ID of the trace of the current request, None outside of a traced request.
+    """
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def start_span(name: str, **attributes) -> Span | None:
+    """
+    Starts a span under the current span, without making it the current span.
+
+    Meant for operations that start and end in different callbacks; use `span` otherwise.
+
+    Args:
+        name (str): The name of the operation.
+        **attributes: Details of the operation.
+
+    Returns:
+        Span | None: The span to end, None outside of a traced request.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    new_span = Span(
+        trace_id=trace.trace_id,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent is not None else None,
+        name=name,
+        start=time.time(),
+        attributes=attributes
+    )
+    trace.spans.append(new_span)
+    return new_span
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Traces the code run inside the context as a span of the current request.
+
+    Args:
+        name (str): The name of the operation.
+        **attributes: Details of the operation.
+
+    Yields:
+        Span | None: The span, None outside of a traced request.
+    """
+    new_span = start_span(name, **attributes)
+    if new_span is None:
+        yield None
+        return
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except asyncio.CancelledError:
+        new_span.attributes["cancelled"] = True
+        raise
+    except BaseException as error:
+        new_span.end(error)
+        raise
+    finally:
+        new_span.end()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # An async generator closed from another context, e.g. a cancelled stream.
+            pass
+
+
+def set_span_attributes(**attributes) -> None:
+    """
+    Adds details to the current span, if any.
+
+    Args:
+        **attributes: Details of the operation.
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+
+class LLMSpanHandler(BaseCallbackHandler):
+    """
+    LangChain callback tracing each LLM call of a stage as a span, with its model and token usage.
+
+    Attributes:
+        stage (str): The stage the LLM calls belong to.
+    """
+
+    # Runs in the context of the request, where the current span is set
+    run_inline = True
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._spans: dict[UUID, Span] = {}
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages: list, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, kwargs)
+
+    def on_llm_start(self, serialized: dict[str, Any], prompts: list[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, kwargs)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        llm_span = self._spans.pop(run_id, None)
+        if llm_span is None:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    llm_span.attributes["prompt_tokens"] = usage.get("input_tokens", 0)
+                    llm_span.attributes["completion_tokens"] = usage.get("output_tokens", 0)
+        llm_span.end()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        llm_span = self._spans.pop(run_id, None)
+        if llm_span is not None:
+            llm_span.end(error)
+
+    def _start(self, run_id: UUID, kwargs: dict[str, Any]) -> None:
+        model = (kwargs.get("invocation_params") or {}).get("model_name") or (kwargs.get("metadata") or {}).get("ls_model_name")
+        llm_span = start_span(f"llm.{self.stage}", model=model)
+        if llm_span is not None:
+            self._spans[run_id] = llm_span
+
+
+class JsonlSpanExporter:
+    """
+    Appends the spans of the exported traces to a JSONL file, one span per line.
+
+    Attributes:
+        path (str): The JSONL file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware tracing each HTTP request under a new trace ID, returned in the `X-Trace-ID` header.
+
+    The root span covers the route handler until the last byte of the response, streamed answers
+    included; background tasks run after it and are traced as its children. Traces are exported
+    if they are sampled, took longer than `slow_threshold` or failed.
+
+    Attributes:
+        app (ASGIApp): The wrapped application.
+        exporter (JsonlSpanExporter): Where the traces are exported.
+        sample_rate (float): Share of the traces exported regardless of their duration.
+        slow_threshold (float): Duration (in seconds) from which a trace is always exported.
+    """
+
+    def __init__(self, app, exporter: JsonlSpanExporter, sample_rate: float, slow_threshold: float):
+        self.app = app
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(trace_id=uuid.uuid4().hex, sampled=random.random() < self.sample_rate)
+        trace_token = _current_trace.set(trace)
+        root = start_span(f"{scope['method']} {scope['path']}", path=scope["path"])
+        span_token = _current_span.set(root)
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                root.attributes["status_code"] = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (TRACE_ID_HEADER.lower().encode(), trace.trace_id.encode())]}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                root.end()
+
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        except BaseException as error:
+            root.end(error)
+            raise
+        finally:
+            root.end()
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{scope['method']} {route.path}"
+            failed = any(span.error for span in trace.spans) or root.attributes.get("status_code", 500) >= 500
+            if trace.sampled or failed or root.duration >= self.slow_threshold:
+                try:
+                    await asyncio.to_thread(self.exporter.export, trace.spans)
+                except OSError:
+                    logger.exception("Failed to export trace %s", trace.trace_id)
+
+
+def print_trace(trace_id: str, path: str) -> None:
+    """
+    Prints the spans of a trace as a tree, with their start offset and duration.
+
+    Args:
+        trace_id (str): The ID of the trace, as returned in the `X-Trace-ID` header.
+        path (str): The JSONL file of the exported traces.
+    """
+    with open(path, encoding="utf-8") as file:
+        spans = [span for span in map(json.loads, file) if span["trace_id"] == trace_id]
+    if not spans:
+        print(f"Trace {trace_id} not found in {path}")
+        return
+
+    children = defaultdict(list)
+    for span in sorted(spans, key=lambda span: span["start"]):
+        children[span["parent_id"]].append(span)
+    trace_start = min(span["start"] for span in spans)
+
+    def print_span(span: dict, depth: int) -> None:
+        offset = (span["start"] - trace_start) * 1000
+        attributes = " ".join(f"{key}={value}" for key, value in span["attributes"].items())
+        error = f" ERROR {span['error']}" if span["error"] else ""
+        duration = f"{span['duration_ms']}ms" if span["duration_ms"] is not None else "unfinished"
+        print(f"{'  ' * depth}{span['name']}  +{offset:.1f}ms  {duration}  {attributes}{error}")
+        for child in children[span["span_id"]]:
+            print_span(child, depth + 1)
+
+    for root in children[None]:
+        print_span(root, 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Print the spans of an exported trace.")
+    parser.add_argument("trace_id", help="The ID of the trace, as returned in the X-Trace-ID header.")
+    parser.add_argument("--path", default=settings.TRACE_EXPORT_PATH, help="The JSONL file of the exported traces.")
+    args = parser.parse_args()
+    print_trace(args.trace_id, args.path)
+
+
+if __name__ == "__main__":
+    main()
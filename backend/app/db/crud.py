@@ -1,93 +1,110 @@
-from sqlalchemy import desc
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from sqlalchemy import and_, desc, exists, func, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, selectinload
 import uuid
 
-from app.core.security import (
-    get_password_hash,
-    verify_password,
-)
+from app.core.auth_cache import token_cache
+from app.core.config import settings
+from app.core.metrics import timed_db_operation
+from app.core.password_hasher import password_hasher
 from app.db.models.chat import ChatDB
 from app.db.models.question_answer import QuestionAnswerDB
 from app.db.models.user import UserDB
 from app.schemas.user import UserCreate
 from app.schemas.chat import ChatContent, ChatInfo
-from app.schemas.question_answer import AnswerMetadata
+from app.schemas.question_answer import AnswerMetadata, QuestionAnswerBase
 from app.db.models.answer_metadata import AnswerMetadataDB
+from app.db.models.answer_job import AnswerJobDB
 
 
-def get_user(db: Session, user_id: uuid.UUID) -> UserDB | None:
+@timed_db_operation
+async def get_user(db: AsyncSession, user_id: uuid.UUID) -> UserDB | None:
     """
     Retrieve a user from the database by their user ID.
 
     Args:
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy database session.
         user_id (UUID): The ID of the user to retrieve.
 
     Returns:
         UserDB | None: The user object if found, otherwise None.
     """
-    return db.query(UserDB).filter(UserDB.id == user_id).first()
+    return await db.scalar(select(UserDB).where(UserDB.id == user_id))
 
 
-def get_user_by_email(db: Session, email: str) -> UserDB | None:
+@timed_db_operation
+async def get_user_by_email(db: AsyncSession, email: str) -> UserDB | None:
     """
     Retrieve a user from the database by their email address.
 
     Args:
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy database session.
         email (str): The email address of the user to retrieve.
 
     Returns:
         UserDB | None: The user object if found, otherwise None.
     """
-    return db.query(UserDB).filter(UserDB.email == email).first()
+    return await db.scalar(select(UserDB).where(UserDB.email == email))
 
 
-def create_user(db: Session, user: UserCreate) -> UserDB:
+@timed_db_operation
+async def create_user(db: AsyncSession, user: UserCreate) -> UserDB:
     """
     Create a new user in the database.
 
     Args:
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy database session.
         user (UserCreate): The user information for the new user.
 
     Returns:
         UserDB: The created user object.
+
+    Raises:
+        PasswordHasherBusy: If too many passwords are already waiting to be hashed.
     """
-    hashed_password = get_password_hash(user.password)
+    # bcrypt is CPU bound, keep it off the event loop and off the shared threads.
+    hashed_password = await password_hasher.hash(user.password)
     db_user = UserDB(email=user.email, hashed_password=hashed_password, role=user.role)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def authenticate_user(db: Session, email: str, password: str) -> UserDB | None:
+@timed_db_operation
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> UserDB | None:
     """
     Authenticate a user by their email and password.
 
     Args:
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy database session.
         email (str): The email address of the user.
         password (str): The password provided by the user.
 
     Returns:
         UserDB | None: The authenticated user object if credentials are valid, otherwise None.
+
+    Raises:
+        PasswordHasherBusy: If too many passwords are already waiting to be verified.
     """
-    db_user = get_user_by_email(db, email)
-    if not db_user:
-        return None
-    if not verify_password(password, db_user.hashed_password):
+    db_user = await get_user_by_email(db, email)
+    # Unknown emails are verified against a dummy hash, so that they take as long to reject.
+    if not await password_hasher.verify(password, db_user.hashed_password if db_user else None):
         return None
     return db_user
 
 
-def update_user_role(db: Session, db_user: UserDB, new_role: str) -> UserDB:
+@timed_db_operation
+async def update_user_role(db: AsyncSession, db_user: UserDB, new_role: str) -> UserDB:
     """
     Update the role of an existing user.
 
+    The cached authentications of the user are dropped, so that its tokens, which carry the
+    previous role, are checked against the database again by this worker.
+
     Args:
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy database session.
         db_user (UserDB): The user object to update.
         new_role (str): The new role to assign to the user.
 
@@ -95,123 +112,401 @@ def update_user_role(db: Session, db_user: UserDB, new_role: str) -> UserDB:
         UserDB: The updated user object.
     """
     db_user.role = new_role
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    token_cache.invalidate_user(db_user.id)
     return db_user
 
 
-def create_chat(db: Session, db_user: UserDB, chat_info: ChatInfo) -> ChatDB:
+@timed_db_operation
+async def create_chat(db: AsyncSession, user_id: uuid.UUID, chat_info: ChatInfo) -> ChatDB:
     """
     Create a new chat session and add an initial question-answer pair.
 
+    The chat, the pair and its metadata are inserted in a single transaction. Their IDs are
+    generated here, so no row has to be read back to link them.
+
     Args:
-        db (Session): The SQLAlchemy database session.
-        db_user (UserDB): The user object who owns the chat.
+        db (AsyncSession): The SQLAlchemy database session.
+        user_id (UUID): The ID of the user who owns the chat.
         chat_info (ChatInfo): Information about the chat and the question-answer pair.
 
     Returns:
         ChatDB: The created chat object.
     """
-    db_chat = ChatDB(title=chat_info.title, user_id=db_user.id)
+    db_chat = ChatDB(id=uuid.uuid4(), title=chat_info.title, user_id=user_id)
     db.add(db_chat)
-    db.commit()
-    db.refresh(db_chat)
-    
-    question_answer = QuestionAnswerDB(
-        question=chat_info.question_answer.question,
-        answer=chat_info.question_answer.answer,
-        chat_id=db_chat.id
-    )
-    db.add(question_answer)
-    db.commit()
-    db.refresh(question_answer)
-
-    answer_metadatas = []
-    
-    for metadata in chat_info.question_answer.answer_metadata: 
-        new_metadata = AnswerMetadataDB(
-            page_number=metadata.page_number,
-            file_name=metadata.file_name,
-            qa_id=question_answer.id 
-        )
-        answer_metadatas.append(new_metadata)
-
-    db.add_all(answer_metadatas)
-    db.commit()
+    add_question_answer(db, db_chat.id, chat_info.question_answer)
+    await db.commit()
     return db_chat
 
 
-def add_question_answer_to_chat(db: Session, db_chat: ChatDB, chat_content: ChatContent) -> QuestionAnswerDB:
+@timed_db_operation
+async def add_question_answer_to_chat(db: AsyncSession, db_chat: ChatDB, chat_content: ChatContent) -> QuestionAnswerDB:
     """
     Add a new question-answer pair to an existing chat.
 
+    The pair and its metadata are inserted in a single transaction.
+
     Args:
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy database session.
         db_chat (ChatDB): The chat object to which the question-answer pair will be added.
         chat_content (ChatContent): The question-answer content to add.
 
     Returns:
         QuestionAnswerDB: The created question-answer object.
     """
-    new_db_qa = QuestionAnswerDB(
-        question=chat_content.question_answer.question,
-        answer=chat_content.question_answer.answer,
-        chat_id=db_chat.id
+    new_db_qa = add_question_answer(db, db_chat.id, chat_content.question_answer)
+    await db.commit()
+    return new_db_qa
+
+
+def add_question_answer(db: AsyncSession, chat_id: uuid.UUID, question_answer: QuestionAnswerBase) -> QuestionAnswerDB:
+    """
+    Add a question-answer pair and its metadata to the session, without flushing it.
+
+    The metadata rows share one multi-row INSERT when the session is flushed.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+        chat_id (UUID): The ID of the chat the pair belongs to.
+        question_answer (QuestionAnswerBase): The question-answer pair and its metadata.
+
+    Returns:
+        QuestionAnswerDB: The pending question-answer object.
+    """
+    db_qa = QuestionAnswerDB(
+        id=uuid.uuid4(),
+        question=question_answer.question,
+        answer=question_answer.answer,
+        chat_id=chat_id
     )
-    db.add(new_db_qa)
-    db.commit()
-    db.refresh(new_db_qa)
-
-    new_answer_metadatas = []
-    
-    for metadata in chat_content.question_answer.answer_metadata: 
-        new_metadata = AnswerMetadataDB(
+    db.add(db_qa)
+    db.add_all([
+        AnswerMetadataDB(
+            id=uuid.uuid4(),
             page_number=metadata.page_number,
             file_name=metadata.file_name,
-            qa_id=new_db_qa.id 
-        )
-        new_answer_metadatas.append(new_metadata)
-    db.add_all(new_answer_metadatas)
-    db.commit()
-    return new_db_qa
+            qa_id=db_qa.id
+        ) for metadata in question_answer.answer_metadata
+    ])
+    return db_qa
 
 
-def delete_chat(db: Session, db_chat: ChatDB) -> None:
+@timed_db_operation
+async def delete_chat(db: AsyncSession, db_chat: ChatDB) -> None:
     """
     Delete a chat session from the database.
 
     Args:
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy database session.
         db_chat (ChatDB): The chat object to delete.
     """
-    db.delete(db_chat)
-    db.commit()
+    await db.delete(db_chat)
+    await db.commit()
 
 
-def get_all_chat_summaries(db: Session, db_user: UserDB) -> list[ChatDB]:
+@timed_db_operation
+async def get_chat_summaries(
+    db: AsyncSession, user_id: uuid.UUID, limit: int, before: tuple[datetime, uuid.UUID] | None = None
+) -> list[ChatDB]:
     """
-    Retrieve all chat summaries for a specific user.
+    Retrieve a page of the chat summaries of a specific user, most recent first.
 
     Args:
-        db (Session): The SQLAlchemy database session.
-        db_user (UserDB): The user object for whom to retrieve chat summaries.
+        db (AsyncSession): The SQLAlchemy database session.
+        user_id (UUID): The ID of the user for whom to retrieve chat summaries.
+        limit (int): Maximum number of chat summaries to retrieve.
+        before (tuple[datetime, UUID] | None): The creation time and ID of the last chat of the previous page, if any.
 
     Returns:
-        list[ChatDB]: A list of chat summaries, including IDs and titles.
+        list[ChatDB]: A list of chat summaries, including IDs, titles and creation times.
     """
-    return db.query(ChatDB.id, ChatDB.title).filter(ChatDB.user_id == db_user.id).order_by(desc(ChatDB.created_at)).all()
+    query = select(ChatDB.id, ChatDB.title, ChatDB.created_at).where(ChatDB.user_id == user_id)
+    if before is not None:
+        query = query.where(tuple_(ChatDB.created_at, ChatDB.id) < tuple_(*before))
+    result = await db.execute(query.order_by(desc(ChatDB.created_at), desc(ChatDB.id)).limit(limit))
+    return result.all()
 
 
-def get_chat_by_id(db: Session, chat_id: uuid.UUID) -> ChatDB | None:
+@timed_db_operation
+async def get_chat_by_id(db: AsyncSession, chat_id: uuid.UUID, with_conversation: bool = False) -> ChatDB | None:
     """
     Retrieve a chat session from the database by its ID.
 
     Args:
-        db (Session): The SQLAlchemy database session.
+        db (AsyncSession): The SQLAlchemy database session.
         chat_id (UUID): The ID of the chat session to retrieve.
+        with_conversation (bool): Whether to load the question-answer pairs and their metadata too,
+            in two more queries whatever the length of the conversation.
 
     Returns:
         ChatDB | None: The chat object if found, otherwise None.
     """
-    db_chat = db.query(ChatDB).filter(ChatDB.id == chat_id).first()
+    query = select(ChatDB).where(ChatDB.id == chat_id)
+    if with_conversation:
+        query = query.options(selectinload(ChatDB.conversation).selectinload(QuestionAnswerDB.answer_metadatas))
+    db_chat = await db.scalar(query)
     return db_chat
+
+
+@timed_db_operation
+async def get_recent_question_answers(db: AsyncSession, chat_id: uuid.UUID, limit: int) -> list[QuestionAnswerDB]:
+    """
+    Retrieve the last question-answer pairs of a chat.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+        chat_id (UUID): The ID of the chat session.
+        limit (int): Maximum number of question-answer pairs to retrieve.
+
+    Returns:
+        list[QuestionAnswerDB]: The question-answer pairs, oldest first.
+    """
+    result = await db.scalars(
+        select(QuestionAnswerDB)
+        .where(QuestionAnswerDB.chat_id == chat_id)
+        .order_by(desc(QuestionAnswerDB.created_at), desc(QuestionAnswerDB.id))
+        .limit(limit)
+    )
+    return list(reversed(result.all()))
+
+
+@timed_db_operation
+async def get_conversation_page(
+    db: AsyncSession, chat_id: uuid.UUID, limit: int, before: tuple[datetime, uuid.UUID] | None = None
+) -> list[QuestionAnswerDB]:
+    """
+    Retrieve a page of the question-answer pairs of a chat, with their metadata, going back from the most recent.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+        chat_id (UUID): The ID of the chat session.
+        limit (int): Maximum number of question-answer pairs to retrieve.
+        before (tuple[datetime, UUID] | None): The creation time and ID of the oldest pair of the previous page, if any.
+
+    Returns:
+        list[QuestionAnswerDB]: The question-answer pairs, oldest first.
+    """
+    query = select(QuestionAnswerDB).where(QuestionAnswerDB.chat_id == chat_id)
+    if before is not None:
+        query = query.where(tuple_(QuestionAnswerDB.created_at, QuestionAnswerDB.id) < tuple_(*before))
+    result = await db.scalars(
+        query
+        .options(selectinload(QuestionAnswerDB.answer_metadatas))
+        .order_by(desc(QuestionAnswerDB.created_at), desc(QuestionAnswerDB.id))
+        .limit(limit)
+    )
+    return list(reversed(result.all()))
+
+
+@timed_db_operation
+async def get_question_answers_from(db: AsyncSession, chat_id: uuid.UUID, offset: int) -> list[QuestionAnswerDB]:
+    """
+    Retrieve the question-answer pairs of a chat that come after the first `offset` ones.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+        chat_id (UUID): The ID of the chat session.
+        offset (int): Number of oldest question-answer pairs to skip.
+
+    Returns:
+        list[QuestionAnswerDB]: The question-answer pairs, oldest first.
+    """
+    result = await db.scalars(
+        select(QuestionAnswerDB).where(QuestionAnswerDB.chat_id == chat_id).order_by(QuestionAnswerDB.created_at, QuestionAnswerDB.id).offset(offset)
+    )
+    return result.all()
+
+
+@timed_db_operation
+async def update_chat_memory(
+    db: AsyncSession, db_chat: ChatDB, history_summary: str | None, summarized_turns: int, entities: list, entity_turns: int
+) -> bool:
+    """
+    Replace the history summary and the entity memory of a chat, unless they were updated since it was read.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+        db_chat (ChatDB): The chat object, as read before computing the new memory.
+        history_summary (str | None): The new summary.
+        summarized_turns (int): The number of turns included in the new summary.
+        entities (list): The new entity memory.
+        entity_turns (int): The number of turns whose entities are in the new entity memory.
+
+    Returns:
+        bool: True if the memory was updated, False if another update got there first.
+    """
+    result = await db.execute(
+        update(ChatDB)
+        .where(
+            ChatDB.id == db_chat.id,
+            ChatDB.summarized_turns == db_chat.summarized_turns,
+            ChatDB.entity_turns == db_chat.entity_turns
+        )
+        .values(history_summary=history_summary, summarized_turns=summarized_turns, entities=entities, entity_turns=entity_turns)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+@timed_db_operation
+async def create_answer_job(db: AsyncSession, db_chat: ChatDB, question: str, role: str) -> AnswerJobDB:
+    """
+    Queue a question of a chat to be answered by the job workers.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+        db_chat (ChatDB): The chat the question is asked in.
+        question (str): The question asked by the user.
+        role (str): The role of the user asking the question.
+
+    Returns:
+        AnswerJobDB: The pending job.
+    """
+    db_job = AnswerJobDB(id=uuid.uuid4(), chat_id=db_chat.id, question=question, role=role, status="pending", attempts=0)
+    db.add(db_job)
+    await db.commit()
+    return db_job
+
+
+@timed_db_operation
+async def get_answer_job(db: AsyncSession, job_id: uuid.UUID) -> AnswerJobDB | None:
+    """
+    Retrieve a job by its ID, with its question-answer pair and the metadata of the pair.
+
+    The job is read again from the database even if the session already holds it, so that
+    the status can be polled with the same session.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+        job_id (UUID): The ID of the job.
+
+    Returns:
+        AnswerJobDB | None: The job object if found, otherwise None.
+    """
+    result = await db.scalars(
+        select(AnswerJobDB)
+        .where(AnswerJobDB.id == job_id)
+        .options(selectinload(AnswerJobDB.question_answer).selectinload(QuestionAnswerDB.answer_metadatas))
+        .execution_options(populate_existing=True)
+    )
+    return result.first()
+
+
+@timed_db_operation
+async def claim_answer_job(db: AsyncSession) -> AnswerJobDB | None:
+    """
+    Claim the oldest job that is pending, or running for longer than `JOB_TIMEOUT_SECONDS`.
+
+    Jobs locked by a concurrent claim are skipped (`FOR UPDATE SKIP LOCKED`), and so are the
+    jobs of a chat with an older unfinished job, so that the questions of a chat are answered
+    in order, each with the previous answers in its history. Abandoned jobs that already had
+    `JOB_MAX_ATTEMPTS` attempts are marked as failed instead of being claimed. The job is marked
+    as running and the claim committed right away: the row lock is not held while the question
+    is answered.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+
+    Returns:
+        AnswerJobDB | None: The claimed job, or None if there is no job to run.
+    """
+    older_job = aliased(AnswerJobDB)
+    abandoned_before = func.now() - timedelta(seconds=settings.JOB_TIMEOUT_SECONDS)
+    await db.execute(
+        update(AnswerJobDB)
+        .where(
+            AnswerJobDB.status == "running",
+            AnswerJobDB.started_at < abandoned_before,
+            AnswerJobDB.attempts >= settings.JOB_MAX_ATTEMPTS
+        )
+        .values(status="failed", error="The job was abandoned by the workers", finished_at=func.now())
+    )
+    result = await db.scalars(
+        select(AnswerJobDB)
+        .where(
+            or_(
+                AnswerJobDB.status == "pending",
+                and_(AnswerJobDB.status == "running", AnswerJobDB.started_at < abandoned_before)
+            ),
+            AnswerJobDB.attempts < settings.JOB_MAX_ATTEMPTS,
+            ~exists().where(
+                older_job.chat_id == AnswerJobDB.chat_id,
+                older_job.status.in_(("pending", "running")),
+                older_job.created_at < AnswerJobDB.created_at
+            )
+        )
+        .order_by(AnswerJobDB.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True, of=AnswerJobDB)
+    )
+    db_job = result.first()
+    if db_job is None:
+        await db.commit()
+        return None
+    db_job.status = "running"
+    db_job.attempts += 1
+    db_job.started_at = func.now()
+    await db.commit()
+    return db_job
+
+
+@timed_db_operation
+async def complete_answer_job(
+    db: AsyncSession, db_job: AnswerJobDB, attempt: int, question_answer: QuestionAnswerBase
+) -> QuestionAnswerDB | None:
+    """
+    Add the answer of a job to its chat and mark the job as done, in a single transaction.
+
+    Nothing is written if the attempt is no longer the current one, e.g. because the job was
+    considered abandoned and claimed again by another worker.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+        db_job (AnswerJobDB): The running job.
+        attempt (int): The attempt of the job claimed by the worker.
+        question_answer (QuestionAnswerBase): The question-answer pair and its metadata.
+
+    Returns:
+        QuestionAnswerDB | None: The created question-answer object, None if the attempt was superseded.
+    """
+    # Locks the job until the commit, so that it can't be claimed again in the meantime.
+    result = await db.execute(
+        update(AnswerJobDB)
+        .where(AnswerJobDB.id == db_job.id, AnswerJobDB.status == "running", AnswerJobDB.attempts == attempt)
+        .values(status="done", error=None, finished_at=func.now())
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        return None
+    db_qa = add_question_answer(db, db_job.chat_id, question_answer)
+    db_job.qa_id = db_qa.id
+    await db.commit()
+    return db_qa
+
+
+@timed_db_operation
+async def fail_answer_job(db: AsyncSession, db_job: AnswerJobDB, attempt: int, error: str) -> None:
+    """
+    Record the failure of an attempt of a job: the job is queued again, or marked as failed
+    after `JOB_MAX_ATTEMPTS` attempts.
+
+    Nothing is written if the attempt is no longer the current one.
+
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+        db_job (AnswerJobDB): The running job.
+        attempt (int): The attempt of the job claimed by the worker.
+        error (str): The reason of the failure.
+    """
+    if attempt >= settings.JOB_MAX_ATTEMPTS:
+        values = {"status": "failed", "finished_at": func.now()}
+    else:
+        values = {"status": "pending"}
+    await db.execute(
+        update(AnswerJobDB)
+        .where(AnswerJobDB.id == db_job.id, AnswerJobDB.status == "running", AnswerJobDB.attempts == attempt)
+        .values(error=error, **values)
+    )
+    await db.commit()
@@ -1,21 +1,147 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import time
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
 
-engine = create_engine(
-    f"postgresql+psycopg://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Connection pool recording how long requests wait for a connection.
+
+    Attributes:
+        checkouts (int): Number of connections handed out.
+        timeouts (int): Number of requests that gave up waiting for a connection.
+        total_wait_seconds (float): Time spent waiting for a connection, opening new ones included.
+        max_wait_seconds (float): Longest wait for a connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        wait_seconds = time.perf_counter() - start
+        self.checkouts += 1
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+        return connection
+
+    def recreate(self):
+        # Keep the statistics when the engine recreates the pool (e.g. after a disconnection).
+        pool = super().recreate()
+        pool.checkouts, pool.timeouts = self.checkouts, self.timeouts
+        pool.total_wait_seconds, pool.max_wait_seconds = self.total_wait_seconds, self.max_wait_seconds
+        return pool
+
+
+engine = create_async_engine(
+    f"postgresql+psycopg://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}",
+    poolclass=TimedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    # PgBouncer in transaction mode may run each transaction on a different server connection,
+    # where the statements prepared by psycopg don't exist.
+    connect_args={"prepare_threshold": None} if settings.DB_PGBOUNCER_MODE else {}
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects are not expired on commit: lazy refreshes are not possible with async sessions.
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+class Base(AsyncAttrs, DeclarativeBase):
+    pass
+
+
+# Changes to the tables of existing databases, which `create_all` doesn't alter. They run in order
+# at every startup, so each statement must be idempotent; new ones are appended at the end.
+SCHEMA_UPGRADES = [
+    # Rolling summary of the turns that no longer fit the chat history
+    "ALTER TABLE chats ADD COLUMN IF NOT EXISTS history_summary VARCHAR",
+    "ALTER TABLE chats ADD COLUMN IF NOT EXISTS summarized_turns INTEGER NOT NULL DEFAULT 0",
+    # Entity memory of the chats
+    "ALTER TABLE chats ADD COLUMN IF NOT EXISTS entities JSONB NOT NULL DEFAULT '{}'",
+    "ALTER TABLE chats ADD COLUMN IF NOT EXISTS entity_turns INTEGER NOT NULL DEFAULT 0",
+    # Keyset pagination of the chats of a user and of the turns of a chat, and the metadata of a turn
+    "CREATE INDEX IF NOT EXISTS ix_chats_user_id_created_at_id ON chats (user_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_question_answers_chat_id_created_at_id ON question_answers (chat_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_answer_metadatas_qa_id ON answer_metadatas (qa_id)",
+    # The entity memory of a chat became a list, JSONB objects losing the order of recency of the entities
+    "ALTER TABLE chats ALTER COLUMN entities SET DEFAULT '[]'",
+    """
+    UPDATE chats SET entities = (
+        SELECT coalesce(jsonb_agg(jsonb_build_object('name', key, 'description', value)), '[]')
+        FROM jsonb_each_text(entities)
+    )
+    WHERE jsonb_typeof(entities) = 'object'
+    """,
+]
+
+# Key of the advisory lock serializing the schema changes of the workers starting at the same time.
+SCHEMA_LOCK_KEY = 0x6A1A
+
+
+async def create_tables() -> None:
+    """
+    Create the database tables that don't exist yet, and bring the existing ones up to date
+    with `SCHEMA_UPGRADES`.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        await conn.run_sync(Base.metadata.create_all)
+        for statement in SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
+
+
+def pool_stats() -> dict:
+    """
+    Report the usage of the connection pool of the worker.
+
+    Returns:
+        dict: The size of the pool, the connections checked out, idle and in overflow,
+        and the number and duration of the waits for a connection.
+    """
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "total_wait_seconds": round(pool.total_wait_seconds, 6),
+        "max_wait_seconds": round(pool.max_wait_seconds, 6),
+    }
+
+
+async def release_connection(db: AsyncSession) -> None:
+    """
+    End the transaction of a session, returning its connection to the pool.
+
+    The objects already loaded stay usable, and the session checks out a connection again
+    if it is used later. Meant to be called before slow, database-free work such as LLM calls.
 
-Base = declarative_base()
+    Args:
+        db (AsyncSession): The SQLAlchemy database session.
+    """
+    await db.commit()
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,47 @@
+import uuid
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.db.database import Base
+
+
+class AnswerJobDB(Base):
+    """
+    Represents a question waiting to be answered by the job workers.
+
+    Attributes:
+        id (UUID): The unique identifier for the job, generated using UUID.
+        chat_id (UUID): The unique identifier of the chat the question is asked in.
+        question (str): The question asked by the user.
+        role (str): The role of the user when the question was asked.
+        status (str): 'pending', 'running', 'done' or 'failed'.
+        attempts (int): Number of times a worker claimed the job.
+        error (str | None): The error of the last failed attempt.
+        qa_id (UUID | None): The unique identifier of the question-answer pair written once the job is done.
+        created_at (DateTime): The timestamp when the job was created, automatically set to the current time.
+        started_at (DateTime | None): The timestamp when a worker last claimed the job.
+        finished_at (DateTime | None): The timestamp when the job was done or failed for good.
+        question_answer (relationship): The relationship to the `QuestionAnswerDB` model, representing the answer.
+    """
+
+    __tablename__ = "answer_jobs"
+    __table_args__ = (
+        # Matches the claim of the oldest pending job, and the check for older jobs of the same chat.
+        Index("ix_answer_jobs_status_created_at", "status", "created_at"),
+        Index("ix_answer_jobs_chat_id_created_at", "chat_id", "created_at"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    chat_id = Column(UUID(as_uuid=True), ForeignKey('chats.id', ondelete="CASCADE"), nullable=False)
+    question = Column(String, nullable=False)
+    role = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    qa_id = Column(UUID(as_uuid=True), ForeignKey('question_answers.id', ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    question_answer = relationship("QuestionAnswerDB")
@@ -19,6 +19,6 @@ class AnswerMetadataDB(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
     page_number = Column(String(length=63), nullable=True)
     file_name = Column(String(length=255), nullable=True)
-    qa_id = Column(UUID(as_uuid=True), ForeignKey('question_answers.id', ondelete="CASCADE"), nullable=False)
+    qa_id = Column(UUID(as_uuid=True), ForeignKey('question_answers.id', ondelete="CASCADE"), nullable=False, index=True)
 
     question_answer = relationship("QuestionAnswerDB", back_populates="answer_metadatas")
@@ -1,6 +1,6 @@
 import uuid
-from sqlalchemy import Column, DateTime, ForeignKey, String
-from sqlalchemy.dialects.postgresql import UUID 
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
@@ -15,16 +15,31 @@ class ChatDB(Base):
         title (str): The title of the chat session.
         created_at (DateTime): The timestamp when the chat was created, automatically set to the current time.
         user_id (UUID): The unique identifier of the user who owns the chat.
+        history_summary (str | None): Rolling summary of the turns that no longer fit the chat history sent to the LLM.
+        summarized_turns (int): Number of turns, oldest first, included in `history_summary`.
+        entities (list): Names and descriptions of the entities discussed in the chat, least recently mentioned first.
+        entity_turns (int): Number of turns, oldest first, whose entities were extracted into `entities`.
         user (relationship): The relationship to the `UserDB` model, representing the chat owner.
-        conversation (relationship): The relationship to `QuestionAnswerDB`, representing the chat's conversation.
+        conversation (relationship): The relationship to `QuestionAnswerDB`, representing the chat's conversation, oldest first.
     """
 
     __tablename__ = "chats"
+    # Matches the keyset pagination of the chats of a user, most recent first.
+    __table_args__ = (Index("ix_chats_user_id_created_at_id", "user_id", "created_at", "id"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
     title = Column(String(length=63), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
     user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+    history_summary = Column(String, nullable=True)
+    summarized_turns = Column(Integer, nullable=False, default=0, server_default="0")
+    entities = Column(JSONB, nullable=False, default=list, server_default="[]")
+    entity_turns = Column(Integer, nullable=False, default=0, server_default="0")
 
     user = relationship("UserDB", back_populates="chats")
-    conversation = relationship("QuestionAnswerDB", back_populates="chat", cascade="all, delete-orphan")
+    conversation = relationship(
+        "QuestionAnswerDB",
+        back_populates="chat",
+        cascade="all, delete-orphan",
+        order_by="[QuestionAnswerDB.created_at, QuestionAnswerDB.id]"
+    )
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, DateTime, ForeignKey, String
+from sqlalchemy import Column, DateTime, ForeignKey, Index, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -21,6 +21,8 @@ class QuestionAnswerDB(Base):
     """
 
     __tablename__ = "question_answers"
+    # Matches the keyset pagination of the conversation of a chat.
+    __table_args__ = (Index("ix_question_answers_chat_id_created_at_id", "chat_id", "created_at", "id"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
     question = Column(String, nullable=False)
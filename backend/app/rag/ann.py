@@ -0,0 +1,123 @@
+import logging
+import os
+
+import faiss
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "flat_fp16", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def build_index(
+    flat_index: faiss.Index, index_type: str, nlist: int = 1024, pq_m: int = 64, hnsw_m: int = 32
+) -> faiss.Index:
+    """
+    Builds an approximate nearest neighbor index holding the same vectors, in the same order, as a flat index.
+
+    Keeping the order means the positions still match the `index_to_docstore_id` mapping of the vector store.
+
+    Args:
+        flat_index (faiss.Index): The exact index to copy the vectors from.
+        index_type (str): One of 'flat', 'flat_fp16', 'ivf_flat', 'ivf_pq' or 'hnsw'.
+        nlist (int): Number of inverted lists of the IVF indexes, lowered if there are too few vectors to train them.
+        pq_m (int): Number of sub-quantizers of the IVF-PQ index, must divide the vector dimension.
+        hnsw_m (int): Number of neighbors per node of the HNSW graph.
+
+    Returns:
+        faiss.Index: The new index.
+
+    Raises:
+        ValueError: If the index type is unknown.
+    """
+    if index_type == "flat":
+        return flat_index
+
+    dimension = flat_index.d
+    metric = flat_index.metric_type
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+    # FAISS needs about 39 training vectors per inverted list.
+    nlist = max(1, min(nlist, flat_index.ntotal // 39))
+
+    if index_type == "flat_fp16":
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, metric)
+    elif index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(faiss.IndexFlat(dimension, metric), dimension, nlist, metric)
+    elif index_type == "ivf_pq":
+        index = faiss.IndexIVFPQ(faiss.IndexFlat(dimension, metric), dimension, nlist, pq_m, 8, metric)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m, metric)
+        index.hnsw.efConstruction = 200
+    else:
+        raise ValueError(f"Unknown FAISS index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def set_search_parameters(index: faiss.Index, nprobe: int, ef_search: int) -> None:
+    """
+    Sets the search parameters trading recall for latency.
+
+    Args:
+        index (faiss.Index): The index to configure.
+        nprobe (int): Number of inverted lists visited by the IVF indexes.
+        ef_search (int): Size of the candidate list of the HNSW index.
+    """
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def make_reconstructible(index: faiss.Index) -> None:
+    """
+    Maps the positions of an IVF index to its inverted lists, which `reconstruct` requires.
+
+    Args:
+        index (faiss.Index): The index.
+    """
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+
+
+def load_or_build_index(
+    index_path: str, flat_index: faiss.Index, index_type: str, nlist: int, pq_m: int, hnsw_m: int
+) -> faiss.Index:
+    """
+    Loads the approximate index saved next to the flat index, building and saving it if it is missing or outdated.
+
+    The vectors of IVF indexes are made reconstructible by position, so that the retrieved
+    chunks can be compared without embedding them again.
+
+    Args:
+        index_path (str): The directory where the FAISS index is saved.
+        flat_index (faiss.Index): The exact index loaded from `index_path`.
+        index_type (str): One of 'flat', 'flat_fp16', 'ivf_flat', 'ivf_pq' or 'hnsw'.
+        nlist (int): Number of inverted lists of the IVF indexes.
+        pq_m (int): Number of sub-quantizers of the IVF-PQ index.
+        hnsw_m (int): Number of neighbors per node of the HNSW graph.
+
+    Returns:
+        faiss.Index: The approximate index.
+    """
+    if index_type == "flat":
+        return flat_index
+
+    built_path = os.path.join(index_path, f"index.{index_type}-nlist{nlist}-m{pq_m}-hnsw{hnsw_m}.faiss")
+    flat_mtime = os.path.getmtime(os.path.join(index_path, "index.faiss"))
+    if os.path.exists(built_path) and os.path.getmtime(built_path) >= flat_mtime:
+        index = faiss.read_index(built_path)
+        if index.ntotal == flat_index.ntotal:
+            make_reconstructible(index)
+            return index
+
+    logger.info("Building the %s index over %d vectors", index_type, flat_index.ntotal)
+    index = build_index(flat_index, index_type, nlist=nlist, pq_m=pq_m, hnsw_m=hnsw_m)
+    try:
+        faiss.write_index(index, built_path)
+    except (OSError, RuntimeError):
+        logger.warning("Failed to save the %s index to %s", index_type, built_path)
+    make_reconstructible(index)
+    return index
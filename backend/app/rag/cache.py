@@ -0,0 +1,216 @@
+import itertools
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from app.schemas.question_answer import AnswerMetadata
+
+
+@dataclass
+class CachedAnswer:
+    """
+    An answer stored in the semantic cache.
+
+    Attributes:
+        answer (str): The answer generated by the LLM.
+        answer_metadata (list[AnswerMetadata]): Metadata about the documents used to answer.
+    """
+    answer: str
+    answer_metadata: list[AnswerMetadata] = field(default_factory=list)
+
+
+@dataclass
+class SemanticCacheEntry:
+    scope: tuple
+    row: int
+    value: CachedAnswer
+    created_at: float
+
+
+class ScopeVectors:
+    """
+    The question embeddings of the entries of a scope, as the rows of a preallocated matrix
+    grown by doubling, so that a lookup is a single product without copying the vectors.
+
+    Attributes:
+        vectors (np.ndarray): The matrix, whose first `len(keys)` rows are in use.
+        keys (list[int]): The key of the entry of each row in use.
+    """
+
+    def __init__(self, dimension: int, capacity: int = 16):
+        self.vectors = np.empty((capacity, dimension), dtype=np.float32)
+        self.keys: list[int] = []
+
+    def add(self, key: int, vector: np.ndarray) -> int:
+        """
+        Returns:
+            int: The row of the vector.
+        """
+        row = len(self.keys)
+        if row == len(self.vectors):
+            vectors = np.empty((2 * row, self.vectors.shape[1]), dtype=np.float32)
+            vectors[:row] = self.vectors
+            self.vectors = vectors
+        self.vectors[row] = vector
+        self.keys.append(key)
+        return row
+
+    def remove(self, row: int) -> int | None:
+        """
+        Removes a row, moving the last row in its place.
+
+        Returns:
+            int | None: The key of the entry moved to the row, None if the last row was removed.
+        """
+        last = len(self.keys) - 1
+        moved = None
+        if row != last:
+            self.vectors[row] = self.vectors[last]
+            self.keys[row] = moved = self.keys[last]
+        self.keys.pop()
+        return moved
+
+    def similarities(self, vector: np.ndarray) -> np.ndarray:
+        return self.vectors[:len(self.keys)] @ vector
+
+
+class SemanticCache:
+    """
+    In-process cache of answers looked up by the similarity of the question embeddings.
+
+    Entries are only matched against entries of the same scope (e.g. the role instructions and
+    whether the question opens a chat), expire after `ttl_seconds` and the least recently used
+    entries are evicted once `max_entries` is reached. Expired entries are dropped when they
+    match a lookup or when new answers are stored, not by scanning the cache on each lookup.
+
+    Attributes:
+        similarity_threshold (float): Minimum cosine similarity for a cached question to match.
+        ttl_seconds (float): Time to live of the entries, in seconds.
+        max_entries (int): Maximum number of entries kept in the cache.
+        index_version (str | None): Version of the document index the cached answers were built from.
+        hits (int): Number of lookups that returned an answer.
+        misses (int): Number of lookups that didn't return an answer.
+    """
+
+    def __init__(self, similarity_threshold: float, ttl_seconds: float, max_entries: int):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.index_version: str | None = None
+        self.hits = 0
+        self.misses = 0
+        # In LRU order
+        self._entries: OrderedDict[int, SemanticCacheEntry] = OrderedDict()
+        # In creation order, which is also expiration order
+        self._created: deque[int] = deque()
+        self._scopes: dict[tuple, ScopeVectors] = {}
+        self._keys = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, embedding: list[float], scope: tuple) -> CachedAnswer | None:
+        """
+        Returns the cached answer of the most similar question in the scope, if similar enough.
+
+        Args:
+            embedding (list[float]): The embedding of the question.
+            scope (tuple): The scope the answer must belong to.
+
+        Returns:
+            CachedAnswer | None: The cached answer, or None on a miss.
+        """
+        scope_vectors = self._scopes.get(scope)
+        if scope_vectors is not None:
+            similarities = scope_vectors.similarities(self._normalize(embedding))
+            rows = np.flatnonzero(similarities >= self.similarity_threshold)
+            # Most similar first, the expired matches being dropped on the way
+            keys = [scope_vectors.keys[row] for row in rows[np.argsort(-similarities[rows])]]
+            expired_before = time.monotonic() - self.ttl_seconds
+            for key in keys:
+                entry = self._entries[key]
+                if entry.created_at < expired_before:
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+
+        self.misses += 1
+        return None
+
+    def store(self, embedding: list[float], scope: tuple, value: CachedAnswer) -> None:
+        """
+        Stores an answer, evicting the expired entries and, if the cache is full, the least recently used ones.
+
+        Args:
+            embedding (list[float]): The embedding of the question.
+            scope (tuple): The scope the answer belongs to.
+            value (CachedAnswer): The answer to cache.
+        """
+        self._evict_expired()
+        vector = self._normalize(embedding)
+        scope_vectors = self._scopes.get(scope)
+        if scope_vectors is None:
+            scope_vectors = self._scopes[scope] = ScopeVectors(dimension=len(vector))
+        key = next(self._keys)
+        self._entries[key] = SemanticCacheEntry(
+            scope=scope,
+            row=scope_vectors.add(key, vector),
+            value=value,
+            created_at=time.monotonic()
+        )
+        self._created.append(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        if len(self._created) > 2 * max(self.max_entries, 1):
+            # Drops the keys of the entries evicted as least recently used, which are still queued
+            self._created = deque(key for key in self._created if key in self._entries)
+
+    def invalidate(self) -> None:
+        """
+        Drops every cached answer.
+        """
+        self._entries.clear()
+        self._created.clear()
+        self._scopes.clear()
+
+    def set_index_version(self, index_version: str | None) -> None:
+        """
+        Records the version of the document index, dropping every cached answer if it changed.
+
+        Args:
+            index_version (str | None): The version of the document index currently loaded.
+        """
+        if index_version != self.index_version:
+            self.invalidate()
+            self.index_version = index_version
+
+    def _remove(self, key: int) -> None:
+        entry = self._entries.pop(key)
+        scope_vectors = self._scopes[entry.scope]
+        moved = scope_vectors.remove(entry.row)
+        if moved is not None:
+            self._entries[moved].row = entry.row
+        if not scope_vectors.keys:
+            del self._scopes[entry.scope]
+
+    def _evict_expired(self) -> None:
+        expired_before = time.monotonic() - self.ttl_seconds
+        while self._created:
+            key = self._created[0]
+            entry = self._entries.get(key)
+            # Keys of entries already evicted are skipped
+            if entry is not None and entry.created_at >= expired_before:
+                break
+            self._created.popleft()
+            if entry is not None:
+                self._remove(key)
+
+    @staticmethod
+    def _normalize(embedding: list[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
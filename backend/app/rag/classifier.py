@@ -0,0 +1,97 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+
+# Stems and expressions (accents stripped, lower case) that point to the climate and
+# environmental regulation domain covered by the document database, in Portuguese and English.
+SPECIFIC_PATTERNS = [
+    r"\bclima", r"\bclimat", r"\bplano clima\b", r"\baquecimento global\b", r"\bglobal warming\b",
+    r"\bmudancas? do clima\b", r"\bmudancas? climaticas?\b", r"\bclimate change\b",
+    r"\bemiss", r"\bcarbon", r"\bco2\b", r"\bmetano\b", r"\bmethane\b", r"\bgee\b",
+    r"\befeito estufa\b", r"\bgreenhouse\b", r"\bdescarboniz", r"\bdecarboni", r"\bnet zero\b",
+    r"\bdesmatamento\b", r"\bdeforestation\b", r"\bflorest", r"\bforest", r"\bamazon", r"\bcerrado\b",
+    r"\bpantanal\b", r"\bmata atlantica\b", r"\bbiodivers", r"\becossistem", r"\becosystem",
+    r"\bambient", r"\benvironment", r"\bsustentab", r"\bsustainab", r"\bpreservac", r"\bconservac",
+    r"\bmitigac", r"\bmitigation\b", r"\badaptac", r"\badaptation\b", r"\bresilien",
+    r"\benergia (renovavel|limpa|solar|eolica)\b", r"\brenewable", r"\bsolar\b", r"\beolica\b", r"\bwind power\b",
+    r"\bbiocombust", r"\bbiofuel", r"\betanol\b", r"\bhidrogenio verde\b", r"\bgreen hydrogen\b",
+    r"\benchente", r"\binundac", r"\bflood", r"\bseca\b", r"\bestiagem\b", r"\bdrought", r"\bqueimada",
+    r"\bwildfire", r"\bincendios? florest", r"\bdesastres?\b", r"\bdisaster", r"\bdefesa civil\b",
+    r"\bpoluic", r"\bpollution\b", r"\bresiduos?\b", r"\bsaneamento\b", r"\brecursos hidricos\b", r"\bwater resources\b",
+    r"\bpnmc\b", r"\bndc\b", r"\bipcc\b", r"\bcop ?\d+\b", r"\bunfccc\b", r"\bacordo de paris\b", r"\bparis agreement\b",
+    r"\bprotocolo de kyoto\b", r"\bkyoto protocol\b", r"\bmercado de carbono\b", r"\bcarbon market\b", r"\bcreditos? de carbono\b",
+    r"\blei n?[ºo°]?\.? ?\d", r"\bdecreto", r"\bdecree", r"\bportaria\b", r"\bresolucao conama\b", r"\bconama\b",
+    r"\bart(igo)?\.? ?\d+", r"\blegislac", r"\blegislation\b", r"\bregulament", r"\bregulation",
+    r"\bpolitica nacional\b", r"\bnational policy\b", r"\bmunicip", r"\bprefeitura\b", r"\bplano diretor\b",
+]
+
+# Small talk, greetings and questions about the assistant itself.
+GENERAL_PATTERNS = [
+    r"^(oi|ola|hello|hi|hey|e ai|eai|bom dia|boa tarde|boa noite|good (morning|afternoon|evening))\b",
+    r"\b(obrigad[oa]|valeu|thanks|thank you)\b", r"\b(tchau|ate logo|bye|goodbye)\b",
+    r"\b(tudo bem|como vai|how are you)\b", r"\b(quem e voce|quem es tu|who are you|what are you)\b",
+    r"\b(qual (e )?o seu nome|what is your name|what's your name)\b",
+    r"\b(piada|joke)\b", r"^\s*[\d\s\+\-\*/\(\)\.,=?]+$",
+]
+
+SPECIFIC_REGEXES = [re.compile(pattern) for pattern in SPECIFIC_PATTERNS]
+GENERAL_REGEXES = [re.compile(pattern) for pattern in GENERAL_PATTERNS]
+
+
+@dataclass(frozen=True)
+class QuestionClassification:
+    """
+    The outcome of classifying a question.
+
+    Attributes:
+        question_type (str): Either 'general' or 'specific'.
+        confidence (float): How confident the classifier is, between 0 and 1.
+        source (str): The path that decided the classification, either 'keyword' or 'llm'.
+    """
+    question_type: str
+    confidence: float
+    source: str
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lower-cases the text and strips its accents, so that 'Mudança' matches 'mudanca'.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char) or char in "º°")
+
+
+def classify_question_locally(question: str) -> QuestionClassification:
+    """
+    Classifies the question as 'general' or 'specific' by scoring it against the climate vocabulary.
+
+    Questions that match neither vocabulary are classified as 'general' with a low confidence,
+    so that the caller can fall back to the LLM classifier.
+
+    Args:
+        question (str): The question to classify.
+
+    Returns:
+        QuestionClassification: The classification, decided by the 'keyword' path.
+    """
+    text = normalize_text(question)
+    specific_hits = sum(1 for regex in SPECIFIC_REGEXES if regex.search(text))
+    general_hits = sum(1 for regex in GENERAL_REGEXES if regex.search(text))
+
+    if specific_hits == 0 and general_hits == 0:
+        return QuestionClassification(question_type="general", confidence=0.5, source="keyword")
+
+    margin = specific_hits - general_hits
+    if margin > 0:
+        confidence = round(min(0.99, 0.6 + 0.15 * margin), 2)
+        return QuestionClassification(question_type="specific", confidence=confidence, source="keyword")
+    if margin < 0:
+        confidence = round(min(0.99, 0.6 + 0.15 * -margin), 2)
+        return QuestionClassification(question_type="general", confidence=confidence, source="keyword")
+    return QuestionClassification(question_type="specific", confidence=0.5, source="keyword")
@@ -0,0 +1,101 @@
+from functools import lru_cache
+
+import numpy as np
+import tiktoken
+from langchain_core.documents import Document
+
+from app.rag.retrievers import tokenize
+
+# Near-duplicate threshold of the word overlap, used when the chunk vectors can't be read from the index.
+JACCARD_DUPLICATE_THRESHOLD = 0.8
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> tiktoken.Encoding:
+    """
+    Loads the tokenizer of the chat model.
+
+    Returns:
+        tiktoken.Encoding: The tokenizer.
+    """
+    return tiktoken.encoding_for_model("gpt-4o")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of the text for the chat model.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        int: The number of tokens.
+    """
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def jaccard_similarity(first: set[str], second: set[str]) -> float:
+    """
+    Computes the overlap between two sets of terms.
+
+    Args:
+        first (set[str]): The first set.
+        second (set[str]): The second set.
+
+    Returns:
+        float: The size of the intersection divided by the size of the union.
+    """
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def pack_context(
+    documents: list[Document], token_budget: int, duplicate_threshold: float, vectors: np.ndarray | None = None
+) -> list[Document]:
+    """
+    Selects the documents to put in the prompt, most relevant first, until the token budget is spent.
+
+    A document is skipped if it is a near-duplicate of one already selected, by cosine similarity of
+    their vectors or, without vectors, by overlap of their words, or if it doesn't fit the remaining budget.
+
+    Args:
+        documents (list[Document]): The retrieved documents, most relevant first.
+        token_budget (int): Maximum number of tokens of the selected documents.
+        duplicate_threshold (float): Cosine similarity above which two documents are near-duplicates.
+        vectors (np.ndarray | None): The normalized vectors of the documents, one row per document.
+
+    Returns:
+        list[Document]: The selected documents, in the order of `documents`.
+    """
+    selected: list[int] = []
+    terms = [set(tokenize(document.page_content)) for document in documents] if vectors is None else None
+    remaining = token_budget
+    for i, document in enumerate(documents):
+        if vectors is not None:
+            is_duplicate = any(float(vectors[i] @ vectors[j]) >= duplicate_threshold for j in selected)
+        else:
+            is_duplicate = any(jaccard_similarity(terms[i], terms[j]) >= JACCARD_DUPLICATE_THRESHOLD for j in selected)
+        if is_duplicate:
+            continue
+        tokens = count_tokens(document.page_content)
+        if tokens > remaining:
+            continue
+        selected.append(i)
+        remaining -= tokens
+    return [documents[i] for i in selected]
+
+
+def format_context(documents: list[Document]) -> str:
+    """
+    Joins the contents of the documents into the context of the prompt.
+
+    Args:
+        documents (list[Document]): The documents.
+
+    Returns:
+        str: The context.
+    """
+    return CONTEXT_SEPARATOR.join(document.page_content for document in documents)
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Time a worker waits for another one writing to the on-disk cache, before treating it as a miss.
+STORE_TIMEOUT_SECONDS = 0.5
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that caches the vectors of the texts it has already embedded.
+
+    Vectors are kept in an in-memory LRU and, optionally, in a SQLite database on disk that
+    survives restarts and is shared by every worker. Entries are keyed by the embedding model
+    name and the hash of the text, so changing the model never returns stale vectors.
+
+    The async methods read and write the on-disk cache in a thread, off the event loop. When the
+    database is locked by another worker for longer than `STORE_TIMEOUT_SECONDS`, the texts are
+    treated as misses and the new vectors are only kept in memory.
+
+    Attributes:
+        embeddings (Embeddings): The embeddings model whose vectors are cached.
+        model_name (str): The name of the embeddings model.
+        max_memory_entries (int): Maximum number of vectors kept in memory.
+        memory_hits (int): Number of texts found in the in-memory cache.
+        disk_hits (int): Number of texts found in the on-disk cache.
+        misses (int): Number of texts sent to the embeddings model.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, store_path: str | None = None, max_memory_entries: int = 10000):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_memory_entries = max_memory_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._store_lock = threading.Lock()
+        self._store = None
+        if store_path:
+            self._store = sqlite3.connect(store_path, timeout=STORE_TIMEOUT_SECONDS, check_same_thread=False)
+            self._store.execute("PRAGMA journal_mode=WAL")
+            with self._store:
+                self._store.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors, missing = self._lookup_memory(texts)
+        if missing:
+            missing = self._lookup_store(texts, vectors, missing)
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            self._write_store(self._save(texts, vectors, missing, computed))
+        return vectors
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors, missing = self._lookup_memory(texts)
+        if missing:
+            missing = await asyncio.to_thread(self._lookup_store, texts, vectors, missing)
+        if missing:
+            computed = await self.embeddings.aembed_documents([texts[i] for i in missing])
+            await asyncio.to_thread(self._write_store, self._save(texts, vectors, missing, computed))
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        vectors, missing = self._lookup_memory([text])
+        if missing:
+            missing = self._lookup_store([text], vectors, missing)
+        if missing:
+            self._write_store(self._save([text], vectors, missing, [self.embeddings.embed_query(text)]))
+        return vectors[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vectors, missing = self._lookup_memory([text])
+        if missing:
+            missing = await asyncio.to_thread(self._lookup_store, [text], vectors, missing)
+        if missing:
+            computed = [await self.embeddings.aembed_query(text)]
+            await asyncio.to_thread(self._write_store, self._save([text], vectors, missing, computed))
+        return vectors[0]
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode()).hexdigest()
+
+    def _lookup_memory(self, texts: list[str]) -> tuple[list[list[float] | None], list[int]]:
+        vectors: list[list[float] | None] = []
+        missing = []
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = self._key(text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                else:
+                    missing.append(i)
+                vectors.append(vector)
+        return vectors, missing
+
+    def _lookup_store(self, texts: list[str], vectors: list[list[float] | None], missing: list[int]) -> list[int]:
+        """
+        Fills the vectors of the texts missing from memory with those found on disk.
+
+        Returns:
+            list[int]: The indexes of the texts still missing, to be sent to the embeddings model.
+        """
+        rows = {}
+        if self._store is not None:
+            keys = {i: self._key(texts[i]) for i in missing}
+            try:
+                with self._store_lock:
+                    for i, key in keys.items():
+                        row = self._store.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                        if row is not None:
+                            rows[i] = array("f", row[0]).tolist()
+            except sqlite3.OperationalError as error:
+                logger.warning("Could not read the embedding cache, embedding the texts again: %s", error)
+
+        with self._lock:
+            still_missing = []
+            for i in missing:
+                if i in rows:
+                    vectors[i] = rows[i]
+                    self._remember(self._key(texts[i]), rows[i])
+                    self.disk_hits += 1
+                else:
+                    still_missing.append(i)
+                    self.misses += 1
+        return still_missing
+
+    def _save(self, texts: list[str], vectors: list[list[float] | None], missing: list[int], computed: list[list[float]]) -> list[tuple[str, bytes]]:
+        """
+        Fills the computed vectors in and keeps them in memory.
+
+        Returns:
+            list[tuple[str, bytes]]: The rows to write to the on-disk cache.
+        """
+        rows = []
+        with self._lock:
+            for i, vector in zip(missing, computed):
+                key = self._key(texts[i])
+                vectors[i] = vector
+                self._remember(key, vector)
+                rows.append((key, array("f", vector).tobytes()))
+        return rows
+
+    def _write_store(self, rows: list[tuple[str, bytes]]) -> None:
+        if self._store is None:
+            return
+        try:
+            with self._store_lock, self._store:
+                self._store.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+        except sqlite3.OperationalError as error:
+            logger.warning("Could not write to the embedding cache, the vectors are only kept in memory: %s", error)
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
@@ -0,0 +1,227 @@
+"""
+Incremental ingestion of documents into the FAISS index.
+
+Usage (from the backend directory):
+    python -m app.rag.ingest path/to/documents [--index-path app/api/routes/faiss_index]
+
+PDF files are split per page and every page is chunked, keeping the `file_name` and
+`page_number` metadata read by the answer metadata (text files have no page number).
+Chunks whose content hash is already in the index are skipped, the others are embedded in
+concurrent batches and appended to the existing index, which is only created from scratch
+if it doesn't exist yet. The indexed chunks of an ingested file that are no longer in it,
+because the file changed, are deleted from the index.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from app.core.config import settings
+from app.rag.pipeline import create_embeddings
+
+logger = logging.getLogger(__name__)
+
+TEXT_EXTENSIONS = {".txt", ".md"}
+
+
+def content_hash(text: str) -> str:
+    """
+    Hashes the content of a chunk, ignoring differences in whitespace.
+
+    Args:
+        text (str): The content of the chunk.
+
+    Returns:
+        str: The SHA-256 hex digest of the content.
+    """
+    return hashlib.sha256(" ".join(text.split()).encode()).hexdigest()
+
+
+def load_documents(directory: str) -> list[Document]:
+    """
+    Loads the PDF (one document per page) and text files found in the directory and its subdirectories.
+
+    Args:
+        directory (str): The directory containing the documents.
+
+    Returns:
+        list[Document]: The loaded pages, with their `file_name` and, for PDF files, `page_number` metadata.
+    """
+    documents = []
+    for root, _, files in os.walk(directory):
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            extension = os.path.splitext(file_name)[1].lower()
+            if extension == ".pdf":
+                for page_number, page in enumerate(PdfReader(path).pages, start=1):
+                    text = page.extract_text() or ""
+                    if text.strip():
+                        documents.append(Document(page_content=text, metadata={"file_name": file_name, "page_number": page_number}))
+            elif extension in TEXT_EXTENSIONS:
+                with open(path, encoding="utf-8") as file:
+                    documents.append(Document(page_content=file.read(), metadata={"file_name": file_name}))
+    return documents
+
+
+def split_documents(documents: list[Document], chunk_size: int, chunk_overlap: int) -> list[Document]:
+    """
+    Splits the documents into chunks, tagging each chunk with the hash of its content.
+
+    Args:
+        documents (list[Document]): The documents to split.
+        chunk_size (int): Maximum number of characters of a chunk.
+        chunk_overlap (int): Number of characters shared by consecutive chunks.
+
+    Returns:
+        list[Document]: The chunks.
+    """
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = splitter.split_documents(documents)
+    for chunk in chunks:
+        chunk.metadata["content_hash"] = content_hash(chunk.page_content)
+    return chunks
+
+
+def stale_chunk_ids(vectorstore: FAISS, chunks: list[Document]) -> list[str]:
+    """
+    Finds the indexed chunks of the ingested files that are no longer in them, because the files changed.
+
+    Args:
+        vectorstore (FAISS): The document index.
+        chunks (list[Document]): The chunks of the ingested files.
+
+    Returns:
+        list[str]: The docstore IDs of the stale chunks.
+    """
+    hashes_by_file = {}
+    for chunk in chunks:
+        hashes_by_file.setdefault(chunk.metadata["file_name"], set()).add(chunk.metadata["content_hash"])
+    return [
+        docstore_id for docstore_id, doc in vectorstore.docstore._dict.items()
+        if doc.metadata.get("file_name") in hashes_by_file
+        and (doc.metadata.get("content_hash") or content_hash(doc.page_content)) not in hashes_by_file[doc.metadata["file_name"]]
+    ]
+
+
+def indexed_hashes(vectorstore: FAISS) -> set[str]:
+    """
+    Collects the content hashes of the chunks already in the index.
+
+    Chunks indexed before the hashes were recorded are hashed from their content.
+
+    Args:
+        vectorstore (FAISS): The document index.
+
+    Returns:
+        set[str]: The content hashes.
+    """
+    return {
+        doc.metadata.get("content_hash") or content_hash(doc.page_content)
+        for doc in vectorstore.docstore._dict.values()
+    }
+
+
+async def embed_chunks(embeddings: Embeddings, chunks: list[Document], batch_size: int, concurrency: int) -> list[list[float]]:
+    """
+    Embeds the chunks in batches, sending up to `concurrency` batches at the same time.
+
+    Args:
+        embeddings (Embeddings): The embeddings model.
+        chunks (list[Document]): The chunks to embed.
+        batch_size (int): Number of chunks per request.
+        concurrency (int): Maximum number of requests in flight.
+
+    Returns:
+        list[list[float]]: The vectors, in the order of the chunks.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+
+    async def embed_batch(number: int, batch: list[Document]) -> list[list[float]]:
+        async with semaphore:
+            vectors = await embeddings.aembed_documents([chunk.page_content for chunk in batch])
+            logger.info("Embedded batch %d/%d", number + 1, len(batches))
+            return vectors
+
+    results = await asyncio.gather(*(embed_batch(number, batch) for number, batch in enumerate(batches)))
+    return [vector for vectors in results for vector in vectors]
+
+
+async def ingest(directory: str, index_path: str, chunk_size: int, chunk_overlap: int, batch_size: int, concurrency: int) -> tuple[int, int]:
+    """
+    Ingests the documents of the directory into the index, embedding only the new chunks and
+    deleting the chunks of the changed files that are no longer in them.
+
+    Args:
+        directory (str): The directory containing the documents.
+        index_path (str): The directory where the FAISS index is saved.
+        chunk_size (int): Maximum number of characters of a chunk.
+        chunk_overlap (int): Number of characters shared by consecutive chunks.
+        batch_size (int): Number of chunks per embeddings request.
+        concurrency (int): Maximum number of embeddings requests in flight.
+
+    Returns:
+        tuple[int, int]: The number of chunks added to the index, and the number deleted from it.
+    """
+    embeddings = create_embeddings()
+    chunks = split_documents(load_documents(directory), chunk_size, chunk_overlap)
+
+    vectorstore = None
+    stale_ids = []
+    known_hashes = set()
+    if os.path.exists(os.path.join(index_path, "index.faiss")):
+        vectorstore = await asyncio.to_thread(FAISS.load_local, index_path, embeddings, allow_dangerous_deserialization=True)
+        stale_ids = stale_chunk_ids(vectorstore, chunks)
+        if stale_ids:
+            vectorstore.delete(stale_ids)
+        known_hashes = indexed_hashes(vectorstore)
+
+    new_chunks = []
+    for chunk in chunks:
+        chunk_hash = chunk.metadata["content_hash"]
+        if chunk_hash not in known_hashes:
+            known_hashes.add(chunk_hash)
+            new_chunks.append(chunk)
+    logger.info("%d chunks found, %d not indexed yet, %d stale chunks deleted", len(chunks), len(new_chunks), len(stale_ids))
+    if not new_chunks and not stale_ids:
+        return 0, 0
+
+    if new_chunks:
+        vectors = await embed_chunks(embeddings, new_chunks, batch_size, concurrency)
+        text_embeddings = list(zip([chunk.page_content for chunk in new_chunks], vectors))
+        metadatas = [chunk.metadata for chunk in new_chunks]
+        if vectorstore is None:
+            vectorstore = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+        else:
+            vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
+    await asyncio.to_thread(vectorstore.save_local, index_path)
+    return len(new_chunks), len(stale_ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Add the documents of a directory to the FAISS index.")
+    parser.add_argument("directory", help="Directory containing the PDF, .txt and .md documents to ingest.")
+    parser.add_argument("--index-path", default=settings.FAISS_INDEX_PATH, help="Directory of the FAISS index.")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Maximum number of characters of a chunk.")
+    parser.add_argument("--chunk-overlap", type=int, default=200, help="Number of characters shared by consecutive chunks.")
+    parser.add_argument("--batch-size", type=int, default=512, help="Number of chunks per embeddings request.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of embeddings requests in flight.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    added, deleted = asyncio.run(ingest(args.directory, args.index_path, args.chunk_size, args.chunk_overlap, args.batch_size, args.concurrency))
+    print(
+        f"Added {added} chunks to {args.index_path} and deleted {deleted} stale chunks. "
+        "The backend workers reload the index within FAISS_INDEX_RELOAD_INTERVAL_SECONDS."
+    )
+
+
+if __name__ == "__main__":
+    main()
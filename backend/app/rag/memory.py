@@ -0,0 +1,53 @@
+from typing import Any
+
+
+def format_conversation(turns: list) -> str:
+    """
+    Formats question-answer pairs as lines of conversation for the memory prompts.
+
+    Args:
+        turns (list[QuestionAnswerDB]): The question-answer pairs, oldest first.
+
+    Returns:
+        str: One 'Human' and one 'AI' line per pair.
+    """
+    return "\n".join(f"Human: {qa.question}\nAI: {qa.answer}" for qa in turns)
+
+
+def merge_entities(entities: list[dict[str, str]], new_entities: Any, max_entities: int) -> list[dict[str, str]]:
+    """
+    Merges newly extracted entities into the entity memory of a chat.
+
+    Entities mentioned again move to the end, so that the least recently mentioned ones are
+    dropped first when the memory holds more than `max_entities`. The memory is a list rather
+    than a mapping by name because JSONB doesn't keep the order of the keys of an object.
+
+    Args:
+        entities (list[dict[str, str]]): The names and descriptions of the known entities, least recently mentioned first.
+        new_entities (Any): The output of the entity extraction, ignored unless it maps names to descriptions.
+        max_entities (int): Maximum number of entities kept.
+
+    Returns:
+        list[dict[str, str]]: The merged entities, least recently mentioned first.
+    """
+    merged = {entity["name"]: entity["description"] for entity in entities}
+    if isinstance(new_entities, dict):
+        for name, description in new_entities.items():
+            if isinstance(name, str) and isinstance(description, str) and name.strip() and description.strip():
+                merged.pop(name.strip(), None)
+                merged[name.strip()] = description.strip()
+    kept = list(merged.items())[-max_entities:] if max_entities > 0 else []
+    return [{"name": name, "description": description} for name, description in kept]
+
+
+def format_entities(entities: list[dict[str, str]]) -> str:
+    """
+    Formats the entity memory of a chat for the prompt.
+
+    Args:
+        entities (list[dict[str, str]]): The names and descriptions of the known entities.
+
+    Returns:
+        str: One line per entity.
+    """
+    return "\n".join(f"- {entity['name']}: {entity['description']}" for entity in entities)
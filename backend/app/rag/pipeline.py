@@ -0,0 +1,386 @@
+import asyncio
+import logging
+import os
+
+import numpy as np
+from fastapi import HTTPException, Request, status
+from langchain.chains.llm import LLMChain
+from langchain.prompts import ChatPromptTemplate
+from langchain_community.embeddings import OpenAIEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+from langchain_openai import ChatOpenAI
+
+from app.core.config import settings
+from app.core.metrics import TokenUsageHandler
+from app.core.single_flight import SingleFlight
+from app.core.tracing import LLMSpanHandler
+from app.rag.ann import load_or_build_index, set_search_parameters
+from app.rag.cache import SemanticCache
+from app.rag.context import get_encoding
+from app.rag.embeddings import CachedEmbeddings
+from app.rag.retrievers import BM25Index, HybridRetriever
+
+logger = logging.getLogger(__name__)
+
+qa_system_prompt = """
+    You are a climate crisis specialist. 
+    Use the following context from retrieved documents and, if you think is useful, the chat history to answer the user's question.
+    Also, {instruction}
+    Context: {context},
+
+    Chat History: {chat_history}, 
+
+    Question: {question}
+
+    Rethink about your answer and make sure it is accurate and informative.
+    If you don't feel confident about the answer, you can admit that you are not completley sure and ask for more information.
+    """
+
+general_question_prompt_template = """
+    You are an assistant trained to identify the type of question. Classify the question as follows:
+    - Answer "General" if the question is about trivial or everyday topics, or unrelated to the climate crisis, and can be answered without consulting specific documents or data.
+    - Answer "Specific" only if the question involves climate-related topics or requires consulting detailed information from a climate crisis database.
+
+    Question: {question}
+    Classification:
+    """
+
+history_summary_prompt_template = """
+    Progressively summarize the lines of a conversation between a user and a climate crisis assistant,
+    adding them to the previous summary and returning a new, concise summary.
+    Keep the facts, figures, documents and decisions that may be needed to answer follow-up questions.
+
+    Previous summary: {summary}
+
+    New lines of conversation:
+    {conversation}
+
+    New summary:
+    """
+
+entity_extraction_prompt_template = """
+    Extract the entities (laws, plans, programs, organizations, places, people, figures) discussed in the lines
+    of a conversation between a user and a climate crisis assistant, with a one-sentence description of what
+    the conversation says about each one. Update the description of the known entities that are mentioned again.
+
+    Known entities: {entities}
+
+    New lines of conversation:
+    {conversation}
+
+    Answer only with a JSON object mapping each entity mentioned in the new lines to its description, or {{}} if there is none.
+    """
+
+
+def get_index_version(index_path: str) -> str:
+    """
+    Fingerprints the FAISS index files, so that a rebuilt index can be detected.
+
+    Args:
+        index_path (str): The directory where the FAISS index is saved.
+
+    Returns:
+        str: The version of the index.
+    """
+    index_stats = [os.stat(os.path.join(index_path, name)) for name in ("index.faiss", "index.pkl")]
+    return "-".join(f"{stat.st_mtime_ns}:{stat.st_size}" for stat in index_stats)
+
+
+def create_embeddings() -> Embeddings:
+    """
+    Creates the embeddings model of the questions and documents, cached if enabled.
+
+    Returns:
+        Embeddings: The embeddings model.
+    """
+    embeddings = OpenAIEmbeddings(openai_api_base=settings.OPENAI_BASE_URL)
+    if settings.EMBEDDING_CACHE_ENABLED:
+        embeddings = CachedEmbeddings(
+            embeddings,
+            # Vectors from another endpoint, such as the load test stub, must not be mixed with the real ones
+            model_name=f"{embeddings.model}@{settings.OPENAI_BASE_URL}" if settings.OPENAI_BASE_URL else embeddings.model,
+            store_path=settings.EMBEDDING_CACHE_PATH,
+            max_memory_entries=settings.EMBEDDING_CACHE_MAX_MEMORY_ENTRIES
+        )
+    return embeddings
+
+
+def llm_callbacks(stage: str) -> list:
+    """
+    Creates the callbacks counting the tokens and tracing the LLM calls of a stage.
+
+    Args:
+        stage (str): The stage the LLM calls belong to.
+
+    Returns:
+        list: The callbacks to attach to the LLM of the stage.
+    """
+    return [TokenUsageHandler(stage), LLMSpanHandler(stage)]
+
+
+class AIPipeline:
+    """
+    The models, document index, caches and chains used to answer the questions.
+
+    The pipeline is built once per worker by the application lifespan handler and stored in
+    `app.state.pipeline`. The FAISS index is loaded separately, by `load_index`, so that a
+    missing index makes the worker unready instead of crashing it.
+
+    Attributes:
+        llm (ChatOpenAI): The chat model answering and classifying the questions.
+        embeddings (Embeddings): The embeddings model of the questions and documents.
+        semantic_cache (SemanticCache): The answers of past questions, looked up by similarity.
+        first_questions (SingleFlight): The first questions of new chats being answered, shared by identical concurrent questions.
+        rag_chain (Runnable): The chain answering specific questions from the retrieved documents.
+        general_chain (Runnable): The chain answering general questions without documents.
+        classification_chain (LLMChain): The chain classifying the questions with the LLM.
+        summary_chain (Runnable): The chain adding old turns of a chat to its rolling summary.
+        entity_chain (Runnable): The chain extracting the entities discussed in new turns of a chat.
+        vectorstore (FAISS | None): The document index, None until it is loaded.
+        chunk_positions (dict[str, int]): The position in the FAISS index of each chunk, by content.
+        retriever (BaseRetriever | None): The retriever over the document index, hybrid if enabled, None until it is loaded.
+        warmed_up (bool): Whether the embeddings and the index have been exercised since startup.
+    """
+
+    def __init__(self):
+        self.llm = ChatOpenAI(
+            model="gpt-4o",
+            base_url=settings.OPENAI_BASE_URL,
+            temperature=0.7,
+            frequency_penalty=0.5,
+            presence_penalty=0.3,
+            # Report the token usage of streamed answers too, for the metrics
+            stream_usage=True,
+        )
+        self.embeddings = create_embeddings()
+
+        # Answers of past questions, looked up by question similarity
+        self.semantic_cache = SemanticCache(
+            similarity_threshold=settings.SEMANTIC_CACHE_SIMILARITY_THRESHOLD,
+            ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES
+        )
+
+        # First questions of new chats being answered, by normalized question and role
+        self.first_questions = SingleFlight()
+
+        # Prompt template for question answering
+        qa_prompt = ChatPromptTemplate.from_template(qa_system_prompt)
+
+        # RAG chain answering from the documents retrieved by `classify_and_retrieve`.
+        # Retrieval happens once per turn, outside of the chain, so that the same documents
+        # feed the prompt and the answer metadata.
+        self.rag_chain = (
+            qa_prompt
+            | self.llm.with_config(callbacks=llm_callbacks("generation"))
+            | StrOutputParser()
+        )
+
+        # Chain answering general questions directly
+        self.general_chain = (
+            self.llm.with_config(callbacks=llm_callbacks("general_generation"))
+            | StrOutputParser()
+        )
+
+        # Question classification prompt
+        question_classifier_prompt = ChatPromptTemplate.from_template(general_question_prompt_template)
+
+        # Chain to classify questions
+        # The callbacks are set on the LLM: those of the chain are not passed down to its LLM calls.
+        self.classification_chain = LLMChain(
+            llm=self.llm.with_config(callbacks=llm_callbacks("classification")),
+            prompt=question_classifier_prompt
+        )
+
+        # Chain adding the turns that leave the chat history to the rolling summary
+        self.summary_chain = (
+            ChatPromptTemplate.from_template(history_summary_prompt_template)
+            | self.llm.with_config(callbacks=llm_callbacks("history_summary"))
+            | StrOutputParser()
+        )
+
+        # Chain extracting the entities of the turns added to the entity memory of a chat
+        self.entity_chain = (
+            ChatPromptTemplate.from_template(entity_extraction_prompt_template)
+            | self.llm.with_config(callbacks=llm_callbacks("entity_extraction"))
+            | JsonOutputParser()
+        )
+
+        self.vectorstore = None
+        self.chunk_positions = {}
+        self.retriever = None
+        self.warmed_up = False
+
+    @property
+    def is_ready(self) -> bool:
+        """
+        Whether the pipeline can answer questions: the index is loaded and, if enabled, warmed up.
+        """
+        return self.retriever is not None and (self.warmed_up or not settings.WARMUP_ON_STARTUP)
+
+    def load_index(self, index_path: str = settings.FAISS_INDEX_PATH) -> None:
+        """
+        Loads the FAISS index and builds the retriever over it.
+
+        The exact index saved on disk is replaced in memory by the approximate index type
+        configured by `FAISS_INDEX_TYPE`, if any. If hybrid retrieval is enabled, a BM25 index
+        is built over the same chunks and merged with the vector search.
+
+        Cached answers are dropped if the index differs from the one they were built from, which
+        happens when the index is reloaded by `reload_index_if_changed`.
+
+        Args:
+            index_path (str): The directory where the FAISS index is saved.
+        """
+        vectorstore = FAISS.load_local(index_path, self.embeddings, allow_dangerous_deserialization=True)
+        vectorstore.index = load_or_build_index(
+            index_path,
+            vectorstore.index,
+            index_type=settings.FAISS_INDEX_TYPE,
+            nlist=settings.FAISS_IVF_NLIST,
+            pq_m=settings.FAISS_PQ_M,
+            hnsw_m=settings.FAISS_HNSW_M
+        )
+        set_search_parameters(vectorstore.index, nprobe=settings.FAISS_IVF_NPROBE, ef_search=settings.FAISS_HNSW_EF_SEARCH)
+        retriever = vectorstore.as_retriever(
+            search_type="similarity_score_threshold",
+            search_kwargs={"score_threshold": 0.78, 'k': settings.RETRIEVAL_K}
+        )
+        if settings.HYBRID_RETRIEVAL_ENABLED:
+            retriever = HybridRetriever(
+                vector_retriever=retriever,
+                lexical_index=BM25Index(list(vectorstore.docstore._dict.values())),
+                k=settings.RETRIEVAL_K,
+                rrf_k=settings.HYBRID_RRF_K
+            )
+        self.vectorstore = vectorstore
+        self.chunk_positions = {
+            vectorstore.docstore.search(docstore_id).page_content: position
+            for position, docstore_id in vectorstore.index_to_docstore_id.items()
+        }
+        self.retriever = retriever
+        self.semantic_cache.set_index_version(get_index_version(index_path))
+
+    def document_vectors(self, documents: list[Document]) -> np.ndarray | None:
+        """
+        Reads the vectors of retrieved documents back from the FAISS index, without embedding them again.
+
+        Args:
+            documents (list[Document]): Documents of the index.
+
+        Returns:
+            np.ndarray | None: The normalized vectors, one row per document, or None if a document
+            isn't in the index or the index can't reconstruct its vectors.
+        """
+        positions = [self.chunk_positions.get(document.page_content) for document in documents]
+        if not documents or None in positions:
+            return None
+        try:
+            vectors = np.stack([self.vectorstore.index.reconstruct(position) for position in positions])
+        except RuntimeError:
+            return None
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    async def reload_index_if_changed(self, index_path: str = settings.FAISS_INDEX_PATH, seen_version: str | None = None) -> str:
+        """
+        Reloads the FAISS index if its files changed since it was loaded, e.g. by `app.rag.ingest`,
+        dropping the cached answers built from the previous index.
+
+        The index is only reloaded once its version is the same as at the previous check, so that
+        files still being written are not loaded.
+
+        Args:
+            index_path (str): The directory where the FAISS index is saved.
+            seen_version (str | None): The version of the index files at the previous check.
+
+        Returns:
+            str: The version of the index files, to pass to the next check.
+        """
+        version = await asyncio.to_thread(get_index_version, index_path)
+        if version != self.semantic_cache.index_version and version == seen_version:
+            logger.info("The FAISS index changed, reloading it")
+            await asyncio.to_thread(self.load_index, index_path)
+            if settings.WARMUP_ON_STARTUP and not self.warmed_up:
+                # The index was missing at startup, so the worker was never warmed up.
+                await self.warmup()
+        return version
+
+    async def warmup(self) -> None:
+        """
+        Embeds and searches a dummy question and loads the tokenizer, so that the first request
+        doesn't pay for opening the connections to OpenAI, paging the index into memory and
+        reading (or downloading) the tiktoken encoding.
+        """
+        # The underlying model is called directly: a cached vector would leave the client cold.
+        embeddings = getattr(self.embeddings, "embeddings", self.embeddings)
+        vector = await embeddings.aembed_query("Plano Clima")
+        await asyncio.to_thread(self.vectorstore.similarity_search_by_vector, vector, k=1)
+        await asyncio.to_thread(get_encoding)
+        self.warmed_up = True
+
+
+async def create_pipeline() -> AIPipeline:
+    """
+    Builds the pipeline, loads the document index and, if enabled, warms them up.
+
+    Failures are logged rather than raised: the worker then starts but reports itself unready.
+
+    Returns:
+        AIPipeline: The pipeline.
+    """
+    pipeline = AIPipeline()
+    try:
+        await asyncio.to_thread(pipeline.load_index)
+    except Exception:
+        logger.exception("Failed to load the FAISS index from %s", settings.FAISS_INDEX_PATH)
+        return pipeline
+
+    if settings.WARMUP_ON_STARTUP:
+        try:
+            await pipeline.warmup()
+        except Exception:
+            logger.exception("Failed to warm up the pipeline")
+    return pipeline
+
+
+async def watch_index(pipeline: AIPipeline, interval: float) -> None:
+    """
+    Checks the FAISS index files every `interval` seconds, reloading the index when they change.
+
+    Meant to run as a task for the lifetime of the worker. Failed checks are logged and retried.
+
+    Args:
+        pipeline (AIPipeline): The pipeline of the worker.
+        interval (float): Time (in seconds) between two checks.
+    """
+    seen_version = pipeline.semantic_cache.index_version
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            seen_version = await pipeline.reload_index_if_changed(seen_version=seen_version)
+        except Exception:
+            logger.exception("Failed to reload the FAISS index from %s", settings.FAISS_INDEX_PATH)
+
+
+# Dependency
+def get_pipeline(request: Request) -> AIPipeline:
+    """
+    Retrieves the pipeline of the worker.
+
+    Args:
+        request (Request): FastAPI request object.
+
+    Returns:
+        AIPipeline: The pipeline.
+
+    Raises:
+        HTTPException: If the document index is not loaded, returns a 503 Service Unavailable.
+    """
+    pipeline = getattr(request.app.state, "pipeline", None)
+    if pipeline is None or pipeline.retriever is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="The document index is not loaded")
+    return pipeline
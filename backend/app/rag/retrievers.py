@@ -0,0 +1,189 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from app.rag.classifier import normalize_text
+
+# Numbers keep their separators ("12.187", "2.2/2023") so that they can be normalized as a whole.
+TOKEN_PATTERN = re.compile(r"\d+(?:[.,/-]\d+)*|[a-z]+")
+
+# Legal identifiers ("Lei nº 12.187", "art. 6º", "Decreto 9.578") and acronyms ("PNMC").
+IDENTIFIER_PATTERN = re.compile(r"\b(?:lei|decreto|portaria|resolucao|art(?:igo)?)\.?\s*(?:n\s*[ºo°.]*\s*)?(\d+(?:[.,/-]\d+)*)|\b(\d+(?:[.,/-]\d+)+)\b")
+ACRONYM_PATTERN = re.compile(r"\b[A-Z]{3,}\b")
+
+STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "como", "da", "das", "de", "do", "dos", "e", "em", "na", "nas", "no", "nos",
+    "o", "os", "ou", "para", "pela", "pelas", "pelo", "pelos", "por", "que", "qual", "quais", "se", "sobre",
+    "um", "uma", "uns", "umas", "sao", "ser", "esta", "este", "isso", "isto",
+    "an", "and", "are", "about", "by", "for", "from", "in", "is", "it", "of", "on", "or", "the", "to", "what",
+    "which", "with", "does", "do", "how",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Splits the text into lexical terms: accents and case are dropped, stopwords removed and
+    the separators of numbers stripped, so that '12.187' and '12187' match.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list[str]: The terms of the text.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(normalize_text(text)):
+        if token[0].isdigit():
+            terms.append(re.sub(r"[.,/-]", "", token))
+        elif token not in STOPWORDS:
+            terms.append(token)
+    return terms
+
+
+def identifier_terms(query: str) -> set[str]:
+    """
+    Extracts the terms of the legal identifiers and acronyms of the query.
+
+    Args:
+        query (str): The query.
+
+    Returns:
+        set[str]: The identifier terms, normalized as by `tokenize`.
+    """
+    terms = {acronym.lower() for acronym in ACRONYM_PATTERN.findall(query)}
+    for number in IDENTIFIER_PATTERN.findall(normalize_text(query)):
+        terms.update(re.sub(r"[.,/-]", "", part) for part in number if part)
+    return terms
+
+
+class BM25Index:
+    """
+    In-memory inverted index ranking documents with Okapi BM25.
+
+    Attributes:
+        documents (list[Document]): The indexed documents.
+        k1 (float): Term frequency saturation.
+        b (float): Document length normalization.
+    """
+
+    def __init__(self, documents: list[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self.doc_lengths: list[int] = []
+        for position, document in enumerate(documents):
+            frequencies = Counter(tokenize(document.page_content))
+            self.doc_lengths.append(sum(frequencies.values()))
+            for term, frequency in frequencies.items():
+                self.postings[term].append((position, frequency))
+        self.average_length = sum(self.doc_lengths) / len(documents) if documents else 0.0
+        self.idf = {
+            term: math.log(1 + (len(documents) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        """
+        Ranks the documents containing at least one term of the query.
+
+        Args:
+            query (str): The query.
+            k (int): Maximum number of documents returned.
+
+        Returns:
+            list[tuple[int, float]]: The positions of the best documents and their scores, best first.
+        """
+        scores: dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for position, frequency in self.postings[term]:
+                length_ratio = self.doc_lengths[position] / self.average_length
+                scores[position] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * (1 - self.b + self.b * length_ratio))
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def contains_all(self, position: int, terms: set[str]) -> bool:
+        """
+        Checks whether the document contains every term.
+
+        Args:
+            position (int): The position of the document.
+            terms (set[str]): The terms to look for.
+
+        Returns:
+            bool: True if every term appears in the document.
+        """
+        return all(any(p == position for p, _ in self.postings.get(term, ())) for term in terms)
+
+
+def reciprocal_rank_fusion(rankings: list[list[Document]], k: int, rrf_k: int = 60) -> list[Document]:
+    """
+    Merges rankings of documents, scoring each document by the sum of 1 / (rrf_k + rank) over the rankings.
+
+    Args:
+        rankings (list[list[Document]]): The rankings to merge, best first.
+        k (int): Maximum number of documents returned.
+        rrf_k (int): Damping constant of the ranks.
+
+    Returns:
+        list[Document]: The merged ranking, best first.
+    """
+    scores: dict[str, float] = defaultdict(float)
+    documents: dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            scores[document.page_content] += 1 / (rrf_k + rank)
+            documents.setdefault(document.page_content, document)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever merging a lexical BM25 search and a vector search with reciprocal rank fusion.
+
+    Queries quoting distinctive legal identifiers or acronyms that the best lexical match
+    contains entirely are answered from the lexical index only, without embedding the query.
+
+    Attributes:
+        vector_retriever (BaseRetriever): The retriever over the vector store.
+        lexical_index (BM25Index): The inverted index over the same documents.
+        k (int): Maximum number of documents returned.
+        rrf_k (int): Damping constant of the reciprocal rank fusion.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_retriever: BaseRetriever
+    lexical_index: BM25Index
+    k: int = 3
+    rrf_k: int = 60
+
+    def _lexical_search(self, query: str) -> tuple[list[Document], bool]:
+        results = self.lexical_index.search(query, self.k)
+        documents = [self.lexical_index.documents[position] for position, _ in results]
+        identifiers = identifier_terms(query)
+        # Short identifiers alone ("art. 6") are too common to trust a lexical match.
+        distinctive = any(len(term) >= 3 for term in identifiers)
+        exact_match = distinctive and bool(results) and self.lexical_index.contains_all(results[0][0], identifiers)
+        return documents, exact_match
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        lexical_documents, exact_match = self._lexical_search(query)
+        if exact_match:
+            return lexical_documents
+        vector_documents = self.vector_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return reciprocal_rank_fusion([vector_documents, lexical_documents], self.k, self.rrf_k)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> list[Document]:
+        lexical_documents, exact_match = self._lexical_search(query)
+        if exact_match:
+            return lexical_documents
+        vector_documents = await self.vector_retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return reciprocal_rank_fusion([vector_documents, lexical_documents], self.k, self.rrf_k)
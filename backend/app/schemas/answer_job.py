@@ -0,0 +1,22 @@
+import uuid
+from pydantic import BaseModel
+
+from app.schemas.question_answer import QuestionAnswerBase
+
+
+class AnswerJob(BaseModel):
+    """
+    Model for the status of a question answered asynchronously.
+
+    Attributes:
+        id (UUID): The unique identifier of the job.
+        chat_id (UUID): The unique identifier of the chat the question is asked in.
+        status (str): 'pending', 'running', 'done' or 'failed'.
+        question_answer (QuestionAnswerBase | None): The question-answer pair, once the job is done.
+        error (str | None): The reason of the failure, if the job failed.
+    """
+    id: uuid.UUID
+    chat_id: uuid.UUID
+    status: str
+    question_answer: QuestionAnswerBase | None = None
+    error: str | None = None
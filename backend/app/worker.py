@@ -0,0 +1,145 @@
+"""
+Worker processes answering the questions queued by `POST /chats/{chat_id}?asynchronous=true`.
+
+Usage (from the backend directory):
+    python -m app.worker [--processes 2] [--concurrency JOB_WORKER_CONCURRENCY]
+
+Each process loads its own pipeline and runs `--concurrency` loops that claim the jobs from the
+`answer_jobs` table, answer them and write the question-answer pair. The web workers then only
+hold the HTTP requests, while the number of questions sent to OpenAI at once is set here.
+SIGTERM and SIGINT stop the claims and let the running jobs finish; jobs left running by a
+killed worker are claimed again after `JOB_TIMEOUT_SECONDS`.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+from app.api.routes.utils import ask_question_ai, update_chat_memory
+from app.core.config import settings
+from app.db import crud, database
+from app.db.database import SessionLocal
+from app.rag.pipeline import AIPipeline, create_pipeline
+from app.schemas.chat import ChatBase
+
+logger = logging.getLogger(__name__)
+
+
+async def process_next_job(pipeline: AIPipeline) -> bool:
+    """
+    Claims a job and answers its question, adding the answer to the chat and updating the chat memory.
+
+    Failed attempts are recorded on the job, which is queued again until `JOB_MAX_ATTEMPTS`. An
+    attempt is given up after `JOB_TIMEOUT_SECONDS`, when the job may be claimed again by another
+    worker, and its answer is dropped if that happened anyway.
+
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+
+    Returns:
+        bool: True if a job was claimed, False if there was none to run.
+    """
+    async with SessionLocal() as db:
+        db_job = await crud.claim_answer_job(db)
+        if db_job is None:
+            return False
+        attempt = db_job.attempts
+
+        try:
+            db_chat = await crud.get_chat_by_id(db, db_job.chat_id)
+            response = await asyncio.wait_for(
+                ask_question_ai(pipeline=pipeline, db=db, db_chat=db_chat, question=ChatBase(question=db_job.question), role=db_job.role),
+                timeout=settings.JOB_TIMEOUT_SECONDS
+            )
+            db_qa = await crud.complete_answer_job(db, db_job, attempt, response)
+        except Exception as error:
+            logger.exception("Attempt %d of job %s failed", attempt, db_job.id)
+            await db.rollback()
+            await db.refresh(db_job)
+            await crud.fail_answer_job(db, db_job, attempt, str(error) or type(error).__name__)
+            return True
+        if db_qa is None:
+            logger.warning("Attempt %d of job %s was superseded, its answer is dropped", attempt, db_job.id)
+            return True
+
+    await update_chat_memory(pipeline, db_job.chat_id)
+    return True
+
+
+async def work(pipeline: AIPipeline, stop: asyncio.Event) -> None:
+    """
+    Processes jobs until `stop` is set, waiting `JOB_POLL_INTERVAL_SECONDS` whenever the queue is empty.
+
+    Args:
+        pipeline (AIPipeline): The pipeline answering the questions.
+        stop (asyncio.Event): Set to stop claiming jobs.
+    """
+    while not stop.is_set():
+        try:
+            processed = await process_next_job(pipeline)
+        except Exception:
+            logger.exception("Failed to process the next job")
+            processed = False
+        if not processed:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=settings.JOB_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_worker(concurrency: int) -> None:
+    """
+    Runs a worker process: loads the pipeline, then processes up to `concurrency` jobs at a time until stopped.
+
+    Args:
+        concurrency (int): Number of jobs processed at the same time.
+    """
+    await database.create_tables()
+    pipeline = await create_pipeline()
+    if not pipeline.is_ready:
+        logger.error("The AI pipeline is not ready, the worker is not started")
+        await database.engine.dispose()
+        return
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    logger.info("Worker started, processing up to %d jobs at a time", concurrency)
+    try:
+        await asyncio.gather(*(work(pipeline, stop) for _ in range(concurrency)))
+    finally:
+        await database.engine.dispose()
+    logger.info("Worker stopped")
+
+
+def run_process(concurrency: int) -> None:
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker(concurrency))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Answer the questions queued for asynchronous answering.")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes.")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY, help="Number of jobs processed at the same time per process.")
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        run_process(args.concurrency)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_process, args=(args.concurrency,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    # Forwarded as SIGTERM, letting the running jobs of each process finish.
+    signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
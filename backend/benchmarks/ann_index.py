@@ -0,0 +1,99 @@
+"""
+Recall, latency and memory of the FAISS index types against the exact (flat) index.
+
+Usage (from the backend directory):
+    python -m benchmarks.ann_index [--index-path app/api/routes/faiss_index] [--k 3] [--queries 500]
+
+The queries are vectors of the corpus with some gaussian noise, so that the benchmark runs
+offline, without embedding any text. Each query is searched on its own, as a request would.
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from app.rag.ann import INDEX_TYPES, build_index, set_search_parameters
+
+
+def resident_memory() -> int:
+    """
+    Returns the resident set size of the process, in bytes (Linux only).
+    """
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * 4096
+
+
+def sample_queries(flat_index: faiss.Index, count: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(flat_index.ntotal, size=min(count, flat_index.ntotal), replace=False)
+    vectors = np.stack([flat_index.reconstruct(int(i)) for i in ids])
+    vectors += rng.normal(scale=noise, size=vectors.shape).astype(np.float32)
+    return vectors
+
+
+def measure(index: faiss.Index, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = np.empty(len(queries))
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids[i] = index.search(query.reshape(1, -1), k)
+        latencies[i] = time.perf_counter() - start
+    return ids, latencies
+
+
+def recall_at_k(ids: np.ndarray, exact_ids: np.ndarray) -> float:
+    return float(np.mean([len(set(found) & set(exact)) / len(exact) for found, exact in zip(ids, exact_ids)]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the FAISS index types against the flat index.")
+    parser.add_argument("--index-path", default="app/api/routes/faiss_index", help="Directory of the FAISS index.")
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES, help="Index types to benchmark.")
+    parser.add_argument("--k", type=int, default=3, help="Number of neighbors searched.")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries.")
+    parser.add_argument("--noise", type=float, default=0.01, help="Standard deviation of the noise added to the queries.")
+    parser.add_argument("--nlist", type=int, default=1024, help="Number of inverted lists of the IVF indexes.")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64], help="Values of nprobe to try.")
+    parser.add_argument("--pq-m", type=int, default=64, help="Number of sub-quantizers of the IVF-PQ index.")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="Number of neighbors per node of the HNSW graph.")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256], help="Values of efSearch to try.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the query sampling.")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)
+    flat_index = faiss.read_index(f"{args.index_path}/index.faiss")
+    queries = sample_queries(flat_index, args.queries, args.noise, args.seed)
+    exact_ids, _ = measure(flat_index, queries, args.k)
+    print(f"{flat_index.ntotal} vectors of dimension {flat_index.d}, {len(queries)} queries, k={args.k}\n")
+    print(f"{'index':<12} {'params':<14} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} {'size MB':>8} {'rss MB':>8} {'build s':>8}")
+
+    for index_type in args.types:
+        rss_before = resident_memory()
+        start = time.perf_counter()
+        index = build_index(flat_index, index_type, nlist=args.nlist, pq_m=args.pq_m, hnsw_m=args.hnsw_m)
+        build_time = time.perf_counter() - start
+        size = len(faiss.serialize_index(index)) / 2**20
+        # The flat index was loaded before the first measurement: its footprint is its size.
+        rss = (resident_memory() - rss_before) / 2**20 if index is not flat_index else size
+
+        if isinstance(index, faiss.IndexIVF):
+            settings = [(f"nprobe={nprobe}", nprobe, 0) for nprobe in args.nprobe]
+        elif isinstance(index, faiss.IndexHNSW):
+            settings = [(f"efSearch={ef}", 0, ef) for ef in args.ef_search]
+        else:
+            settings = [("-", 0, 0)]
+
+        for label, nprobe, ef_search in settings:
+            set_search_parameters(index, nprobe=nprobe, ef_search=ef_search)
+            ids, latencies = measure(index, queries, args.k)
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            print(
+                f"{index_type:<12} {label:<14} {recall_at_k(ids, exact_ids):>9.3f} {p50:>8.3f} {p99:>8.3f} "
+                f"{size:>8.1f} {rss:>8.1f} {build_time:>8.1f}"
+            )
+        del index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+End-to-end load test of the backend against a local stub of the OpenAI API.
+
+Usage (from the backend directory, with the database of the .env file running):
+    python -m benchmarks.load_test [--users 50] [--concurrency 10] [--follow-ups 3] [--output results.json]
+
+Starts the OpenAI stub (`benchmarks.openai_stub`), ingests a synthetic corpus into a temporary
+FAISS index with the stub embeddings, and starts the backend pointed at both. Each virtual user
+then signs up, gets a token, creates a chat and asks follow-up questions. The requests per second,
+p50/p95/p99 latencies and error rate of each endpoint are reported at the end.
+
+With --target, the backend already running at that URL is load tested instead; it must be
+configured with OPENAI_BASE_URL pointing at a running stub. The users and chats created by the
+run are left in the database.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.openai_stub import add_stub_arguments, stub_arguments
+
+QUESTIONS = [
+    "Quais são as metas de redução de emissões do Plano Clima?",
+    "Como o município pode se adaptar às ondas de calor?",
+    "Quais ações de mitigação são previstas para o setor de energia?",
+    "Como financiar projetos de adaptação climática em cidades médias?",
+    "Qual é o papel da agricultura de baixo carbono na política nacional?",
+    "Quais são os riscos de enchentes para as áreas urbanas?",
+    "Como medir as emissões de gases de efeito estufa de um município?",
+    "Qual é a capital da França?",
+]
+
+CORPUS_SENTENCES = [
+    "The national climate plan sets targets for the reduction of greenhouse gas emissions by 2035.",
+    "Municipalities must map the areas at risk of floods and landslides in their adaptation plans.",
+    "Low carbon agriculture combines no-till farming, integrated crop-livestock systems and forest restoration.",
+    "Heat waves are becoming more frequent and longer in the large cities of the southeast.",
+    "The energy sector relies on hydropower, wind and solar generation to keep a renewable electricity mix.",
+    "Climate finance instruments include the national climate fund and green bonds issued by subnational governments.",
+    "Deforestation in the Amazon and the Cerrado remains the main source of emissions of the country.",
+    "Urban drainage, green infrastructure and early warning systems reduce the damages of extreme rainfall.",
+]
+
+
+def write_corpus(directory: str, documents: int, paragraphs: int) -> None:
+    """
+    Writes a synthetic corpus of climate documents, as text files.
+
+    Args:
+        directory (str): The directory of the documents.
+        documents (int): Number of documents.
+        paragraphs (int): Number of paragraphs per document.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for document in range(documents):
+        lines = []
+        for paragraph in range(paragraphs):
+            offset = document * paragraphs + paragraph
+            sentences = [CORPUS_SENTENCES[(offset + i) % len(CORPUS_SENTENCES)] for i in range(5)]
+            lines.append(f"Section {paragraph + 1} of report {document + 1}. " + " ".join(sentences))
+        with open(os.path.join(directory, f"report_{document + 1}.txt"), "w", encoding="utf-8") as file:
+            file.write("\n\n".join(lines))
+
+
+async def wait_until_ready(url: str, timeout: float) -> None:
+    """
+    Waits until a URL answers with a successful status.
+
+    Args:
+        url (str): The URL to poll.
+        timeout (float): The maximum time to wait, in seconds.
+
+    Raises:
+        TimeoutError: If the URL doesn't answer successfully in time.
+    """
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).is_success:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise TimeoutError(f"{url} was not ready after {timeout:.0f}s")
+
+
+class LoadTestResults:
+    """
+    The latency and status of every request of the load test, by endpoint.
+    """
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.started = time.perf_counter()
+        self.ended: float | None = None
+
+    async def request(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        """
+        Sends a request and records its latency, counting transport errors and error statuses as errors.
+
+        Returns:
+            httpx.Response | None: The response, None if the request failed.
+        """
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        self.latencies[endpoint].append(time.perf_counter() - start)
+        if response is None or response.is_error:
+            self.errors[endpoint] += 1
+            return None
+        return response
+
+    def summary(self) -> dict[str, dict]:
+        """
+        Returns:
+            dict: The number of requests, error rate, requests per second and p50/p95/p99 latencies (in ms) of each endpoint.
+        """
+        elapsed = (self.ended or time.perf_counter()) - self.started
+        endpoints = {**self.latencies, "total": [latency for latencies in self.latencies.values() for latency in latencies]}
+        summary = {}
+        for endpoint, latencies in endpoints.items():
+            latencies = sorted(latencies)
+            errors = sum(self.errors.values()) if endpoint == "total" else self.errors[endpoint]
+            summary[endpoint] = {
+                "requests": len(latencies),
+                "error_rate": errors / len(latencies) if latencies else 0.0,
+                "rps": len(latencies) / elapsed,
+                **{f"p{q}_ms": percentile(latencies, q) * 1000 for q in (50, 95, 99)},
+            }
+        return summary
+
+
+def percentile(values: list[float], q: float) -> float:
+    """
+    Nearest-rank percentile of sorted values.
+
+    Args:
+        values (list[float]): The sorted values.
+        q (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile, 0 without values.
+    """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+async def virtual_user(client: httpx.AsyncClient, results: LoadTestResults, user: int, follow_ups: int, unique_questions: bool) -> None:
+    """
+    Signs up, gets a token, creates a chat and asks follow-up questions, stopping at the first failure.
+
+    Args:
+        client (httpx.AsyncClient): The client of the backend.
+        results (LoadTestResults): Where the requests are recorded.
+        user (int): The number of the virtual user, choosing its questions.
+        follow_ups (int): Number of follow-up questions.
+        unique_questions (bool): Whether the questions are made unique, so that the semantic cache misses.
+    """
+    def question(turn: int) -> str:
+        text = QUESTIONS[(user + turn) % len(QUESTIONS)]
+        return f"{text} ({uuid.uuid4().hex[:8]})" if unique_questions else text
+
+    email, password = f"load-{uuid.uuid4().hex[:12]}@example.com", "load-test-password"
+    if not await results.request(client, "POST /users", "POST", "/users", json={"email": email, "password": password, "role": "User"}):
+        return
+    response = await results.request(client, "POST /token", "POST", "/token", data={"username": email, "password": password})
+    if not response:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    response = await results.request(client, "POST /chats", "POST", "/chats", json={"question": question(0)}, headers=headers)
+    if not response:
+        return
+    chat_id = response.json()["id"]
+    for turn in range(1, follow_ups + 1):
+        if not await results.request(client, "POST /chats/{chat_id}", "POST", f"/chats/{chat_id}", json={"question": question(turn)}, headers=headers):
+            return
+
+
+async def drive(target: str, users: int, concurrency: int, follow_ups: int, unique_questions: bool) -> LoadTestResults:
+    """
+    Runs the virtual users against the backend, at most `concurrency` at a time.
+
+    Returns:
+        LoadTestResults: The recorded requests.
+    """
+    results = LoadTestResults()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=target, timeout=300, limits=limits) as client:
+        async def run_user(user: int) -> None:
+            async with semaphore:
+                await virtual_user(client, results, user, follow_ups, unique_questions)
+
+        await asyncio.gather(*(run_user(user) for user in range(users)))
+    results.ended = time.perf_counter()
+    return results
+
+
+def print_summary(summary: dict[str, dict]) -> None:
+    print(f"{'endpoint':<22} {'requests':>8} {'errors':>7} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, stats in summary.items():
+        print(
+            f"{endpoint:<22} {stats['requests']:>8} {stats['error_rate']:>6.1%} {stats['rps']:>8.2f} "
+            f"{stats['p50_ms']:>7.0f}ms {stats['p95_ms']:>7.0f}ms {stats['p99_ms']:>7.0f}ms"
+        )
+
+
+async def load_test(args: argparse.Namespace) -> dict[str, dict]:
+    if args.target:
+        results = await drive(args.target, args.users, args.concurrency, args.follow_ups, args.unique_questions)
+        return results.summary()
+
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="load-test-") as directory:
+        stub_url = f"http://127.0.0.1:{args.stub_port}"
+        target = f"http://127.0.0.1:{args.port}"
+        env = {
+            **os.environ,
+            "OPENAI_BASE_URL": f"{stub_url}/v1",
+            "OPENAI_API_KEY": "load-test",
+            # Shared by the workers: each one would otherwise sign the tokens with its own random key.
+            "SECRET_KEY": secrets.token_urlsafe(32),
+            "FAISS_INDEX_PATH": os.path.join(directory, "faiss_index"),
+            "EMBEDDING_CACHE_PATH": os.path.join(directory, "embedding_cache.sqlite3"),
+            "TRACE_EXPORT_PATH": os.path.join(directory, "traces.jsonl"),
+        }
+        try:
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.openai_stub", "--port", str(args.stub_port), *stub_arguments(args)]
+            ))
+            await wait_until_ready(f"{stub_url}/openapi.json", timeout=30)
+
+            corpus = os.path.join(directory, "corpus")
+            write_corpus(corpus, args.documents, paragraphs=20)
+            subprocess.run([sys.executable, "-m", "app.rag.ingest", corpus, "--index-path", env["FAISS_INDEX_PATH"]], env=env, check=True)
+
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"],
+                env=env
+            ))
+            await wait_until_ready(f"{target}/ready", timeout=120)
+
+            results = await drive(target, args.users, args.concurrency, args.follow_ups, args.unique_questions)
+            return results.summary()
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the backend against a local stub of the OpenAI API.")
+    parser.add_argument("--users", type=int, default=50, help="Number of virtual users.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Number of virtual users running at the same time.")
+    parser.add_argument("--follow-ups", type=int, default=3, help="Number of follow-up questions per chat.")
+    parser.add_argument("--unique-questions", action="store_true", help="Make every question unique, so that the semantic cache misses.")
+    parser.add_argument("--target", default=None, help="URL of an already running backend to test instead of starting one.")
+    parser.add_argument("--port", type=int, default=8001, help="Port of the backend started by the load test.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes of the backend started by the load test.")
+    parser.add_argument("--stub-port", type=int, default=8100, help="Port of the OpenAI stub started by the load test.")
+    parser.add_argument("--documents", type=int, default=20, help="Number of documents of the synthetic corpus.")
+    parser.add_argument("--output", default=None, help="JSON file where the results are saved, to compare runs.")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    summary = asyncio.run(load_test(args))
+    print_summary(summary)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Local stub of the OpenAI chat completions and embeddings APIs, for load tests that neither spend
+money nor hit the rate limits.
+
+Usage (from the backend directory):
+    python -m benchmarks.openai_stub [--port 8100] [--chat-ttft-ms 500] [--embedding-ms 80] ...
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:8100/v1. Latencies are drawn from
+log-normal distributions around the configured medians (a sigma of 0 makes them fixed). Answers
+are canned, streamed word by word if requested, and embeddings are pseudo-random unit vectors
+seeded by the input, so the same text always gets the same vector.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+ANSWER = (
+    "The Plano Clima sets the national targets for the mitigation of greenhouse gas emissions and the "
+    "adaptation to the effects of climate change, with sectoral plans for energy, agriculture, cities and industry."
+)
+
+
+class LatencyDistribution:
+    """
+    Log-normal latency distribution.
+
+    Attributes:
+        median (float): The median latency, in seconds.
+        sigma (float): The standard deviation of the logarithm of the latency, 0 for a fixed latency.
+    """
+
+    def __init__(self, median_ms: float, sigma: float):
+        self.median = median_ms / 1000
+        self.sigma = sigma
+
+    def sample(self) -> float:
+        return self.median * math.exp(random.gauss(0, self.sigma)) if self.sigma > 0 else self.median
+
+
+def count_words(value) -> int:
+    if isinstance(value, str):
+        return len(value.split())
+    if isinstance(value, list):
+        return sum(count_words(item) for item in value)
+    if isinstance(value, dict):
+        return count_words(value.get("content", ""))
+    return 0
+
+
+def canned_answer(messages: list[dict], completion_tokens: int) -> str:
+    """
+    Answers a chat completion request according to the prompt it comes from.
+
+    Args:
+        messages (list[dict]): The messages of the request.
+        completion_tokens (int): Number of words of the free-form answers.
+
+    Returns:
+        str: "Specific" to the classification prompt, an empty JSON object to the entity extraction
+        prompt, and a repeated sentence of `completion_tokens` words otherwise.
+    """
+    prompt = json.dumps(messages)
+    if "Classification:" in prompt:
+        return "Specific"
+    if "JSON object" in prompt:
+        return "{}"
+    words = ANSWER.split()
+    return " ".join(words[i % len(words)] for i in range(completion_tokens))
+
+
+def embed(value, dimensions: int) -> np.ndarray:
+    """
+    Embeds a text, or its tokens, as a pseudo-random unit vector seeded by its content.
+
+    Args:
+        value (str | list[int]): The text or its tokens.
+        dimensions (int): The number of dimensions of the vector.
+
+    Returns:
+        ndarray: The float32 vector.
+    """
+    seed = int.from_bytes(hashlib.sha256(json.dumps(value).encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def create_app(
+    chat_ttft: LatencyDistribution, token_interval: LatencyDistribution, completion_tokens: int,
+    embedding_latency: LatencyDistribution, dimensions: int
+) -> FastAPI:
+    """
+    Creates the stub application.
+
+    Args:
+        chat_ttft (LatencyDistribution): The time to the first token of the chat completions.
+        token_interval (LatencyDistribution): The time between two tokens of the chat completions.
+        completion_tokens (int): Number of words of the free-form answers.
+        embedding_latency (LatencyDistribution): The latency of the embeddings requests.
+        dimensions (int): The number of dimensions of the embeddings.
+
+    Returns:
+        FastAPI: The application.
+    """
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-4o")
+        answer = canned_answer(body.get("messages", []), completion_tokens)
+        tokens = answer.split(" ")
+        usage = {"prompt_tokens": count_words(body.get("messages", [])), "completion_tokens": len(tokens)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(chat_ttft.sample() + sum(token_interval.sample() for _ in tokens[1:]))
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop", "logprobs": None}],
+                "usage": usage,
+            }
+
+        def chunk(choices: list[dict], **fields) -> str:
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices, **fields}
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(chat_ttft.sample())
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(token_interval.sample())
+                content = token if i == 0 else f" {token}"
+                yield chunk([{"index": 0, "delta": {"role": "assistant", "content": content}, "finish_reason": None}])
+            yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield chunk([], usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        # A single text, a single list of tokens, or a batch of either
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        await asyncio.sleep(embedding_latency.sample())
+        data = []
+        for index, value in enumerate(inputs):
+            vector = embed(value, body.get("dimensions") or dimensions)
+            if body.get("encoding_format") == "base64":
+                encoded = base64.b64encode(vector.astype("<f4").tobytes()).decode()
+            else:
+                encoded = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": encoded})
+        tokens = sum(len(value) if isinstance(value, list) else count_words(value) for value in inputs)
+        return {
+            "object": "list", "data": data, "model": body.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    return app
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the latency and output options of the stub to a command line parser.
+
+    Args:
+        parser (ArgumentParser): The parser.
+    """
+    parser.add_argument("--chat-ttft-ms", type=float, default=500, help="Median time to the first token of the chat completions.")
+    parser.add_argument("--chat-ttft-sigma", type=float, default=0.5, help="Log-normal sigma of the time to the first token.")
+    parser.add_argument("--token-interval-ms", type=float, default=15, help="Median time between two streamed tokens.")
+    parser.add_argument("--token-interval-sigma", type=float, default=0.3, help="Log-normal sigma of the time between two tokens.")
+    parser.add_argument("--completion-tokens", type=int, default=150, help="Number of words of the answers.")
+    parser.add_argument("--embedding-ms", type=float, default=80, help="Median latency of the embeddings requests.")
+    parser.add_argument("--embedding-sigma", type=float, default=0.3, help="Log-normal sigma of the embeddings latency.")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Number of dimensions of the embeddings.")
+
+
+def stub_arguments(args: argparse.Namespace) -> list[str]:
+    """
+    Converts the parsed stub options back to command line arguments, to start the stub in another process.
+
+    Args:
+        args (Namespace): The parsed options.
+
+    Returns:
+        list[str]: The command line arguments.
+    """
+    options = ["chat_ttft_ms", "chat_ttft_sigma", "token_interval_ms", "token_interval_sigma", "completion_tokens", "embedding_ms", "embedding_sigma", "dimensions"]
+    return [argument for option in options for argument in (f"--{option.replace('_', '-')}", str(getattr(args, option)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a local stub of the OpenAI chat completions and embeddings APIs.")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to listen on.")
+    parser.add_argument("--port", type=int, default=8100, help="Port to listen on.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the latency draws.")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    app = create_app(
+        chat_ttft=LatencyDistribution(args.chat_ttft_ms, args.chat_ttft_sigma),
+        token_interval=LatencyDistribution(args.token_interval_ms, args.token_interval_sigma),
+        completion_tokens=args.completion_tokens,
+        embedding_latency=LatencyDistribution(args.embedding_ms, args.embedding_sigma),
+        dimensions=args.dimensions,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Round trips and latency of persisting a new chat and a follow-up turn, before and after
+writing them in a single transaction.
+
+Usage (from the backend directory, with the database of the .env file running):
+    python -m benchmarks.write_path [--iterations 100] [--metadatas 3]
+
+The previous implementation, which committed and refreshed after each row, is reproduced
+here for comparison. A throwaway user is created for the run and deleted with its chats.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from sqlalchemy import delete, event
+
+from app.db import crud
+from app.db.database import SessionLocal, create_tables, engine
+from app.db.models.answer_metadata import AnswerMetadataDB
+from app.db.models.chat import ChatDB
+from app.db.models.question_answer import QuestionAnswerDB
+from app.db.models.user import UserDB
+from app.schemas.chat import ChatContent, ChatInfo
+from app.schemas.question_answer import AnswerMetadata, QuestionAnswerBase
+
+
+class RoundTripCounter:
+    """
+    Counts the statements, transaction starts and commits sent to the database.
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.begins = 0
+        self.commits = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self.on_statement)
+        event.listen(engine.sync_engine, "begin", self.on_begin)
+        event.listen(engine.sync_engine, "commit", self.on_commit)
+
+    def on_statement(self, *args) -> None:
+        self.statements += 1
+
+    def on_begin(self, *args) -> None:
+        self.begins += 1
+
+    def on_commit(self, *args) -> None:
+        self.commits += 1
+
+    def snapshot(self) -> tuple[int, int, int]:
+        return self.statements, self.begins, self.commits
+
+
+async def legacy_create_chat(db, user_id: uuid.UUID, chat_info: ChatInfo) -> ChatDB:
+    db_chat = ChatDB(title=chat_info.title, user_id=user_id)
+    db.add(db_chat)
+    await db.commit()
+    await db.refresh(db_chat)
+    question_answer = QuestionAnswerDB(
+        question=chat_info.question_answer.question, answer=chat_info.question_answer.answer, chat_id=db_chat.id
+    )
+    db.add(question_answer)
+    await db.commit()
+    await db.refresh(question_answer)
+    db.add_all([
+        AnswerMetadataDB(page_number=metadata.page_number, file_name=metadata.file_name, qa_id=question_answer.id)
+        for metadata in chat_info.question_answer.answer_metadata
+    ])
+    await db.commit()
+    return db_chat
+
+
+async def legacy_add_question_answer_to_chat(db, db_chat: ChatDB, chat_content: ChatContent) -> QuestionAnswerDB:
+    new_db_qa = QuestionAnswerDB(
+        question=chat_content.question_answer.question, answer=chat_content.question_answer.answer, chat_id=db_chat.id
+    )
+    db.add(new_db_qa)
+    await db.commit()
+    await db.refresh(new_db_qa)
+    db.add_all([
+        AnswerMetadataDB(page_number=metadata.page_number, file_name=metadata.file_name, qa_id=new_db_qa.id)
+        for metadata in chat_content.question_answer.answer_metadata
+    ])
+    await db.commit()
+    return new_db_qa
+
+
+async def run(name: str, create_chat, add_question_answer, db_user: UserDB, counter: RoundTripCounter, iterations: int, metadatas: int) -> None:
+    question_answer = QuestionAnswerBase(
+        question="O que é o Plano Clima?",
+        answer="O Plano Clima é o plano nacional de mitigação e adaptação às mudanças climáticas.",
+        answer_metadata=[AnswerMetadata(page_number=str(page), file_name="plano_clima.pdf") for page in range(metadatas)]
+    )
+    db_chat = None
+    for operation in ("new chat", "follow-up"):
+        latencies = []
+        before = counter.snapshot()
+        for _ in range(iterations):
+            async with SessionLocal() as db:
+                start = time.perf_counter()
+                if operation == "new chat":
+                    db_chat = await create_chat(db, db_user.id, ChatInfo(title="Benchmark", question_answer=question_answer))
+                else:
+                    await add_question_answer(db, db_chat, ChatContent(question_answer=question_answer))
+                latencies.append(time.perf_counter() - start)
+        statements, begins, commits = (now - then for now, then in zip(counter.snapshot(), before))
+        print(
+            f"{name:<8} {operation:<10} statements={statements / iterations:.1f} begins={begins / iterations:.1f} "
+            f"commits={commits / iterations:.1f} p50={statistics.median(latencies) * 1000:.2f}ms "
+            f"mean={statistics.fmean(latencies) * 1000:.2f}ms"
+        )
+
+
+async def benchmark(iterations: int, metadatas: int) -> None:
+    await create_tables()
+    async with SessionLocal() as db:
+        db_user = UserDB(id=uuid.uuid4(), email=f"benchmark-{uuid.uuid4().hex[:8]}@example.com", hashed_password="-", role="User")
+        db.add(db_user)
+        await db.commit()
+
+    counter = RoundTripCounter()
+    try:
+        await run("before", legacy_create_chat, legacy_add_question_answer_to_chat, db_user, counter, iterations, metadatas)
+        await run("after", crud.create_chat, crud.add_question_answer_to_chat, db_user, counter, iterations, metadatas)
+    finally:
+        async with SessionLocal() as db:
+            # The question-answer pairs and their metadata are deleted in cascade by the database.
+            await db.execute(delete(ChatDB).where(ChatDB.user_id == db_user.id))
+            await db.execute(delete(UserDB).where(UserDB.id == db_user.id))
+            await db.commit()
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the round trips of the chat write path.")
+    parser.add_argument("--iterations", type=int, default=100, help="Number of chats and follow-ups written per implementation.")
+    parser.add_argument("--metadatas", type=int, default=3, help="Number of answer metadata rows per question-answer pair.")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.iterations, args.metadatas))
+
+
+if __name__ == "__main__":
+    main()
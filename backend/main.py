@@ -1,12 +1,38 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.core.config import settings
+from app.core.metrics import register_app_collector
+from app.core.password_hasher import password_hasher
+from app.core.tracing import TRACE_ID_HEADER, JsonlSpanExporter, TracingMiddleware
 from app.db import database
-from app.api.routes import users, auth, chats
+from app.api.routes import users, auth, chats, health, jobs, metrics
+from app.api.routes.chats import NEXT_CURSOR_HEADER
+from app.rag.pipeline import create_pipeline, watch_index
+
+logging.basicConfig(level=logging.INFO)
+
 
-database.Base.metadata.create_all(bind=database.engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.create_tables()
+    app.state.pipeline = await create_pipeline()
+    register_app_collector(app)
+    index_watcher = None
+    if settings.FAISS_INDEX_RELOAD_INTERVAL_SECONDS > 0:
+        index_watcher = asyncio.create_task(watch_index(app.state.pipeline, settings.FAISS_INDEX_RELOAD_INTERVAL_SECONDS))
+    yield
+    if index_watcher is not None:
+        index_watcher.cancel()
+    password_hasher.shutdown()
+    await database.engine.dispose()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,8 +40,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TRACE_ID_HEADER, "Location"],
 )
 
+if settings.TRACING_ENABLED:
+    app.add_middleware(
+        TracingMiddleware,
+        exporter=JsonlSpanExporter(settings.TRACE_EXPORT_PATH),
+        sample_rate=settings.TRACE_SAMPLE_RATE,
+        slow_threshold=settings.TRACE_SLOW_THRESHOLD_SECONDS,
+    )
+
 app.include_router(users.router)
 app.include_router(auth.router)
 app.include_router(chats.router)
+app.include_router(jobs.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
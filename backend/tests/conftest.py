@@ -0,0 +1,56 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import exc, text
+
+# The settings are read when the application is imported: the tests don't need a .env file.
+for name, value in {
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_DB": "gaia_test",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "OPENAI_API_KEY": "sk-test",
+}.items():
+    os.environ.setdefault(name, value)
+
+
+class WhitespaceEncoding:
+    """
+    Tokenizer counting words, so that the tests don't download the tiktoken encoding.
+    """
+
+    def encode(self, text, **kwargs):
+        return text.split()
+
+
+@pytest.fixture
+def word_tokens(monkeypatch):
+    """
+    Counts the tokens of the texts as their words.
+    """
+    from app.rag import context
+
+    monkeypatch.setattr(context, "get_encoding", WhitespaceEncoding)
+
+
+async def check_database() -> None:
+    from app.db.database import engine
+
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def database():
+    """
+    Skips the tests using the PostgreSQL database of the settings when it is not reachable.
+    """
+    try:
+        asyncio.run(check_database())
+    except (exc.OperationalError, OSError) as error:
+        pytest.skip(f"PostgreSQL is not reachable: {error}")
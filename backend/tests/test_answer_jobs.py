@@ -0,0 +1,91 @@
+import asyncio
+import uuid
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select, update
+
+from app.core.config import settings
+from app.db import crud
+from app.db.database import SessionLocal, create_tables, engine
+from app.db.models.answer_job import AnswerJobDB
+from app.db.models.chat import ChatDB
+from app.db.models.question_answer import QuestionAnswerDB
+from app.db.models.user import UserDB
+from app.schemas.chat import ChatInfo
+from app.schemas.question_answer import QuestionAnswerBase
+
+QUESTION_ANSWER = QuestionAnswerBase(question="O que é o Plano Clima?", answer="O plano nacional de mitigação e adaptação.", answer_metadata=[])
+
+
+async def with_chat(test) -> None:
+    """
+    Runs a test with a throwaway chat, deleted with its jobs and question-answer pairs.
+    """
+    await create_tables()
+    async with SessionLocal() as db:
+        db_user = UserDB(id=uuid.uuid4(), email=f"test-{uuid.uuid4().hex[:8]}@example.com", hashed_password="-", role="User")
+        db.add(db_user)
+        await db.commit()
+        db_chat = await crud.create_chat(db, db_user.id, ChatInfo(title="Test", question_answer=QUESTION_ANSWER))
+    try:
+        await test(db_chat)
+    finally:
+        async with SessionLocal() as db:
+            # The jobs, question-answer pairs and their metadata are deleted in cascade by the database.
+            await db.execute(delete(ChatDB).where(ChatDB.user_id == db_user.id))
+            await db.execute(delete(UserDB).where(UserDB.id == db_user.id))
+            await db.commit()
+        await engine.dispose()
+
+
+async def abandon(job_id: uuid.UUID) -> None:
+    async with SessionLocal() as db:
+        await db.execute(
+            update(AnswerJobDB)
+            .where(AnswerJobDB.id == job_id)
+            .values(started_at=func.now() - timedelta(seconds=settings.JOB_TIMEOUT_SECONDS + 1))
+        )
+        await db.commit()
+
+
+async def count_question_answers(chat_id: uuid.UUID) -> int:
+    async with SessionLocal() as db:
+        return await db.scalar(select(func.count()).select_from(QuestionAnswerDB).where(QuestionAnswerDB.chat_id == chat_id))
+
+
+def test_superseded_attempt_does_not_add_its_answer(database):
+    async def test(db_chat):
+        async with SessionLocal() as db:
+            await crud.create_answer_job(db, db_chat, "Quais são as metas?", "User")
+        async with SessionLocal() as first_worker:
+            first_job = await crud.claim_answer_job(first_worker)
+            await abandon(first_job.id)
+            async with SessionLocal() as second_worker:
+                second_job = await crud.claim_answer_job(second_worker)
+                assert second_job.id == first_job.id and second_job.attempts == 2
+
+                assert await crud.complete_answer_job(first_worker, first_job, 1, QUESTION_ANSWER) is None
+                assert await count_question_answers(db_chat.id) == 1
+
+                assert await crud.complete_answer_job(second_worker, second_job, 2, QUESTION_ANSWER) is not None
+                assert await count_question_answers(db_chat.id) == 2
+
+    asyncio.run(with_chat(test))
+
+
+def test_abandoned_job_is_failed_after_the_last_attempt(database, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_MAX_ATTEMPTS", 1)
+
+    async def test(db_chat):
+        async with SessionLocal() as db:
+            db_job = await crud.create_answer_job(db, db_chat, "Quais são as metas?", "User")
+            assert (await crud.claim_answer_job(db)).attempts == 1
+        await abandon(db_job.id)
+
+        async with SessionLocal() as db:
+            assert await crud.claim_answer_job(db) is None
+            db_job = await crud.get_answer_job(db, db_job.id)
+        assert db_job.status == "failed"
+        assert db_job.attempts == 1
+
+    asyncio.run(with_chat(test))
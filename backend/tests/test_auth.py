@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete
+
+from app.api.routes.auth import get_current_user, issue_tokens
+from app.core.security import decode_access_token
+from app.db.database import SessionLocal, create_tables, engine
+from app.db.models.user import UserDB
+from main import app
+
+
+def new_user(role: str = "User") -> UserDB:
+    return UserDB(id=uuid.uuid4(), email=f"test-{uuid.uuid4().hex[:8]}@example.com", hashed_password="-", role=role)
+
+
+def test_refresh_token_is_not_accepted_as_access_token():
+    tokens = issue_tokens(new_user())
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_current_user(token=tokens["refresh_token"], db=None))
+    assert error.value.status_code == 401
+    assert asyncio.run(get_current_user(token=tokens["access_token"], db=None)).role == "User"
+
+
+async def refresh(token: str) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.post("/token/refresh", headers={"Authorization": f"Bearer {token}"})
+
+
+def test_access_token_is_not_accepted_as_refresh_token():
+    tokens = issue_tokens(new_user())
+
+    assert asyncio.run(refresh(tokens["access_token"])).status_code == 401
+
+
+async def refresh_after_role_change() -> tuple[dict, dict]:
+    """
+    Issues the tokens of a new user, changes its role in the database, then refreshes the tokens.
+    """
+    await create_tables()
+    db_user = new_user()
+    async with SessionLocal() as db:
+        db.add(db_user)
+        await db.commit()
+    try:
+        tokens = issue_tokens(db_user)
+        async with SessionLocal() as db:
+            db_user.role = "Admin"
+            await db.merge(db_user)
+            await db.commit()
+        response = await refresh(tokens["refresh_token"])
+        assert response.status_code == 200
+        return tokens, response.json()
+    finally:
+        async with SessionLocal() as db:
+            await db.execute(delete(UserDB).where(UserDB.id == db_user.id))
+            await db.commit()
+        await engine.dispose()
+
+
+def test_refresh_reissues_both_tokens_with_the_current_role(database):
+    tokens, refreshed = asyncio.run(refresh_after_role_change())
+
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+    assert decode_access_token(refreshed["access_token"])["role"] == "Admin"
+    assert decode_access_token(refreshed["refresh_token"])["typ"] == "refresh"
@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+from app.api.routes.utils import select_verbatim_turns
+from app.core.config import settings
+
+
+def turn(words: int) -> SimpleNamespace:
+    return SimpleNamespace(question="question", answer=" ".join(["word"] * words))
+
+
+def test_verbatim_turns_stop_at_the_turn_limit(monkeypatch, word_tokens):
+    monkeypatch.setattr(settings, "HISTORY_MAX_TURNS", 3)
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 1000)
+    turns = [turn(10) for _ in range(5)]
+
+    assert select_verbatim_turns(turns) == turns[-3:]
+
+
+def test_verbatim_turns_stop_at_the_first_turn_over_the_token_budget(monkeypatch, word_tokens):
+    monkeypatch.setattr(settings, "HISTORY_MAX_TURNS", 6)
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 30)
+    # The short oldest turn would fit, but the long turn before the last ones cuts the history
+    turns = [turn(1), turn(50), turn(10), turn(10)]
+
+    assert select_verbatim_turns(turns) == turns[-2:]
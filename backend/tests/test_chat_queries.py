@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import delete, event
+
+from app.api.routes.auth import get_current_user
+from app.core.auth_cache import AuthenticatedUser
+from app.db import crud
+from app.db.database import SessionLocal, create_tables, engine
+from app.db.models.chat import ChatDB
+from app.db.models.user import UserDB
+from app.schemas.chat import ChatContent, ChatInfo
+from app.schemas.question_answer import AnswerMetadata, QuestionAnswerBase
+from main import app
+
+# The chat, its question-answer pairs and their metadata, whatever the length of the conversation.
+GET_CHAT_STATEMENTS = 3
+
+
+class StatementCounter:
+    """
+    Counts the statements sent to the database, like `benchmarks.write_path.RoundTripCounter`.
+    """
+
+    def __init__(self):
+        self.statements = 0
+
+    def __enter__(self):
+        event.listen(engine.sync_engine, "before_cursor_execute", self.on_statement)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(engine.sync_engine, "before_cursor_execute", self.on_statement)
+
+    def on_statement(self, *args) -> None:
+        self.statements += 1
+
+
+async def count_get_chat_statements(turns: int) -> int:
+    """
+    Creates a chat with `turns` question-answer pairs and counts the statements of `GET /chats/{chat_id}`.
+    """
+    await create_tables()
+    async with SessionLocal() as db:
+        db_user = UserDB(id=uuid.uuid4(), email=f"test-{uuid.uuid4().hex[:8]}@example.com", hashed_password="-", role="User")
+        db.add(db_user)
+        await db.commit()
+
+    question_answer = QuestionAnswerBase(
+        question="O que é o Plano Clima?",
+        answer="O Plano Clima é o plano nacional de mitigação e adaptação às mudanças climáticas.",
+        answer_metadata=[AnswerMetadata(page_number=str(page), file_name="plano_clima.pdf") for page in range(2)]
+    )
+    app.dependency_overrides[get_current_user] = lambda: AuthenticatedUser(id=db_user.id, email=db_user.email, role=db_user.role)
+    try:
+        async with SessionLocal() as db:
+            db_chat = await crud.create_chat(db, db_user.id, ChatInfo(title="Test", question_answer=question_answer))
+            for _ in range(turns - 1):
+                await crud.add_question_answer_to_chat(db, db_chat, ChatContent(question_answer=question_answer))
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            with StatementCounter() as counter:
+                response = await client.get(f"/chats/{db_chat.id}")
+        assert response.status_code == 200
+        assert len(response.json()["conversation"]) == turns
+        return counter.statements
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+        async with SessionLocal() as db:
+            # The question-answer pairs and their metadata are deleted in cascade by the database.
+            await db.execute(delete(ChatDB).where(ChatDB.user_id == db_user.id))
+            await db.execute(delete(UserDB).where(UserDB.id == db_user.id))
+            await db.commit()
+        await engine.dispose()
+
+
+@pytest.mark.parametrize("turns", [1, 40])
+def test_get_chat_runs_a_constant_number_of_statements(database, turns):
+    assert asyncio.run(count_get_chat_statements(turns)) == GET_CHAT_STATEMENTS
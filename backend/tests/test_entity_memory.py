@@ -0,0 +1,59 @@
+import asyncio
+import uuid
+
+from sqlalchemy import delete
+
+from app.db import crud
+from app.db.database import SessionLocal, create_tables, engine
+from app.db.models.chat import ChatDB
+from app.db.models.user import UserDB
+from app.rag.memory import merge_entities
+
+# Least recently mentioned first, the longest name first: JSONB objects would sort the shortest first.
+ENTITIES = {
+    "Plano Nacional de Mudança do Clima": "Plano federal de mitigação e adaptação.",
+    "Fundo Amazônia": "Fundo de doações para a floresta.",
+    "BNDES": "Banco que administra o Fundo Amazônia.",
+}
+
+
+def names(entities: list[dict[str, str]]) -> list[str]:
+    return [entity["name"] for entity in entities]
+
+
+def test_entities_mentioned_again_are_evicted_last():
+    entities = merge_entities([], ENTITIES, max_entities=3)
+    entities = merge_entities(entities, {"Plano Nacional de Mudança do Clima": "Plano atualizado em 2024."}, max_entities=3)
+    entities = merge_entities(entities, {"COP30": "Conferência do clima em Belém."}, max_entities=3)
+
+    assert names(entities) == ["BNDES", "Plano Nacional de Mudança do Clima", "COP30"]
+
+
+async def evict_after_round_trip() -> list[dict[str, str]]:
+    """
+    Saves the entities of a chat, reads them back, then merges one more entity than the memory holds.
+    """
+    await create_tables()
+    async with SessionLocal() as db:
+        db_user = UserDB(id=uuid.uuid4(), email=f"test-{uuid.uuid4().hex[:8]}@example.com", hashed_password="-", role="User")
+        db_chat = ChatDB(user=db_user, title="Test")
+        db.add(db_chat)
+        await db.commit()
+    try:
+        async with SessionLocal() as db:
+            await crud.update_chat_memory(db, db_chat, None, 0, merge_entities([], ENTITIES, max_entities=3), 1)
+        async with SessionLocal() as db:
+            db_chat = await crud.get_chat_by_id(db, db_chat.id)
+        return merge_entities(db_chat.entities, {"COP30": "Conferência do clima em Belém."}, max_entities=3)
+    finally:
+        async with SessionLocal() as db:
+            await db.execute(delete(ChatDB).where(ChatDB.id == db_chat.id))
+            await db.execute(delete(UserDB).where(UserDB.id == db_user.id))
+            await db.commit()
+        await engine.dispose()
+
+
+def test_entity_recency_survives_the_database(database):
+    entities = asyncio.run(evict_after_round_trip())
+
+    assert names(entities) == ["Fundo Amazônia", "BNDES", "COP30"]
@@ -0,0 +1,39 @@
+import asyncio
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.rag import ingest as ingest_module
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=16)
+
+
+def ingest(directory, index_path) -> tuple[int, int]:
+    return asyncio.run(ingest_module.ingest(str(directory), str(index_path), chunk_size=35, chunk_overlap=0, batch_size=8, concurrency=2))
+
+
+def indexed_chunks(index_path) -> list[dict]:
+    vectorstore = FAISS.load_local(str(index_path), EMBEDDINGS, allow_dangerous_deserialization=True)
+    assert vectorstore.index.ntotal == len(vectorstore.docstore._dict)
+    return [{"text": doc.page_content, **doc.metadata} for doc in vectorstore.docstore._dict.values()]
+
+
+def test_changed_file_replaces_its_stale_chunks(monkeypatch, tmp_path):
+    monkeypatch.setattr(ingest_module, "create_embeddings", lambda: EMBEDDINGS)
+    documents, index_path = tmp_path / "documents", tmp_path / "faiss_index"
+    documents.mkdir()
+    (documents / "plan.md").write_text("The plan sets targets for 2035.\n\nCities map the flood risks.")
+    (documents / "notes.txt").write_text("Heat waves are more frequent.")
+
+    assert ingest(documents, index_path) == (3, 0)
+    assert ingest(documents, index_path) == (0, 0)
+
+    (documents / "plan.md").write_text("The plan sets targets for 2040.\n\nCities map the flood risks.")
+    assert ingest(documents, index_path) == (1, 1)
+
+    chunks = indexed_chunks(index_path)
+    assert sorted(chunk["text"] for chunk in chunks) == [
+        "Cities map the flood risks.", "Heat waves are more frequent.", "The plan sets targets for 2040."
+    ]
+    # Text files have no page number
+    assert all("page_number" not in chunk for chunk in chunks)
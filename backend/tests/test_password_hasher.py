@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core import password_hasher as password_hasher_module
+from app.core.password_hasher import PasswordHasher, PasswordHasherBusy
+
+
+def test_cancelled_operation_is_pending_until_its_thread_is_done(monkeypatch):
+    release = threading.Event()
+
+    def slow_hash(password):
+        release.wait()
+        return f"hash of {password}"
+
+    monkeypatch.setattr(password_hasher_module, "get_password_hash", slow_hash)
+
+    async def test():
+        hasher = PasswordHasher(max_workers=1, max_pending=1)
+        operation = asyncio.create_task(hasher.hash("password"))
+        await asyncio.sleep(0.05)
+        operation.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await operation
+
+        # The hash is still running on its thread, so there is no room for another operation.
+        assert hasher.pending == 1
+        with pytest.raises(PasswordHasherBusy):
+            await asyncio.wait_for(hasher.hash("password"), timeout=1)
+
+        release.set()
+        for _ in range(100):
+            if hasher.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert hasher.pending == 0
+        assert await hasher.hash("password") == "hash of password"
+        assert hasher.operations == 2
+        hasher.shutdown()
+
+    try:
+        asyncio.run(test())
+    finally:
+        release.set()
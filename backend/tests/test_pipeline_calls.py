@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models import FakeListChatModel
+
+from app.api.routes import utils
+from app.core.config import settings
+from app.rag import pipeline as pipeline_module
+from app.schemas.chat import ChatBase
+
+QUESTION = "Quais são as metas de redução de emissões do Plano Clima?"
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """
+    Fake embeddings model recording the texts it embeds.
+    """
+
+    model: str = "fake-embeddings"
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls.append([text])
+        return super().embed_query(text)
+
+
+class CountingChatModel(FakeListChatModel):
+    """
+    Fake chat model recording its prompts, answering "Specific" to the classification prompt.
+    """
+
+    responses: list = ["The Plano Clima sets the national emission targets."]
+    calls: list = []
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        self.calls.append(prompt)
+        if "Classification:" in prompt:
+            return "Specific"
+        return super()._call(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+class FakeSession:
+    """
+    Database session of a turn without chat history, which only releases its connection.
+    """
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path, word_tokens):
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_PATH", None)
+    llm = CountingChatModel(calls=[])
+    embeddings = CountingEmbeddings(size=32, calls=[])
+    monkeypatch.setattr(pipeline_module, "ChatOpenAI", lambda **kwargs: llm)
+    monkeypatch.setattr(pipeline_module, "OpenAIEmbeddings", lambda **kwargs: embeddings)
+
+    index_path = tmp_path / "faiss_index"
+    FAISS.from_texts(
+        [
+            "The Plano Clima sets targets for the reduction of greenhouse gas emissions by 2035.",
+            "Municipalities must map the areas at risk of floods in their adaptation plans.",
+        ],
+        embeddings,
+        metadatas=[{"file_name": "plano_clima.pdf", "page_number": 1}, {"file_name": "adaptacao.pdf", "page_number": 3}],
+    ).save_local(str(index_path))
+
+    pipeline = pipeline_module.AIPipeline()
+    pipeline.load_index(str(index_path))
+    embeddings.calls.clear()
+    return pipeline
+
+
+def test_specific_turn_retrieves_and_generates_once(pipeline, monkeypatch):
+    retrievals = []
+    retrieve_documents = utils.retrieve_documents
+
+    async def counting_retrieve_documents(pipeline, question):
+        retrievals.append(question)
+        return await retrieve_documents(pipeline, question)
+
+    monkeypatch.setattr(utils, "retrieve_documents", counting_retrieve_documents)
+
+    response = asyncio.run(utils.ask_question_ai(
+        pipeline=pipeline, db=FakeSession(), db_chat=None, question=ChatBase(question=QUESTION), role="User"
+    ))
+
+    generations = [prompt for prompt in pipeline.llm.calls if "Classification:" not in prompt]
+    assert response.answer == "The Plano Clima sets the national emission targets."
+    assert len(retrievals) == 1
+    assert len(generations) == 1
+    # The question is embedded once, for both the semantic cache lookup and the retrieval.
+    assert len(pipeline.embeddings.embeddings.calls) == 1
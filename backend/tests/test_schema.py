@@ -0,0 +1,86 @@
+import asyncio
+import uuid
+
+from sqlalchemy import text
+
+from app.db.database import create_tables, engine
+
+
+async def columns(table: str) -> set[str]:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text("SELECT column_name FROM information_schema.columns WHERE table_name = :table"), {"table": table}
+        )
+        return set(result.scalars())
+
+
+async def indexes() -> set[str]:
+    async with engine.connect() as connection:
+        result = await connection.execute(text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"))
+        return set(result.scalars())
+
+
+async def upgrade_previous_schema(statements: list[str]) -> None:
+    """
+    Reverts the schema to a previous version, then creates the tables twice.
+    """
+    try:
+        await create_tables()
+        async with engine.begin() as connection:
+            for statement in statements:
+                await connection.execute(text(statement))
+        await create_tables()
+        await create_tables()
+    finally:
+        await engine.dispose()
+
+
+def test_create_tables_adds_the_chat_history_summary_columns(database):
+    asyncio.run(upgrade_previous_schema(["ALTER TABLE chats DROP COLUMN history_summary, DROP COLUMN summarized_turns"]))
+
+    assert {"history_summary", "summarized_turns"} <= asyncio.run(columns("chats"))
+
+
+def test_create_tables_adds_the_entity_memory_columns(database):
+    asyncio.run(upgrade_previous_schema(["ALTER TABLE chats DROP COLUMN entities, DROP COLUMN entity_turns"]))
+
+    assert {"entities", "entity_turns"} <= asyncio.run(columns("chats"))
+
+
+def test_create_tables_adds_the_pagination_indexes(database):
+    names = {"ix_chats_user_id_created_at_id", "ix_question_answers_chat_id_created_at_id", "ix_answer_metadatas_qa_id"}
+
+    asyncio.run(upgrade_previous_schema([f"DROP INDEX {name}" for name in names]))
+
+    assert names <= asyncio.run(indexes())
+
+
+async def convert_entities_object() -> list:
+    """
+    Creates a chat with the entities stored as an object, as before they were a list, then creates the tables.
+    """
+    await create_tables()
+    user_id, chat_id = uuid.uuid4(), uuid.uuid4()
+    try:
+        async with engine.begin() as connection:
+            await connection.execute(
+                text("INSERT INTO users (id, email, hashed_password, role) VALUES (:id, :email, '-', 'User')"),
+                {"id": user_id, "email": f"test-{user_id.hex[:8]}@example.com"}
+            )
+            await connection.execute(
+                text("INSERT INTO chats (id, title, user_id, entities) VALUES (:id, 'Test', :user_id, :entities)"),
+                {"id": chat_id, "user_id": user_id, "entities": '{"BNDES": "Banco."}'}
+            )
+        await create_tables()
+        async with engine.connect() as connection:
+            result = await connection.execute(text("SELECT entities FROM chats WHERE id = :id"), {"id": chat_id})
+            return result.scalar_one()
+    finally:
+        async with engine.begin() as connection:
+            await connection.execute(text("DELETE FROM chats WHERE id = :id"), {"id": chat_id})
+            await connection.execute(text("DELETE FROM users WHERE id = :id"), {"id": user_id})
+        await engine.dispose()
+
+
+def test_create_tables_converts_the_entities_to_a_list(database):
+    assert asyncio.run(convert_entities_object()) == [{"name": "BNDES", "description": "Banco."}]
@@ -0,0 +1,56 @@
+import numpy as np
+
+from app.rag import cache as cache_module
+from app.rag.cache import CachedAnswer, SemanticCache
+
+SCOPE = ("User", True)
+
+
+def unit(*components: float) -> list[float]:
+    vector = np.asarray(components, dtype=np.float32)
+    return list(vector / np.linalg.norm(vector))
+
+
+def test_lookup_returns_the_most_similar_answer_of_the_scope():
+    cache = SemanticCache(similarity_threshold=0.9, ttl_seconds=60, max_entries=10)
+    cache.store(unit(1, 0, 0), SCOPE, CachedAnswer(answer="x"))
+    cache.store(unit(0, 1, 0), SCOPE, CachedAnswer(answer="y"))
+    cache.store(unit(0.99, 0.1, 0), ("Admin", True), CachedAnswer(answer="admin"))
+
+    assert cache.lookup(unit(1, 0.05, 0), SCOPE).answer == "x"
+    assert cache.lookup(unit(0, 1, 0.05), SCOPE).answer == "y"
+    assert cache.lookup(unit(0, 0, 1), SCOPE) is None
+    assert cache.lookup(unit(1, 0, 0), ("User", False)) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_evicted_entries_leave_the_other_vectors_in_place():
+    cache = SemanticCache(similarity_threshold=0.99, ttl_seconds=60, max_entries=3)
+    vectors = [unit(*np.eye(4)[i]) for i in range(4)]
+    for i in range(3):
+        cache.store(vectors[i], SCOPE, CachedAnswer(answer=str(i)))
+    # The first entry is the least recently used once the second and third are looked up
+    cache.lookup(vectors[1], SCOPE)
+    cache.lookup(vectors[2], SCOPE)
+    cache.store(vectors[3], SCOPE, CachedAnswer(answer="3"))
+
+    assert len(cache) == 3
+    assert cache.lookup(vectors[0], SCOPE) is None
+    assert [cache.lookup(vectors[i], SCOPE).answer for i in (1, 2, 3)] == ["1", "2", "3"]
+
+
+def test_expired_entries_are_not_returned(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = SemanticCache(similarity_threshold=0.9, ttl_seconds=60, max_entries=10)
+    cache.store(unit(1, 0), SCOPE, CachedAnswer(answer="old"))
+    now[0] += 61
+    cache.store(unit(1, 0.01), SCOPE, CachedAnswer(answer="new"))
+
+    # The expired entry was evicted by the store
+    assert len(cache) == 1
+    assert cache.lookup(unit(1, 0), SCOPE).answer == "new"
+
+    now[0] += 61
+    assert cache.lookup(unit(1, 0), SCOPE) is None
+    assert len(cache) == 0
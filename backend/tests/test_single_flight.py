@@ -0,0 +1,149 @@
+import asyncio
+import gc
+from types import SimpleNamespace
+
+import pytest
+
+from app.api.routes import utils
+from app.core import tracing
+from app.core.config import settings
+from app.core.single_flight import SingleFlight, normalize_question
+from app.db.database import SessionLocal
+from app.schemas.chat import ChatBase
+from app.schemas.question_answer import QuestionAnswerBase
+
+
+class Computation:
+    """
+    Computation counting its calls, finishing when `release` is set.
+    """
+
+    def __init__(self, result="answer", error: Exception | None = None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_normalize_question_ignores_case_and_whitespace():
+    assert normalize_question("  O que é o   Plano Clima? ") == normalize_question("o que É o plano clima?")
+
+
+def test_concurrent_calls_share_a_single_computation():
+    async def test():
+        single_flight = SingleFlight()
+        computation = Computation()
+        calls = [asyncio.create_task(single_flight.do("key", computation)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert single_flight.waiters() == {"key": 4}
+
+        computation.release.set()
+        assert await asyncio.gather(*calls) == ["answer"] * 5
+        assert computation.calls == 1
+        assert (single_flight.started, single_flight.coalesced) == (1, 4)
+        assert single_flight.waiters() == {}
+
+    asyncio.run(test())
+
+
+def test_cancelling_the_leader_does_not_cancel_the_waiters():
+    async def test():
+        single_flight = SingleFlight()
+        computation = Computation()
+        leader = asyncio.create_task(single_flight.do("key", computation))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(single_flight.do("key", computation))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        computation.release.set()
+        assert await waiter == "answer"
+        assert leader.cancelled()
+        assert computation.calls == 1
+
+    asyncio.run(test())
+
+
+def test_exception_is_raised_to_every_caller():
+    async def test():
+        single_flight = SingleFlight()
+        computation = Computation(error=ValueError("failed"))
+        calls = [asyncio.create_task(single_flight.do("key", computation)) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        computation.release.set()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError] * 3
+        assert single_flight.waiters() == {}
+
+        # The next call starts a new computation.
+        computation.error = None
+        assert await single_flight.do("key", computation) == "answer"
+        assert computation.calls == 2
+
+    asyncio.run(test())
+
+
+def test_exception_without_callers_left_is_retrieved():
+    async def test():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        single_flight = SingleFlight()
+        computation = Computation(error=ValueError("failed"))
+        leader = asyncio.create_task(single_flight.do("key", computation))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        computation.release.set()
+        await asyncio.sleep(0.01)
+        gc.collect()
+        assert errors == []
+
+    asyncio.run(test())
+
+
+def test_first_question_outlives_the_session_and_trace_of_a_cancelled_leader(monkeypatch):
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+    calls = []
+    release = asyncio.Event()
+
+    async def ask_question_ai(pipeline, db, db_chat, question, role):
+        calls.append((db, tracing.current_trace_id()))
+        await release.wait()
+        return QuestionAnswerBase(question=question.question, answer="answer", answer_metadata=[])
+
+    monkeypatch.setattr(utils, "ask_question_ai", ask_question_ai)
+    pipeline = SimpleNamespace(first_questions=SingleFlight())
+
+    async def ask(db, trace_id):
+        tracing._current_trace.set(tracing.Trace(trace_id=trace_id, sampled=False))
+        async with db:
+            return await utils.ask_first_question_ai(pipeline, db, ChatBase(question="O que é o Plano Clima?"), "User")
+
+    async def test():
+        leader_db = SessionLocal()
+        leader = asyncio.create_task(ask(leader_db, "leader"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(ask(SessionLocal(), "waiter"))
+        await asyncio.sleep(0.01)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        release.set()
+        assert (await waiter).answer == "answer"
+        [(answer_db, trace_id)] = calls
+        assert answer_db is not leader_db
+        assert trace_id is None
+
+    asyncio.run(test())
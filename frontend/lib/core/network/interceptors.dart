@@ -72,6 +72,9 @@ class TokenInterceptor extends Interceptor {
         if (refreshResponse != null) {
           await sl<SharedPreferencesService>().saveToken(
               refreshResponse['access_token'], TokenKeys.accessTokenKey);
+          // The refresh token is reissued along with the access token
+          await sl<SharedPreferencesService>().saveToken(
+              refreshResponse['refresh_token'], TokenKeys.refreshTokenKey);
           // Retry the original request with the new access token
           final clonedRequest = await _retryRequest(err.requestOptions);
           return handler.resolve(clonedRequest); // Return the retried request